@@ -3,6 +3,18 @@ ASGI config for carbon project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with any ASGI server, for example:
+
+    uvicorn carbon.asgi:application --workers 4
+    daphne carbon.asgi:application
+
+Under ASGI the dashboard, leaderboard and challenge list use their async views
+(settings.ASYNC_VIEWS), unless DJANGO_ASYNC_VIEWS is set to something else.
+The live event stream (/events/, core.views.event_stream) is only served
+here: each open stream is a coroutine waiting on its queue, not a worker.
+With several workers, set EVENTS_REDIS_URL so events reach all of them
+(carbon/events.py).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -12,5 +24,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carbon.settings')
+os.environ.setdefault('DJANGO_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
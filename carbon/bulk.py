@@ -0,0 +1,90 @@
+"""
+Bulk updates in primary-key batches, for admin actions and maintenance.
+
+A selection of thousands of rows is not updated by looping save(). It is
+walked in batches of BULK_BATCH_SIZE primary keys, and each batch is one
+UPDATE (update()), or one SELECT and one bulk_update() when the new values
+have to be computed in Python (bulk_update_batches()). Every batch commits on
+its own, so locks stay short and a long run can be followed on the
+``carbon.bulk`` logger, which gets one line per batch. The functions return
+a Progress whose summary() the admin actions show as their message.
+"""
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger('carbon.bulk')
+
+
+class Progress:
+    """Rows and batches done so far in one bulk operation."""
+
+    def __init__(self, label):
+        self.label = label
+        self.rows = 0
+        self.batches = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def advance(self, rows):
+        self.rows += rows
+        self.batches += 1
+        logger.info(json.dumps({
+            'operation': self.label, 'batch': self.batches, 'rows': self.rows,
+            'elapsed_ms': round(self.elapsed * 1000, 1),
+        }))
+
+    def summary(self):
+        batches = 'batch' if self.batches == 1 else 'batches'
+        return f'{self.label}: {self.rows} rows in {self.batches} {batches} ({self.elapsed:.2f}s).'
+
+
+def batches(queryset, size=None):
+    """Primary keys of queryset in ascending lists of at most ``size``."""
+    size = size or getattr(settings, 'BULK_BATCH_SIZE', 1000)
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    last = None
+    while True:
+        batch = list((pks if last is None else pks.filter(pk__gt=last))[:size])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1]
+
+
+def update(queryset, label, size=None, **values):
+    """queryset.update(**values), one batch at a time."""
+    progress = Progress(label)
+    for pks in batches(queryset, size):
+        with transaction.atomic(using=queryset.db):
+            # Filtered through queryset again, so rows that changed meanwhile are skipped
+            progress.advance(queryset.filter(pk__in=pks).update(**values))
+    return progress
+
+
+def bulk_update_batches(queryset, fields, apply, label, load=None, size=None):
+    """
+    Load queryset a batch at a time, call apply(objects) and bulk_update() ``fields``.
+
+    apply() changes the loaded objects in place; it can also return a new
+    list, e.g. only the objects that actually changed. ``load`` can add
+    select_related() or annotations to each batch's queryset; batches() only
+    reads primary keys.
+    """
+    progress = Progress(label)
+    for pks in batches(queryset, size):
+        with transaction.atomic(using=queryset.db):
+            batch = queryset.filter(pk__in=pks)
+            objects = list(load(batch) if load else batch)
+            changed = apply(objects)
+            changed = objects if changed is None else changed
+            if changed:
+                queryset.model._base_manager.using(queryset.db).bulk_update(changed, fields)
+            progress.advance(len(changed))
+    return progress
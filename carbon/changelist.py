@@ -0,0 +1,129 @@
+"""
+Admin change lists for tables too big to count or page by offset.
+
+The stock change list runs COUNT(*) over the filtered rows, a second COUNT(*)
+over the whole table, and pages with OFFSET. Each of these reads every row
+before the page it shows. LargeTableAdmin instead:
+
+* pages by cursor. The link to the next page carries the ``cursor_fields``
+  values of the last row shown, and the next page starts after them. With an
+  index on those fields, any page costs the same as the first. There is a
+  "next" link and a link back to the first page, but no numbered pages.
+* shows an estimated count. On PostgreSQL it uses the planner's row
+  estimate, and counts exactly only when that is below
+  ADMIN_EXACT_COUNT_LIMIT. Other databases always count exactly.
+* leaves out column sorting, facet counts and "show all". They don't fit a
+  fixed, indexed order or need a full-table scan.
+
+Subclasses still set list_select_related for whatever their list_display
+reaches through foreign keys.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters, ShowFacets
+from django.contrib.admin.views.main import ChangeList
+from django.db import connections
+from django.db.models import Q
+
+CURSOR_VAR = 'cursor'
+
+
+def estimated_count(queryset):
+    """(count, estimated) for queryset; the planner's estimate when it is large."""
+    if connections[queryset.db].vendor == 'postgresql':
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        rows = int(plan[0]['Plan']['Plan Rows'])
+        if rows >= getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', 10000):
+            return rows, True
+    return queryset.count(), False
+
+
+def _split(field):
+    return (field[1:], True) if field.startswith('-') else (field, False)
+
+
+def encode_cursor(obj, fields):
+    values = [str(getattr(obj, _split(field)[0])) for field in fields]
+    # Without the '=' padding, which would be escaped in the link
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, fields):
+    """Field values from a cursor; raises IncorrectLookupParameters for a bad one."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if len(values) != len(fields):
+            raise ValueError(cursor)
+        return [model._meta.get_field(_split(field)[0]).to_python(value) for field, value in zip(fields, values)]
+    except Exception as exc:
+        raise IncorrectLookupParameters(exc) from exc
+
+
+def after(fields, values):
+    """Q for the rows that come after ``values`` in the order given by ``fields``."""
+    condition = Q()
+    equal = Q()
+    for field, value in zip(fields, values):
+        name, descending = _split(field)
+        condition |= equal & Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+class CursorChangeList(ChangeList):
+    def __init__(self, request, *args, **kwargs):
+        # Read before the base class filters and pages in its __init__
+        self.cursor = request.GET.get(CURSOR_VAR)
+        super().__init__(request, *args, **kwargs)
+        # Filter and search links start again from the first page
+        self.params.pop(CURSOR_VAR, None)
+        self.filter_params.pop(CURSOR_VAR, None)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_ordering(self, request, queryset):
+        # The cursor only works in its own order
+        return list(self.model_admin.cursor_fields)
+
+    def get_results(self, request):
+        fields = self.model_admin.cursor_fields
+        self.result_count, self.result_count_estimated = estimated_count(self.queryset)
+        page = self.queryset
+        if self.cursor:
+            page = page.filter(after(fields, decode_cursor(self.cursor, self.model, fields)))
+        # One extra row tells whether there is a next page
+        rows = list(page[:self.list_per_page + 1])
+        self.result_list = rows[:self.list_per_page]
+        self.next_cursor = encode_cursor(self.result_list[-1], fields) if len(rows) > self.list_per_page else None
+
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = bool(self.cursor or self.next_cursor)
+        self.paginator = None
+
+    def next_page_url(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor}) if self.next_cursor else None
+
+    def first_page_url(self):
+        return self.get_query_string(remove=[CURSOR_VAR]) if self.cursor else None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """ModelAdmin with cursor pagination and estimated counts; see the module docstring."""
+    # Unique together, and covered by an index, e.g. ('-date', '-id')
+    cursor_fields = ('-id',)
+    change_list_template = 'admin/cursor_change_list.html'
+    show_full_result_count = False
+    show_facets = ShowFacets.NEVER
+    sortable_by = ()
+
+    def get_changelist(self, request, **kwargs):
+        return CursorChangeList
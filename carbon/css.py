@@ -0,0 +1,585 @@
+"""
+Build the site's utility CSS from the templates.
+
+The pages use Tailwind's utility classes. They used to load Tailwind's
+browser build from its CDN, which compiles the CSS in the page on every
+load. ``python manage.py build_css`` now writes the same rules ahead of time
+to static/css/utilities.css. Only the classes that appear in the templates
+and static scripts are written (found the way Tailwind's own scanner finds
+them), after Tailwind's preflight reset. Classes that aren't Tailwind
+utilities, such as the ones layout.css defines, are ignored.
+
+Templates that build a class name from a variable, as in
+``bg-{{ challenge.icon_color }}-100``, get the class for every colour in
+DYNAMIC_COLORS.
+
+This covers the parts of Tailwind v3 the templates use. A class name that
+looks like a utility but gets no rule makes the command fail, so a missing
+utility is caught at build time instead of showing up as an unstyled page.
+NOT_UTILITIES lists the names that look like utilities but are meant to be
+skipped. Rerun the command after changing templates; the tests fail while
+the file is out of date. They also render the pages and fail on any class
+in them that neither rule() nor one of our own stylesheets styles. That
+catches unknown utilities the name check misses, like ``sticky`` or
+``tracking-wide``.
+"""
+import os
+import re
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+
+OUTPUT = Path(settings.BASE_DIR) / 'static' / 'css' / 'utilities.css'
+
+# Colours ChallengeType.icon_color can take (see create_challenges)
+DYNAMIC_COLORS = ['gray', 'red', 'orange', 'yellow', 'green', 'teal', 'blue', 'indigo', 'purple']
+
+SCREENS = {'sm': 640, 'md': 768, 'lg': 1024, 'xl': 1280, '2xl': 1536}
+# Later variants win when they conflict, as in Tailwind
+VARIANTS = ['hover', 'focus', *SCREENS]
+
+PALETTE = {
+    'gray': ['f9fafb', 'f3f4f6', 'e5e7eb', 'd1d5db', '9ca3af', '6b7280', '4b5563', '374151', '1f2937', '111827', '030712'],
+    'red': ['fef2f2', 'fee2e2', 'fecaca', 'fca5a5', 'f87171', 'ef4444', 'dc2626', 'b91c1c', '991b1b', '7f1d1d', '450a0a'],
+    'orange': ['fff7ed', 'ffedd5', 'fed7aa', 'fdba74', 'fb923c', 'f97316', 'ea580c', 'c2410c', '9a3412', '7c2d12', '431407'],
+    'yellow': ['fefce8', 'fef9c3', 'fef08a', 'fde047', 'facc15', 'eab308', 'ca8a04', 'a16207', '854d0e', '713f12', '422006'],
+    'green': ['f0fdf4', 'dcfce7', 'bbf7d0', '86efac', '4ade80', '22c55e', '16a34a', '15803d', '166534', '14532d', '052e16'],
+    'teal': ['f0fdfa', 'ccfbf1', '99f6e4', '5eead4', '2dd4bf', '14b8a6', '0d9488', '0f766e', '115e59', '134e4a', '042f2e'],
+    'blue': ['eff6ff', 'dbeafe', 'bfdbfe', '93c5fd', '60a5fa', '3b82f6', '2563eb', '1d4ed8', '1e40af', '1e3a8a', '172554'],
+    'indigo': ['eef2ff', 'e0e7ff', 'c7d2fe', 'a5b4fc', '818cf8', '6366f1', '4f46e5', '4338ca', '3730a3', '312e81', '1e1b4b'],
+    'purple': ['faf5ff', 'f3e8ff', 'e9d5ff', 'd8b4fe', 'c084fc', 'a855f7', '9333ea', '7e22ce', '6b21a8', '581c87', '3b0764'],
+}
+SHADES = ['50', '100', '200', '300', '400', '500', '600', '700', '800', '900', '950']
+
+FONT_SIZES = {
+    'xs': ('0.75rem', '1rem'), 'sm': ('0.875rem', '1.25rem'), 'base': ('1rem', '1.5rem'),
+    'lg': ('1.125rem', '1.75rem'), 'xl': ('1.25rem', '1.75rem'), '2xl': ('1.5rem', '2rem'),
+    '3xl': ('1.875rem', '2.25rem'), '4xl': ('2.25rem', '2.5rem'), '5xl': ('3rem', '1'),
+    '6xl': ('3.75rem', '1'), '7xl': ('4.5rem', '1'),
+}
+FONT_WEIGHTS = {'light': '300', 'normal': '400', 'medium': '500', 'semibold': '600', 'bold': '700', 'extrabold': '800', 'black': '900'}
+MAX_WIDTHS = {
+    'xs': '20rem', 'sm': '24rem', 'md': '28rem', 'lg': '32rem', 'xl': '36rem', '2xl': '42rem', '3xl': '48rem',
+    '4xl': '56rem', '5xl': '64rem', '6xl': '72rem', '7xl': '80rem', 'full': '100%', 'none': 'none',
+}
+RADII = {'none': '0px', 'sm': '0.125rem', '': '0.25rem', 'md': '0.375rem', 'lg': '0.5rem', 'xl': '0.75rem', '2xl': '1rem', '3xl': '1.5rem', 'full': '9999px'}
+SHADOWS = {
+    'sm': '0 1px 2px 0 {}',
+    '': '0 1px 3px 0 {}, 0 1px 2px -1px {}',
+    'md': '0 4px 6px -1px {}, 0 2px 4px -2px {}',
+    'lg': '0 10px 15px -3px {}, 0 4px 6px -4px {}',
+    'xl': '0 20px 25px -5px {}, 0 8px 10px -6px {}',
+    '2xl': '0 25px 50px -12px {}',
+}
+SHADOW_ALPHA = {'sm': '0.05', '2xl': '0.25'}
+DROP_SHADOWS = {
+    'sm': 'drop-shadow(0 1px 1px rgb(0 0 0 / 0.05))',
+    '': 'drop-shadow(0 1px 2px rgb(0 0 0 / 0.1)) drop-shadow(0 1px 1px rgb(0 0 0 / 0.06))',
+    'md': 'drop-shadow(0 4px 3px rgb(0 0 0 / 0.07)) drop-shadow(0 2px 2px rgb(0 0 0 / 0.06))',
+    'lg': 'drop-shadow(0 10px 8px rgb(0 0 0 / 0.04)) drop-shadow(0 4px 3px rgb(0 0 0 / 0.1))',
+    'xl': 'drop-shadow(0 20px 13px rgb(0 0 0 / 0.03)) drop-shadow(0 8px 5px rgb(0 0 0 / 0.08))',
+}
+EASINGS = {'linear': 'linear', 'in': 'cubic-bezier(0.4, 0, 1, 1)', 'out': 'cubic-bezier(0, 0, 0.2, 1)', 'in-out': 'cubic-bezier(0.4, 0, 0.2, 1)'}
+TRANSITIONS = {
+    '': 'color, background-color, border-color, text-decoration-color, fill, stroke, opacity, box-shadow, transform, filter, backdrop-filter',
+    'all': 'all',
+    'colors': 'color, background-color, border-color, text-decoration-color, fill, stroke',
+    'opacity': 'opacity',
+    'shadow': 'box-shadow',
+    'transform': 'transform',
+}
+TRANSFORM = (
+    'translate(var(--tw-translate-x), var(--tw-translate-y)) rotate(var(--tw-rotate)) skewX(var(--tw-skew-x)) '
+    'skewY(var(--tw-skew-y)) scaleX(var(--tw-scale-x)) scaleY(var(--tw-scale-y))'
+)
+FILTER = (
+    'var(--tw-blur) var(--tw-brightness) var(--tw-contrast) var(--tw-grayscale) var(--tw-hue-rotate) '
+    'var(--tw-invert) var(--tw-saturate) var(--tw-sepia) var(--tw-drop-shadow)'
+)
+BOX_SHADOW = 'var(--tw-ring-offset-shadow, 0 0 #0000), var(--tw-ring-shadow, 0 0 #0000), var(--tw-shadow)'
+
+# One declaration block per class name; utilities with nothing to vary
+STATIC = {
+    'block': 'display:block', 'inline-block': 'display:inline-block', 'inline': 'display:inline',
+    'flex': 'display:flex', 'inline-flex': 'display:inline-flex', 'grid': 'display:grid', 'hidden': 'display:none',
+    'static': 'position:static', 'fixed': 'position:fixed', 'absolute': 'position:absolute',
+    'relative': 'position:relative', 'sticky': 'position:sticky',
+    'flex-1': 'flex:1 1 0%', 'flex-auto': 'flex:1 1 auto', 'flex-none': 'flex:none',
+    'flex-grow': 'flex-grow:1', 'grow': 'flex-grow:1', 'flex-shrink-0': 'flex-shrink:0', 'shrink-0': 'flex-shrink:0',
+    'flex-row': 'flex-direction:row', 'flex-col': 'flex-direction:column', 'flex-wrap': 'flex-wrap:wrap',
+    'items-start': 'align-items:flex-start', 'items-end': 'align-items:flex-end',
+    'items-center': 'align-items:center', 'items-baseline': 'align-items:baseline', 'items-stretch': 'align-items:stretch',
+    'justify-start': 'justify-content:flex-start', 'justify-end': 'justify-content:flex-end',
+    'justify-center': 'justify-content:center', 'justify-between': 'justify-content:space-between',
+    'justify-around': 'justify-content:space-around',
+    'overflow-hidden': 'overflow:hidden', 'overflow-auto': 'overflow:auto', 'overflow-x-auto': 'overflow-x:auto',
+    'object-cover': 'object-fit:cover', 'object-contain': 'object-fit:contain',
+    'aspect-video': 'aspect-ratio:16 / 9', 'aspect-square': 'aspect-ratio:1 / 1',
+    'whitespace-nowrap': 'white-space:nowrap', 'truncate': 'overflow:hidden;text-overflow:ellipsis;white-space:nowrap',
+    'cursor-pointer': 'cursor:pointer', 'cursor-not-allowed': 'cursor:not-allowed', 'resize-none': 'resize:none',
+    'text-left': 'text-align:left', 'text-center': 'text-align:center', 'text-right': 'text-align:right',
+    'uppercase': 'text-transform:uppercase', 'lowercase': 'text-transform:lowercase', 'capitalize': 'text-transform:capitalize',
+    'italic': 'font-style:italic', 'underline': 'text-decoration-line:underline', 'no-underline': 'text-decoration-line:none',
+    'tracking-tight': 'letter-spacing:-0.025em', 'tracking-wide': 'letter-spacing:0.025em', 'tracking-wider': 'letter-spacing:0.05em',
+    'leading-none': 'line-height:1', 'leading-tight': 'line-height:1.25', 'leading-snug': 'line-height:1.375',
+    'leading-normal': 'line-height:1.5', 'leading-relaxed': 'line-height:1.625', 'leading-loose': 'line-height:2',
+    'font-sans': 'font-family:ui-sans-serif, system-ui, sans-serif, "Apple Color Emoji", "Segoe UI Emoji", "Segoe UI Symbol", "Noto Color Emoji"',
+    'font-mono': 'font-family:ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, "Liberation Mono", "Courier New", monospace',
+    'bg-clip-text': '-webkit-background-clip:text;background-clip:text',
+    'outline-none': 'outline:2px solid transparent;outline-offset:2px',
+    'transform': f'transform:{TRANSFORM}',
+    'col-span-full': 'grid-column:1 / -1',
+    'border': 'border-width:1px', 'border-0': 'border-width:0px',
+    'min-h-screen': 'min-height:100vh', 'min-h-full': 'min-height:100%',
+    'mx-auto': 'margin-left:auto;margin-right:auto',
+    'bg-gradient-to-r': 'background-image:linear-gradient(to right, var(--tw-gradient-stops))',
+    'bg-gradient-to-l': 'background-image:linear-gradient(to left, var(--tw-gradient-stops))',
+    'bg-gradient-to-b': 'background-image:linear-gradient(to bottom, var(--tw-gradient-stops))',
+    'bg-gradient-to-br': 'background-image:linear-gradient(to bottom right, var(--tw-gradient-stops))',
+    'sr-only': 'position:absolute;width:1px;height:1px;padding:0;margin:-1px;overflow:hidden;clip:rect(0, 0, 0, 0);white-space:nowrap;border-width:0',
+}
+
+# Utility families in the order Tailwind emits them, so later ones win
+# (px-6 over p-4, border-l-4 over border, ...)
+ORDER = [
+    'container', 'sr-only', 'position', 'inset', 'z', 'order', 'col', 'margin', 'margin-axis', 'margin-side',
+    'display', 'aspect', 'size-h', 'size-min-h', 'size-w', 'size-max-w', 'flex', 'transform-value', 'transform',
+    'cursor', 'resize', 'grid-cols', 'flex-direction', 'align', 'justify', 'gap', 'space', 'divide', 'divide-color',
+    'divide-opacity', 'overflow', 'whitespace', 'rounded', 'rounded-side', 'rounded-corner', 'border-width', 'border-side', 'border-color',
+    'border-opacity', 'bg', 'bg-opacity',
+    'bg-image', 'gradient-from', 'gradient-to', 'bg-clip', 'object', 'padding', 'padding-axis', 'padding-side',
+    'text-align', 'font-family', 'font-size', 'font-weight', 'text-transform', 'leading', 'tracking', 'text-color',
+    'text-opacity', 'decoration', 'opacity', 'shadow', 'shadow-color', 'outline', 'ring', 'ring-color',
+    'ring-opacity', 'filter', 'transition', 'duration', 'ease',
+]
+STATIC_FAMILIES = {
+    'sr-only': 'sr-only', 'position': ('static', 'fixed', 'absolute', 'relative', 'sticky'),
+    'display': ('block', 'inline-block', 'inline', 'flex', 'inline-flex', 'grid', 'hidden'),
+    'aspect': ('aspect-video', 'aspect-square'), 'size-min-h': ('min-h-screen', 'min-h-full'),
+    'flex': ('flex-1', 'flex-auto', 'flex-none', 'flex-grow', 'grow', 'flex-shrink-0', 'shrink-0'),
+    'transform': ('transform',), 'cursor': ('cursor-pointer', 'cursor-not-allowed'), 'resize': ('resize-none',),
+    'flex-direction': ('flex-row', 'flex-col', 'flex-wrap'),
+    'overflow': ('overflow-hidden', 'overflow-auto', 'overflow-x-auto', 'truncate'),
+    'whitespace': ('whitespace-nowrap',), 'object': ('object-cover', 'object-contain'),
+    'col': ('col-span-full',), 'margin-axis': ('mx-auto',), 'border-width': ('border', 'border-0'),
+    'bg-image': ('bg-gradient-to-r', 'bg-gradient-to-l', 'bg-gradient-to-b', 'bg-gradient-to-br'),
+    'bg-clip': ('bg-clip-text',), 'text-align': ('text-left', 'text-center', 'text-right'),
+    'font-family': ('font-sans', 'font-mono'),
+    'text-transform': ('uppercase', 'lowercase', 'capitalize', 'italic'),
+    'decoration': ('underline', 'no-underline'), 'outline': ('outline-none',),
+}
+_FAMILY_OF = {name: family for family, names in STATIC_FAMILIES.items() for name in (names if isinstance(names, tuple) else (names,))}
+_FAMILY_OF.update({name: 'align' for name in STATIC if name.startswith('items-')})
+_FAMILY_OF.update({name: 'justify' for name in STATIC if name.startswith('justify-')})
+_FAMILY_OF.update({name: 'tracking' for name in STATIC if name.startswith('tracking-')})
+_FAMILY_OF.update({name: 'leading' for name in STATIC if name.startswith('leading-')})
+
+# Tailwind's defaults for the variables its utilities compose
+VARIABLES = (
+    '--tw-border-spacing-x:0;--tw-border-spacing-y:0;--tw-translate-x:0;--tw-translate-y:0;--tw-rotate:0;'
+    '--tw-skew-x:0;--tw-skew-y:0;--tw-scale-x:1;--tw-scale-y:1;--tw-ring-inset: ;--tw-ring-offset-width:0px;'
+    '--tw-ring-offset-color:#fff;--tw-ring-color:rgb(59 130 246 / 0.5);--tw-ring-offset-shadow:0 0 #0000;'
+    '--tw-ring-shadow:0 0 #0000;--tw-shadow:0 0 #0000;--tw-shadow-colored:0 0 #0000;--tw-blur: ;'
+    '--tw-brightness: ;--tw-contrast: ;--tw-grayscale: ;--tw-hue-rotate: ;--tw-invert: ;--tw-saturate: ;'
+    '--tw-sepia: ;--tw-drop-shadow: ;--tw-gradient-from-position: ;--tw-gradient-via-position: ;'
+    '--tw-gradient-to-position: '
+)
+
+# Tailwind v3's preflight (MIT licensed), which the CDN build also injects
+PREFLIGHT = """*,::after,::before{box-sizing:border-box;border-width:0;border-style:solid;border-color:#e5e7eb}
+::after,::before{--tw-content:''}
+:host,html{line-height:1.5;-webkit-text-size-adjust:100%;-moz-tab-size:4;tab-size:4;font-family:ui-sans-serif, system-ui, sans-serif, "Apple Color Emoji", "Segoe UI Emoji", "Segoe UI Symbol", "Noto Color Emoji";font-feature-settings:normal;font-variation-settings:normal;-webkit-tap-highlight-color:transparent}
+body{margin:0;line-height:inherit}
+hr{height:0;color:inherit;border-top-width:1px}
+abbr:where([title]){-webkit-text-decoration:underline dotted;text-decoration:underline dotted}
+h1,h2,h3,h4,h5,h6{font-size:inherit;font-weight:inherit}
+a{color:inherit;text-decoration:inherit}
+b,strong{font-weight:bolder}
+code,kbd,pre,samp{font-family:ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, "Liberation Mono", "Courier New", monospace;font-feature-settings:normal;font-variation-settings:normal;font-size:1em}
+small{font-size:80%}
+sub,sup{font-size:75%;line-height:0;position:relative;vertical-align:baseline}
+sub{bottom:-.25em}
+sup{top:-.5em}
+table{text-indent:0;border-color:inherit;border-collapse:collapse}
+button,input,optgroup,select,textarea{font-family:inherit;font-feature-settings:inherit;font-variation-settings:inherit;font-size:100%;font-weight:inherit;line-height:inherit;letter-spacing:inherit;color:inherit;margin:0;padding:0}
+button,select{text-transform:none}
+button,input:where([type=button]),input:where([type=reset]),input:where([type=submit]){-webkit-appearance:button;background-color:transparent;background-image:none}
+:-moz-focusring{outline:auto}
+:-moz-ui-invalid{box-shadow:none}
+progress{vertical-align:baseline}
+::-webkit-inner-spin-button,::-webkit-outer-spin-button{height:auto}
+[type=search]{-webkit-appearance:textfield;outline-offset:-2px}
+::-webkit-search-decoration{-webkit-appearance:none}
+::-webkit-file-upload-button{-webkit-appearance:button;font:inherit}
+summary{display:list-item}
+blockquote,dd,dl,figure,h1,h2,h3,h4,h5,h6,hr,p,pre{margin:0}
+fieldset{margin:0;padding:0}
+legend{padding:0}
+menu,ol,ul{list-style:none;margin:0;padding:0}
+dialog{padding:0}
+textarea{resize:vertical}
+input::placeholder,textarea::placeholder{opacity:1;color:#9ca3af}
+[role=button],button{cursor:pointer}
+:disabled{cursor:default}
+audio,canvas,embed,iframe,img,object,svg,video{display:block;vertical-align:middle}
+img,video{max-width:100%;height:auto}
+[hidden]:where(:not([hidden=until-found])){display:none}
+"""
+
+# Candidate class names, as Tailwind's content scanner finds them
+_CANDIDATE = re.compile(r"[^<>\"'`\s{}=]*[^<>\"'`\s.:{}=]")
+# A class built from a template variable, e.g. hover:bg-{{ challenge.icon_color }}-700
+_DYNAMIC = re.compile(r"([\w:-]*-)\{\{[^}]*\}\}(-\d+)")
+
+
+# Names that look like utilities, for reporting the ones rule() doesn't know
+_UTILITY_LIKE = re.compile(
+    r'-?(?:bg|text|border|rounded|shadow|ring|from|to|font|p[xytrbl]?|m[xytrbl]?|w|h|max-w|min-h|gap|space|'
+    r'grid-cols|col-span|flex|items|justify|z|order|opacity|duration|ease|transition|translate|scale)-[\w/.\[\]#-]+$'
+)
+
+# Names that look like utilities but aren't meant as ones: CSS property
+# names in the templates' <style> blocks, and the Bootstrap classes of
+# registration/logged_out.html. Any other unknown one fails the build.
+NOT_UTILITIES = {
+    'border-bottom', 'border-color', 'border-left', 'border-radius', 'border-top', 'flex-direction',
+    'font-family', 'font-size', 'font-style', 'font-weight', 'justify-content', 'text-align', 'text-decoration',
+    'text-primary', 'text-secondary',
+    'bg-dark', 'flex-column', 'justify-content-center', 'rounded-3', 'rounded-pill', 'text-muted',
+}
+
+
+def _spacing(value):
+    """Tailwind spacing scale: 4 -> 1rem, px -> 1px, 1/2 -> 50%, full -> 100%."""
+    if value == '0':
+        return '0px'
+    if value == 'px':
+        return '1px'
+    if value == 'full':
+        return '100%'
+    if value == 'auto':
+        return 'auto'
+    if re.fullmatch(r'\d+/\d+', value):
+        numerator, denominator = map(int, value.split('/'))
+        return f'{numerator / denominator * 100:g}%'
+    if re.fullmatch(r'\d+(\.5)?', value):
+        return f'{float(value) / 4:g}rem'
+    return None
+
+
+def _color(name):
+    """(r g b, hex) of a palette colour like 'green-500', 'black' or 'white'."""
+    if name == 'black':
+        return '0 0 0', '#000'
+    if name == 'white':
+        return '255 255 255', '#fff'
+    hue, _, shade = name.rpartition('-')
+    if hue not in PALETTE or shade not in SHADES:
+        return None
+    hex_value = PALETTE[hue][SHADES.index(shade)]
+    return ' '.join(str(int(hex_value[i:i + 2], 16)) for i in (0, 2, 4)), f'#{hex_value}'
+
+
+def _color_value(name, opacity_var):
+    """CSS for a colour utility value, honouring a /opacity modifier."""
+    name, _, alpha = name.partition('/')
+    if name in ('transparent', 'current', 'inherit'):
+        return {'transparent': 'transparent', 'current': 'currentColor', 'inherit': 'inherit'}[name], False
+    color = _color(name)
+    if color is None or (alpha and not alpha.isdigit()):
+        return None, False
+    if alpha:
+        return f'rgb({color[0]} / {int(alpha) / 100:g})', False
+    return f'rgb({color[0]} / var({opacity_var}))', True
+
+
+def _colored(prop, opacity_var, value):
+    css, uses_var = _color_value(value, opacity_var)
+    if css is None:
+        return None
+    return f'{opacity_var}:1;{prop}:{css}' if uses_var else f'{prop}:{css}'
+
+
+def _shadow(value, color):
+    return SHADOWS[value].format(*([color] * SHADOWS[value].count('{}')))
+
+
+def utility(name):
+    """(family, declarations, selector suffix) for a utility class name, or None."""
+    if name in STATIC:
+        return _FAMILY_OF.get(name, 'display'), STATIC[name], ''
+
+    negative = name.startswith('-')
+    base = name[1:] if negative else name
+    sign = '-' if negative else ''
+
+    match = re.fullmatch(r'(inset|top|right|bottom|left)-(.+)', base)
+    if match and _spacing(match[2]):
+        value = sign + _spacing(match[2])
+        props = ['top', 'right', 'bottom', 'left'] if match[1] == 'inset' else [match[1]]
+        return 'inset', ';'.join(f'{prop}:{value}' for prop in props), ''
+
+    match = re.fullmatch(r'(p|px|py|pt|pr|pb|pl|m|mx|my|mt|mr|mb|ml)-(.+)', base)
+    if match and _spacing(match[2]) and (match[1][0] == 'm' or not negative):
+        kind = 'padding' if match[1][0] == 'p' else 'margin'
+        value = sign + _spacing(match[2])
+        side = match[1][1:]
+        props = {
+            '': [kind], 'x': [f'{kind}-left', f'{kind}-right'], 'y': [f'{kind}-top', f'{kind}-bottom'],
+            't': [f'{kind}-top'], 'r': [f'{kind}-right'], 'b': [f'{kind}-bottom'], 'l': [f'{kind}-left'],
+        }[side]
+        family = kind if not side else f'{kind}-axis' if side in 'xy' else f'{kind}-side'
+        return family, ';'.join(f'{prop}:{value}' for prop in props), ''
+
+    if negative:
+        match = re.fullmatch(r'translate-([xy])-(.+)', base)
+        if match and _spacing(match[2]):
+            return 'transform-value', f'--tw-translate-{match[1]}:-{_spacing(match[2])};transform:{TRANSFORM}', ''
+        return None
+
+    match = re.fullmatch(r'translate-([xy])-(.+)', name)
+    if match and _spacing(match[2]):
+        return 'transform-value', f'--tw-translate-{match[1]}:{_spacing(match[2])};transform:{TRANSFORM}', ''
+    match = re.fullmatch(r'scale-(\d+)', name)
+    if match:
+        scale = f'{int(match[1]) / 100:g}'
+        return 'transform-value', f'--tw-scale-x:{scale};--tw-scale-y:{scale};transform:{TRANSFORM}', ''
+
+    match = re.fullmatch(r'(w|h)-(.+)', name)
+    if match:
+        value = {'screen': '100vw' if match[1] == 'w' else '100vh'}.get(match[2]) or _spacing(match[2])
+        if value:
+            return f'size-{match[1]}', f"{'width' if match[1] == 'w' else 'height'}:{value}", ''
+    match = re.fullmatch(r'max-w-(.+)', name)
+    if match and match[1] in MAX_WIDTHS:
+        return 'size-max-w', f'max-width:{MAX_WIDTHS[match[1]]}', ''
+
+    match = re.fullmatch(r'(z|order)-(\d+)', name)
+    if match:
+        return match[1], f"{'z-index' if match[1] == 'z' else 'order'}:{match[2]}", ''
+    match = re.fullmatch(r'col-span-(\d+)', name)
+    if match:
+        return 'col', f'grid-column:span {match[1]} / span {match[1]}', ''
+    match = re.fullmatch(r'grid-cols-(\d+)', name)
+    if match:
+        return 'grid-cols', f'grid-template-columns:repeat({match[1]}, minmax(0, 1fr))', ''
+    match = re.fullmatch(r'gap-(x-|y-)?(.+)', name)
+    if match and _spacing(match[2]):
+        prop = {'': 'gap', 'x-': 'column-gap', 'y-': 'row-gap'}[match[1] or '']
+        return 'gap', f'{prop}:{_spacing(match[2])}', ''
+
+    match = re.fullmatch(r'space-([xy])-(.+)', name)
+    if match and _spacing(match[2]):
+        value = _spacing(match[2])
+        if match[1] == 'x':
+            css = (f'--tw-space-x-reverse:0;margin-right:calc({value} * var(--tw-space-x-reverse));'
+                   f'margin-left:calc({value} * calc(1 - var(--tw-space-x-reverse)))')
+        else:
+            css = (f'--tw-space-y-reverse:0;margin-top:calc({value} * calc(1 - var(--tw-space-y-reverse)));'
+                   f'margin-bottom:calc({value} * var(--tw-space-y-reverse))')
+        return 'space', css, ' > :not([hidden]) ~ :not([hidden])'
+    match = re.fullmatch(r'divide-([xy])(?:-(\d+))?', name)
+    if match:
+        width = f'{match[2] or 1}px'
+        first, last = ('left', 'right') if match[1] == 'x' else ('top', 'bottom')
+        css = (f'--tw-divide-{match[1]}-reverse:0;'
+               f'border-{last}-width:calc({width} * var(--tw-divide-{match[1]}-reverse));'
+               f'border-{first}-width:calc({width} * calc(1 - var(--tw-divide-{match[1]}-reverse)))')
+        return 'divide', css, ' > :not([hidden]) ~ :not([hidden])'
+    match = re.fullmatch(r'divide-(.+)', name)
+    if match:
+        css = _colored('border-color', '--tw-divide-opacity', match[1])
+        if css:
+            return 'divide-color', css, ' > :not([hidden]) ~ :not([hidden])'
+
+    match = re.fullmatch(r'rounded(?:-(none|sm|md|lg|xl|2xl|3xl|full))?', name)
+    if match:
+        return 'rounded', f'border-radius:{RADII[match[1] or ""]}', ''
+    match = re.fullmatch(r'rounded-([trbl]|tl|tr|br|bl)(?:-(none|sm|md|lg|xl|2xl|3xl|full))?', name)
+    if match:
+        corners = {'t': ['top-left', 'top-right'], 'r': ['top-right', 'bottom-right'],
+                   'b': ['bottom-right', 'bottom-left'], 'l': ['top-left', 'bottom-left']}.get(match[1]) or [
+            {'tl': 'top-left', 'tr': 'top-right', 'br': 'bottom-right', 'bl': 'bottom-left'}[match[1]]]
+        family = 'rounded-side' if len(match[1]) == 1 else 'rounded-corner'
+        return family, ';'.join(f'border-{corner}-radius:{RADII[match[2] or ""]}' for corner in corners), ''
+    match = re.fullmatch(r'border-(\d+)', name)
+    if match:
+        return 'border-width', f'border-width:{match[1]}px', ''
+    match = re.fullmatch(r'border-([xytrbl])(?:-(\d+))?', name)
+    if match:
+        width = f'{match[2] or 1}px'
+        sides = {'x': ['left', 'right'], 'y': ['top', 'bottom']}.get(match[1]) or [
+            {'t': 'top', 'r': 'right', 'b': 'bottom', 'l': 'left'}[match[1]]]
+        return 'border-side', ';'.join(f'border-{side}-width:{width}' for side in sides), ''
+
+    match = re.fullmatch(r'(bg|text|border|ring|divide)-opacity-(\d+)', name)
+    if match:
+        return f'{match[1]}-opacity', f'--tw-{match[1]}-opacity:{int(match[2]) / 100:g}', ''
+
+    match = re.fullmatch(r'text-(.+)', name)
+    if match and match[1] in FONT_SIZES:
+        size, line_height = FONT_SIZES[match[1]]
+        return 'font-size', f'font-size:{size};line-height:{line_height}', ''
+    match = re.fullmatch(r'font-(.+)', name)
+    if match and match[1] in FONT_WEIGHTS:
+        return 'font-weight', f'font-weight:{FONT_WEIGHTS[match[1]]}', ''
+
+    for prefix, family, prop, opacity_var in (
+        ('bg', 'bg', 'background-color', '--tw-bg-opacity'),
+        ('text', 'text-color', 'color', '--tw-text-opacity'),
+        ('border', 'border-color', 'border-color', '--tw-border-opacity'),
+        ('ring', 'ring-color', '--tw-ring-color', '--tw-ring-opacity'),
+    ):
+        if name.startswith(prefix + '-'):
+            css = _colored(prop, opacity_var, name[len(prefix) + 1:])
+            if css:
+                return family, css, ''
+
+    match = re.fullmatch(r'(from|to)-(.+)', name)
+    if match and _color(match[2]):
+        rgb, hex_value = _color(match[2])
+        if match[1] == 'from':
+            css = (f'--tw-gradient-from:{hex_value} var(--tw-gradient-from-position);'
+                   f'--tw-gradient-to:rgb({rgb} / 0) var(--tw-gradient-to-position);'
+                   '--tw-gradient-stops:var(--tw-gradient-from), var(--tw-gradient-to)')
+        else:
+            css = f'--tw-gradient-to:{hex_value} var(--tw-gradient-to-position)'
+        return f'gradient-{match[1]}', css, ''
+
+    match = re.fullmatch(r'opacity-(\d+)', name)
+    if match:
+        return 'opacity', f'opacity:{int(match[1]) / 100:g}', ''
+
+    match = re.fullmatch(r'shadow(?:-(sm|md|lg|xl|2xl))?', name)
+    if match:
+        value = match[1] or ''
+        shadow = _shadow(value, f"rgb(0 0 0 / {SHADOW_ALPHA.get(value, '0.1')})")
+        colored = _shadow(value, 'var(--tw-shadow-color)')
+        return 'shadow', f'--tw-shadow:{shadow};--tw-shadow-colored:{colored};box-shadow:{BOX_SHADOW}', ''
+    match = re.fullmatch(r'shadow-\[([^\]]+)\]', name)
+    if match:
+        shadow = match[1].replace('_', ' ')
+        colored = re.sub(r'(#[0-9a-fA-F]{3,8}|rgba?\([^)]*\))$', 'var(--tw-shadow-color)', shadow)
+        return 'shadow', f'--tw-shadow:{shadow};--tw-shadow-colored:{colored};box-shadow:{BOX_SHADOW}', ''
+    match = re.fullmatch(r'shadow-([a-z]+(?:-\d+)?)(?:/(\d+))?', name)
+    if match and _color(match[1]):
+        rgb, hex_value = _color(match[1])
+        value = f'rgb({rgb} / {int(match[2]) / 100:g})' if match[2] else hex_value
+        return 'shadow-color', f'--tw-shadow-color:{value};--tw-shadow:var(--tw-shadow-colored)', ''
+
+    match = re.fullmatch(r'ring(?:-(\d+))?', name)
+    if match:
+        width = f'{match[1] or 3}px'
+        css = ('--tw-ring-offset-shadow:var(--tw-ring-inset) 0 0 0 var(--tw-ring-offset-width) var(--tw-ring-offset-color);'
+               f'--tw-ring-shadow:var(--tw-ring-inset) 0 0 0 calc({width} + var(--tw-ring-offset-width)) var(--tw-ring-color);'
+               'box-shadow:var(--tw-ring-offset-shadow), var(--tw-ring-shadow), var(--tw-shadow, 0 0 #0000)')
+        return 'ring', css, ''
+
+    match = re.fullmatch(r'drop-shadow(?:-(sm|md|lg|xl))?', name)
+    if match:
+        return 'filter', f'--tw-drop-shadow:{DROP_SHADOWS[match[1] or ""]};filter:{FILTER}', ''
+
+    match = re.fullmatch(r'transition(?:-(all|colors|opacity|shadow|transform))?', name)
+    if match:
+        css = (f'transition-property:{TRANSITIONS[match[1] or ""]};'
+               'transition-timing-function:cubic-bezier(0.4, 0, 0.2, 1);transition-duration:150ms')
+        return 'transition', css, ''
+    match = re.fullmatch(r'duration-(\d+)', name)
+    if match:
+        return 'duration', f'transition-duration:{match[1]}ms', ''
+    match = re.fullmatch(r'ease-(linear|in|out|in-out)', name)
+    if match:
+        return 'ease', f'transition-timing-function:{EASINGS[match[1]]}', ''
+    return None
+
+
+def _escape(name):
+    return re.sub(r'([^A-Za-z0-9_-])', r'\\\1', name)
+
+
+def rule(candidate):
+    """(sort key, CSS) for a class name with optional variants, or None."""
+    *variants, name = candidate.split(':')
+    if any(variant not in VARIANTS for variant in variants) or len(set(variants)) != len(variants):
+        return None
+    if name == 'container':
+        family, css, suffix = 'container', None, ''
+    else:
+        found = utility(name)
+        if found is None:
+            return None
+        family, css, suffix = found
+
+    selector = '.' + _escape(candidate)
+    states = ''.join(f':{variant}' for variant in variants if variant not in SCREENS)
+    screens = [variant for variant in variants if variant in SCREENS]
+    if family == 'container':
+        text = f'{selector}{states}{{width:100%}}' + ''.join(
+            f'@media (min-width:{width}px){{{selector}{states}{{max-width:{width}px}}}}' for width in SCREENS.values()
+        )
+    else:
+        text = f'{selector}{states}{suffix}{{{css}}}'
+    for screen in screens:
+        text = f'@media (min-width:{SCREENS[screen]}px){{{text}}}'
+
+    # Plain utilities, then states, then screens (smallest first), as in Tailwind
+    variant_rank = max((VARIANTS.index(variant) + 1 for variant in variants), default=0)
+    return (variant_rank, ORDER.index(family), candidate), text
+
+
+def template_sources():
+    """Template and static script files to look for class names in."""
+    roots = [Path(directory) for config in settings.TEMPLATES for directory in config.get('DIRS', [])]
+    base = Path(settings.BASE_DIR).resolve()
+    for app in apps.get_app_configs():
+        path = Path(app.path).resolve()
+        if base in path.parents:  # this project's apps, not Django's
+            roots.append(path / 'templates')
+    for root in roots:
+        root = root if root.is_absolute() else base / root
+        yield from sorted(root.rglob('*.html'))
+    for directory in settings.STATICFILES_DIRS:
+        yield from sorted(path for path in Path(directory).rglob('*.js') if not path.name.endswith('.min.js'))
+
+
+def candidates(text):
+    """Class-name candidates in a template or script, expanding variable colours."""
+    found = set()
+    for match in _DYNAMIC.finditer(text):
+        found.update(f'{match[1]}{color}{match[2]}' for color in DYNAMIC_COLORS)
+    found.update(_CANDIDATE.findall(_DYNAMIC.sub(' ', text)))
+    return found
+
+
+def utilities(paths=None):
+    """(rules in output order, class-like names that produced no rule, except NOT_UTILITIES)."""
+    names = set()
+    for path in paths or template_sources():
+        names |= candidates(path.read_text(encoding='utf-8'))
+    rules, unknown = [], set()
+    for name in names:
+        found = rule(name)
+        if found:
+            rules.append(found)
+        elif _UTILITY_LIKE.match(name.rpartition(':')[2]) and name.rpartition(':')[2] not in NOT_UTILITIES:
+            unknown.add(name)
+    return [text for _, text in sorted(rules)], unknown
+
+
+def build(paths=None):
+    """The stylesheet for the templates: preflight, variable defaults, utilities."""
+    rules, _ = utilities(paths)
+    header = '/* Generated by `python manage.py build_css` from the templates; do not edit. */\n'
+    variables = f'*,::after,::before,::backdrop{{{VARIABLES}}}\n'
+    return header + PREFLIGHT + variables + '\n'.join(rules) + '\n'
+
+
+def write(path=OUTPUT):
+    """Write the stylesheet; returns True when the file changed."""
+    css = build()
+    if path.exists() and path.read_text(encoding='utf-8') == css:
+        return False
+    os.makedirs(path.parent, exist_ok=True)
+    path.write_text(css, encoding='utf-8')
+    return True
@@ -0,0 +1,165 @@
+"""
+In-process publish/subscribe for the live event stream (core.views.event_stream).
+
+Writers call publish(channel, data) with a small JSON-ready dict. Inside a
+transaction it waits for the commit, so clients never hear about rows that
+were rolled back. Subscribers are the open event streams of this process.
+Each one has a bounded asyncio.Queue on its own event loop, and broadcast()
+hands events over with call_soon_threadsafe. That matters because writers
+run in sync threads. A subscriber that falls behind by EVENTS_QUEUE_SIZE
+events is told to reload instead of being sent a partial history.
+
+With several worker processes, a write only reaches the streams of the
+worker that handled it. Set EVENTS_REDIS_URL (with the ``redis`` package
+installed) to relay events through Redis pub/sub: publish() sends there, and
+each process runs one listener thread that broadcasts what it receives to
+its own subscribers. Without it, publish() broadcasts locally. That is the
+right behaviour for a single process and for the tests.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+# Optional: relays events between worker processes
+try:
+    import redis  # type: ignore
+except ImportError:
+    redis = None
+
+logger = logging.getLogger('carbon.events')
+
+REDIS_PREFIX = 'carbon.events:'
+
+
+class Subscription:
+    """One stream's queue; use as a context manager inside the event loop."""
+
+    def __init__(self, broker, channels, size):
+        self.broker = broker
+        self.channels = set(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(size)
+        self.overflowed = False
+
+    def __enter__(self):
+        self.broker.add(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.broker.discard(self)
+
+    def put(self, item):
+        # Runs on the subscriber's loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        """The next (channel, data); ('', {'type': 'reset'}) once events were dropped."""
+        if self.overflowed and self.queue.empty():
+            self.overflowed = False
+            return '', {'type': 'reset'}
+        return await self.queue.get()
+
+
+class Broker:
+    """Fans events out to this process's subscribers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def add(self, subscription):
+        with self._lock:
+            self._subscribers.add(subscription)
+
+    def discard(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def broadcast(self, channel, data):
+        with self._lock:
+            subscribers = [s for s in self._subscribers if channel in s.channels]
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, (channel, data))
+            except RuntimeError:
+                # The stream's loop has closed without unsubscribing
+                self.discard(subscription)
+
+
+broker = Broker()
+_listener = None
+_listener_lock = threading.Lock()
+_clients = {}
+
+
+def _redis_url():
+    url = getattr(settings, 'EVENTS_REDIS_URL', None)
+    return url if url and redis is not None else None
+
+
+def _listen(url):
+    """Broadcast everything published on Redis to this process, reconnecting on errors."""
+    while True:
+        try:
+            pubsub = redis.Redis.from_url(url).pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(f'{REDIS_PREFIX}*')
+            for message in pubsub.listen():
+                channel = message['channel'].decode().removeprefix(REDIS_PREFIX)
+                broker.broadcast(channel, json.loads(message['data']))
+        except Exception:
+            logger.exception('Event relay lost its Redis connection; retrying')
+            time.sleep(1)
+
+
+def subscribe(channels):
+    """A Subscription to channels; starts the Redis listener on first use when configured."""
+    global _listener
+    url = _redis_url()
+    if url:
+        with _listener_lock:
+            if _listener is None:
+                _listener = threading.Thread(target=_listen, args=(url,), name='carbon-events', daemon=True)
+                _listener.start()
+    return Subscription(broker, channels, getattr(settings, 'EVENTS_QUEUE_SIZE', 100))
+
+
+def has_listeners():
+    """Whether an event could reach anyone: a local stream, or other processes through Redis."""
+    return bool(_redis_url()) or broker.subscriber_count() > 0
+
+
+def _client(url):
+    # One connection pool per URL, shared by the request threads
+    if url not in _clients:
+        _clients[url] = redis.Redis.from_url(url)
+    return _clients[url]
+
+
+def _send(channel, data):
+    url = _redis_url()
+    if url:
+        try:
+            _client(url).publish(REDIS_PREFIX + channel, json.dumps(data, default=str))
+            return
+        except Exception:
+            logger.exception('Could not publish to Redis; broadcasting locally')
+    broker.broadcast(channel, data)
+
+
+def publish(channel, data):
+    """Send data to channel's subscribers, after the current transaction commits."""
+    transaction.on_commit(lambda: _send(channel, data))
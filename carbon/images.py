@@ -0,0 +1,72 @@
+"""
+Resized WebP and PNG copies of the site's images, for ``srcset``.
+
+The header logo was a 1024x1024 PNG (77 KB) shown at 32-40 CSS pixels on
+every page. ``python manage.py build_assets`` writes a copy of each image in
+RESPONSIVE_IMAGES at each listed width to static/images/responsive/, as WebP
+and as PNG for browsers without WebP. The ``{% responsive_image %}`` tag
+(core/templatetags/images.py) turns them into a <picture> with a srcset, so
+the browser downloads only the size it will show.
+
+The copies are committed like the other built assets. Pillow's encoders
+don't promise identical bytes across versions, and a git checkout doesn't
+keep modification times, so stale() only checks that every copy exists.
+Rerun the command after replacing an image.
+"""
+import os
+from pathlib import Path
+
+from django.conf import settings
+from PIL import Image
+
+STATIC_DIR = Path(settings.BASE_DIR) / 'static'
+OUTPUT_DIR = 'images/responsive'
+
+# Image (relative to static/) -> widths in pixels: each size it is shown at, 1x and 2x
+RESPONSIVE_IMAGES = {
+    'images/logo.png': [32, 40, 64, 80],
+}
+
+# Format -> (extension, save() options)
+FORMATS = {
+    'WEBP': ('webp', {'quality': 85, 'method': 6}),
+    'PNG': ('png', {'optimize': True}),
+}
+
+
+def variant_name(name, width, extension):
+    """Where the copy of ``name`` at ``width`` goes, relative to static/."""
+    stem = Path(name).stem
+    return f'{OUTPUT_DIR}/{stem}-{width}.{extension}'
+
+
+def variants(name):
+    """[(relative path, width, height, format)] for every copy of an image."""
+    with Image.open(STATIC_DIR / name) as image:
+        source_width, source_height = image.size
+    found = []
+    for width in RESPONSIVE_IMAGES[name]:
+        height = round(source_height * width / source_width)
+        for image_format, (extension, _) in FORMATS.items():
+            found.append((variant_name(name, width, extension), width, height, image_format))
+    return found
+
+
+def stale():
+    """Copies that are missing."""
+    return [path for name in RESPONSIVE_IMAGES for path, *_ in variants(name) if not (STATIC_DIR / path).exists()]
+
+
+def write():
+    """Write every copy; returns [(path, bytes)]."""
+    written = []
+    os.makedirs(STATIC_DIR / OUTPUT_DIR, exist_ok=True)
+    for name in RESPONSIVE_IMAGES:
+        with Image.open(STATIC_DIR / name) as source:
+            source.load()
+            for path, width, height, image_format in variants(name):
+                _, options = FORMATS[image_format]
+                resized = source.resize((width, height), Image.LANCZOS)
+                resized.save(STATIC_DIR / path, image_format, **options)
+                written.append((STATIC_DIR / path, (STATIC_DIR / path).stat().st_size))
+    return written
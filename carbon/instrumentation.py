@@ -0,0 +1,259 @@
+"""
+Per-request timing: SQL queries, template rendering and outbound API calls.
+
+RequestTimingMiddleware opens a RequestStats for every request. While it is
+active, a connection.execute_wrapper hook counts every query and times it, and
+keeps the slowest few together with the view code that issued them. The
+timed() context manager adds other work to the same request, for example
+template rendering (see TimedDjangoTemplates) or Gemini calls.
+
+Finished requests go into an in-process rolling window per URL name. The
+admin performance page reports percentiles from it. With the query guard on
+(see carbon/queryguard.py), queries are also grouped by shape.
+
+Queries a view hands to carbon/parallel.py run on pool threads. They are
+recorded in the same RequestStats, so db time can add up to more than the
+request's wall-clock time.
+"""
+import contextvars
+import heapq
+import math
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+from . import queryguard
+
+_current = contextvars.ContextVar('request_stats', default=None)
+# Where queries come from when no view frame is on the stack (pool threads)
+_origin = contextvars.ContextVar('query_origin', default=None)
+
+# Modules whose frames are reported as the origin of a query
+ORIGIN_MODULES = ('core.views', 'challenges.views')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class RequestStats:
+    def __init__(self, guard=False):
+        self.guard = guard
+        self.shapes = {}  # with the query guard on: {shape: [count, seconds, origin]}
+        self.slow = []  # with the query guard on: [(seconds, sql, origin)]
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = defaultdict(float)  # e.g. {'template': 0.012, 'gemini': 0.8}
+        self._slowest = []  # min-heap of (duration, n, sql, origin)
+        self._lock = threading.Lock()  # queries can arrive from parallel reads
+
+    def record_query(self, sql, duration):
+        with self._lock:
+            self.queries += 1
+            self.db_time += duration
+            limit = _setting('INSTRUMENTATION_SLOW_QUERIES', 5)
+            if len(self._slowest) < limit:
+                heapq.heappush(self._slowest, (duration, self.queries, sql, query_origin()))
+            elif limit and duration > self._slowest[0][0]:
+                # Only walk the stack for queries that make the list
+                heapq.heapreplace(self._slowest, (duration, self.queries, sql, query_origin()))
+            if self.guard:
+                self._record_shape(sql, duration)
+
+    def _record_shape(self, sql, duration):
+        key = queryguard.shape(sql)
+        entry = self.shapes.get(key)
+        if entry is None:
+            self.shapes[key] = [1, duration, query_origin()]
+        else:
+            entry[0] += 1
+            entry[1] += duration
+        if duration * 1000 >= _setting('QUERY_GUARD_SLOW_MS', 100):
+            self.slow.append((duration, sql, query_origin()))
+
+    @property
+    def slowest_queries(self):
+        return [
+            {'ms': round(duration * 1000, 2), 'sql': sql[:500], 'origin': origin}
+            for duration, _, sql, origin in sorted(self._slowest, reverse=True)
+        ]
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Value for the Server-Timing response header."""
+        parts = [f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"']
+        for name, seconds in sorted(self.timings.items()):
+            parts.append(f'{name};dur={seconds * 1000:.1f}')
+        parts.append(f'total;dur={self.duration * 1000:.1f}')
+        return ', '.join(parts)
+
+    def as_dict(self):
+        return {
+            'duration_ms': round(self.duration * 1000, 2),
+            'db_ms': round(self.db_time * 1000, 2),
+            'queries': self.queries,
+            **{f'{name}_ms': round(seconds * 1000, 2) for name, seconds in self.timings.items()},
+            'slow_queries': self.slowest_queries,
+        }
+
+
+def current():
+    """The RequestStats of the request being handled, or None."""
+    return _current.get()
+
+
+@contextmanager
+def collect(guard=False):
+    """Collect stats for everything inside the block; yields the RequestStats."""
+    stats = RequestStats(guard)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        stats.finish()
+        _current.reset(token)
+
+
+@contextmanager
+def timed(name):
+    """Add the time spent inside the block to the current request under ``name``."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.timings[name] += time.perf_counter() - started
+
+
+def query_origin():
+    """'module:function:line' of the innermost view frame on the stack, if any."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module in ORIGIN_MODULES:
+            return f'{module}:{frame.f_code.co_name}:{frame.f_lineno}'
+        frame = frame.f_back
+    return _origin.get()
+
+
+@contextmanager
+def origin(value):
+    """Report queries inside the block as coming from ``value`` (see query_origin)."""
+    token = _origin.set(value)
+    try:
+        yield
+    finally:
+        _origin.reset(token)
+
+
+def hook_connections():
+    """Time every query on this thread's connections until the returned stack is closed."""
+    hooks = ExitStack()
+    for alias in connections:
+        hooks.enter_context(connections[alias].execute_wrapper(record_queries))
+    return hooks
+
+
+def record_queries(execute, sql, params, many, context):
+    """connection.execute_wrapper hook that times each query into the current request."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record_query(sql, time.perf_counter() - started)
+
+
+class _TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return self.template.render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The regular Django template backend, with render time added to the request stats."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
+
+
+class RollingWindow:
+    """The last N finished requests per URL name, kept in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+
+    def add(self, url_name, stats):
+        size = _setting('INSTRUMENTATION_WINDOW', 1000)
+        sample = (stats.duration, stats.db_time, stats.queries, stats.timings.get('template', 0.0))
+        with self._lock:
+            window = self._requests.get(url_name)
+            if window is None or window.maxlen != size:
+                window = self._requests[url_name] = deque(window or (), maxlen=size)
+            window.append(sample)
+
+    def clear(self):
+        with self._lock:
+            self._requests.clear()
+
+    def query_counts(self):
+        """Queries per request, for every request in the window."""
+        with self._lock:
+            return [sample[2] for window in self._requests.values() for sample in window]
+
+    def summary(self):
+        """Percentiles per URL name, slowest p95 first."""
+        with self._lock:
+            snapshot = {name: list(window) for name, window in self._requests.items()}
+
+        rows = []
+        for name, samples in snapshot.items():
+            durations = sorted(s[0] for s in samples)
+            rows.append({
+                'url_name': name,
+                'requests': len(samples),
+                'p50_ms': round(percentile(durations, 50) * 1000, 1),
+                'p95_ms': round(percentile(durations, 95) * 1000, 1),
+                'p99_ms': round(percentile(durations, 99) * 1000, 1),
+                'db_avg_ms': round(sum(s[1] for s in samples) / len(samples) * 1000, 1),
+                'queries_avg': round(sum(s[2] for s in samples) / len(samples), 1),
+                'queries_max': max(s[2] for s in samples),
+                'template_avg_ms': round(sum(s[3] for s in samples) / len(samples) * 1000, 1),
+            })
+        return sorted(rows, key=lambda row: row['p95_ms'], reverse=True)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+window = RollingWindow()
@@ -0,0 +1,159 @@
+"""
+Bundle and minify the site's own scripts.
+
+The shared layout used to carry its script inline on every page, and the
+login and register pages each had their own copy of the password toggle.
+The sources now live in static/js/src/. ``python manage.py build_assets``
+concatenates them into the bundles in BUNDLES and writes them minified to
+static/, where the templates load them with ``defer``. As static files they
+are hashed, precompressed and cached like the stylesheet (carbon/storage.py).
+
+The minifier only removes comments and whitespace that the parser doesn't
+need. A line break is only dropped where automatic semicolon insertion can't
+happen (after ``{ ( [ , ;`` or before ``} ) ]``), and names are never
+rewritten. It knows about strings, template
+literals and regular expression literals, so it can't break code that
+contains ``//`` or ``/*``. gzip and Brotli then take care of the rest.
+"""
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+
+STATIC_DIR = Path(settings.BASE_DIR) / 'static'
+
+# Bundle (relative to static/) -> sources, in order
+BUNDLES = {
+    'js/site.min.js': ['js/src/layout.js', 'js/src/password.js'],
+    'js/landing.min.js': ['js/src/landing.js'],
+    'js/live.min.js': ['js/src/live.js'],
+}
+
+HEADER = '/* Generated by `python manage.py build_assets` from {sources}; do not edit. */\n'
+
+# A '/' after one of these (or at the start) opens a regex, not a division
+_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'instanceof', 'new', 'delete', 'void', 'throw'}
+# Spaces next to these characters are never needed
+_PUNCTUATION = set('{}()[];,:=<>?!&|*%^~')
+# No semicolon can be inserted at a line break after or before these
+_JOIN_AFTER = set('{([,;')
+_JOIN_BEFORE = set('})]')
+_WORD_END = re.compile(r'[\w$]+$')
+
+
+def _opens_regex(before):
+    """Whether a '/' after the code in ``before`` starts a regex literal."""
+    before = before.rstrip()
+    word = _WORD_END.search(before)
+    if word:
+        return word.group() in _REGEX_KEYWORDS
+    return not before or before[-1] in _REGEX_AFTER
+
+
+def _literal_end(source, i):
+    """Index just past the string, template or regex literal starting at source[i]."""
+    quote = source[i]
+    j = i + 1
+    in_class = False
+    while j < len(source):
+        char = source[j]
+        if char == '\\':
+            j += 2
+            continue
+        if quote != '/' and char == quote:
+            return j + 1
+        if quote == '/':
+            if char == '[':
+                in_class = True
+            elif char == ']':
+                in_class = False
+            elif char == '/' and not in_class:
+                j += 1
+                while j < len(source) and (source[j].isalnum() or source[j] == '_'):
+                    j += 1  # flags
+                return j
+        j += 1
+    return j
+
+
+def _tokens(source):
+    """Split source into ('code', text) and ('literal', text) chunks, dropping comments."""
+    chunks = []
+    start = i = 0
+    while i < len(source):
+        char, following = source[i], source[i + 1:i + 2]
+        if char == '/' and following in ('/', '*'):
+            chunks.append(('code', source[start:i]))
+            if following == '/':
+                end = source.find('\n', i)
+                i = len(source) if end == -1 else end
+            else:
+                end = source.find('*/', i + 2)
+                i = len(source) if end == -1 else end + 2
+                chunks.append(('code', ' '))
+            start = i
+        elif char in '\'"`' or (char == '/' and _opens_regex(source[max(0, i - 40):i])):
+            chunks.append(('code', source[start:i]))
+            start, i = i, _literal_end(source, i)
+            chunks.append(('literal', source[start:i]))
+            start = i
+        else:
+            i += 1
+    chunks.append(('code', source[start:]))
+    return [(kind, text) for kind, text in chunks if text]
+
+
+def _squeeze(code):
+    """Collapse the whitespace in a chunk of code (no strings or comments in it)."""
+    lines = []
+    for line in code.split('\n'):
+        line = re.sub(r'[ \t]+', ' ', line)
+        line = re.sub(r' ?([%s]) ?' % re.escape(''.join(_PUNCTUATION)), r'\1', line)
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def minify(source):
+    """source without comments and unneeded whitespace; see the module docstring."""
+    text = ''.join(_squeeze(chunk) if kind == 'code' else chunk for kind, chunk in _tokens(source))
+    # Strip indentation and blank lines last, across chunk boundaries
+    lines = []
+    for line in (line.strip() for line in text.split('\n')):
+        if not line:
+            continue
+        if lines and (lines[-1][-1] in _JOIN_AFTER or line[0] in _JOIN_BEFORE):
+            lines[-1] += line
+        else:
+            lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+def build(bundle):
+    sources = BUNDLES[bundle]
+    parts = [(STATIC_DIR / source).read_text(encoding='utf-8') for source in sources]
+    # ';' so a source that ends without one can't run into the next
+    return HEADER.format(sources=', '.join(sources)) + minify(';\n'.join(parts))
+
+
+def stale():
+    """Bundles whose file doesn't match a fresh build."""
+    return [
+        bundle for bundle in BUNDLES
+        if not (STATIC_DIR / bundle).exists() or (STATIC_DIR / bundle).read_text(encoding='utf-8') != build(bundle)
+    ]
+
+
+def write():
+    """Write every bundle; returns [(path, changed)]."""
+    written = []
+    for bundle in BUNDLES:
+        path = STATIC_DIR / bundle
+        script = build(bundle)
+        changed = not path.exists() or path.read_text(encoding='utf-8') != script
+        if changed:
+            os.makedirs(path.parent, exist_ok=True)
+            path.write_text(script, encoding='utf-8')
+        written.append((path, changed))
+    return written
@@ -0,0 +1,233 @@
+"""
+Prometheus-style counters and histograms for the application's hot paths.
+
+Each process aggregates into plain dicts guarded by one lock per metric, so
+recording a value costs a dict update. With several worker processes
+(gunicorn, uwsgi) set METRICS_DIR to a directory shared by the workers of one
+deployment: every process then writes a snapshot of its values to
+``<METRICS_DIR>/metrics_<pid>.json`` every METRICS_FLUSH_SECONDS, from a
+background thread started on the first recorded value, so requests never
+wait on the file. /metrics writes its own process's snapshot and adds up
+all of them, so whichever worker answers the scrape
+reports totals for the whole deployment. Clear the directory when the
+deployment restarts.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds; tuned for web requests and outbound API calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = {}
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY[name] = self
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(key): value if self.type == 'counter' else list(value) for key, value in self._values.items()}
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _start_flusher()
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # Per-bucket (not cumulative) counts, then sum and count
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    values[i] += 1
+                    break
+            values[-2] += value
+            values[-1] += 1
+        _start_flusher()
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+# --- Application metrics -------------------------------------------------
+
+FOOTPRINT_SAVES = Counter('carbon_footprint_saves_total', 'Carbon footprints saved.', ['source'])
+DAILY_LIMIT_REJECTIONS = Counter('carbon_daily_limit_rejections_total', 'Footprint saves refused by the daily limit.')
+VIEW_LATENCY = Histogram('carbon_view_latency_seconds', 'Dashboard and leaderboard latency per period.', ['view', 'period'])
+TIP_CACHE = Counter('carbon_tip_cache_total', 'AI tip cache lookups.', ['result'])
+GEMINI_LATENCY = Histogram('carbon_gemini_call_seconds', 'Gemini API call latency.')
+GEMINI_FAILURES = Counter('carbon_gemini_failures_total', 'Gemini API calls that raised or returned no text.')
+CHALLENGE_JOINS = Counter('carbon_challenge_joins_total', 'Challenges joined or rejoined.', ['category'])
+PROGRESS_UPDATES = Counter('carbon_challenge_progress_updates_total', 'Daily challenge progress updates.', ['completed'])
+RATE_LIMITED = Counter('carbon_rate_limited_total', 'Requests refused with 429 by a rate limit.', ['limit'])
+HTTP_REQUESTS = Histogram('carbon_http_request_seconds', 'Request latency per URL name and status class.', ['url_name', 'status'])
+
+
+# --- Multi-process snapshots ---------------------------------------------
+
+_flush_lock = threading.Lock()
+_flusher_pid = None
+
+
+def _metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def _snapshot_path(directory, pid=None):
+    return os.path.join(directory, f'metrics_{pid or os.getpid()}.json')
+
+
+def flush():
+    """Write this process's values to METRICS_DIR (no-op without it)."""
+    directory = _metrics_dir()
+    if not directory:
+        return
+    with _flush_lock:
+        data = {name: metric.snapshot() for name, metric in REGISTRY.items()}
+        os.makedirs(directory, exist_ok=True)
+        path = _snapshot_path(directory)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump(data, fh)
+        os.replace(tmp_path, path)
+
+
+def _flush_every():
+    while True:
+        time.sleep(getattr(settings, 'METRICS_FLUSH_SECONDS', 5))
+        try:
+            flush()
+        except OSError:
+            logger.warning('Could not write the metrics snapshot', exc_info=True)
+
+
+def _start_flusher():
+    """Start this process's flush thread, once; forked workers start their own."""
+    global _flusher_pid
+    if _flusher_pid == os.getpid() or not _metrics_dir():
+        return
+    with _flush_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_every, name='metrics-flush', daemon=True).start()
+
+
+atexit.register(flush)
+
+
+def collect():
+    """{metric name: {label key: value}} summed over every process snapshot."""
+    directory = _metrics_dir()
+    if not directory:
+        return {name: metric.snapshot() for name, metric in REGISTRY.items()}
+
+    flush()
+    totals = {name: {} for name in REGISTRY}
+    for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+        try:
+            with open(path) as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            continue  # being replaced right now; the next scrape picks it up
+        for name, values in data.items():
+            if name not in totals:
+                continue
+            merged = totals[name]
+            for key, value in values.items():
+                if isinstance(value, list):
+                    current = merged.setdefault(key, [0] * len(value))
+                    merged[key] = [a + b for a, b in zip(current, value)]
+                else:
+                    merged[key] = merged.get(key, 0) + value
+    return totals
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    collected = collect()
+    for name, metric in REGISTRY.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.type}')
+        values = collected.get(name) or {}
+        if not values and not metric.labelnames and metric.type == 'counter':
+            values = {'[]': 0}  # unlabelled counters are reported from the start
+        for key, value in sorted(values.items()):
+            labels = json.loads(key)
+            if metric.type == 'counter':
+                lines.append(f'{name}{_format_labels(metric.labelnames, labels)} {_format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets, value):
+                cumulative += count
+                extra = [('le', repr(float(bound)))]
+                lines.append(f'{name}_bucket{_format_labels(metric.labelnames, labels, extra)} {cumulative}')
+            inf = [('le', '+Inf')]
+            lines.append(f'{name}_bucket{_format_labels(metric.labelnames, labels, inf)} {value[-1]}')
+            lines.append(f'{name}_sum{_format_labels(metric.labelnames, labels)} {_format_value(value[-2])}')
+            lines.append(f'{name}_count{_format_labels(metric.labelnames, labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
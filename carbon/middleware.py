@@ -0,0 +1,186 @@
+import json
+import logging
+from fnmatch import fnmatchcase
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.middleware import gzip
+
+from . import instrumentation, metrics, queryguard, routers
+from .static import StaticFiles
+
+logger = logging.getLogger('carbon.requests')
+
+
+class StaticFilesMiddleware:
+    """
+    Serve STATIC_URL from STATIC_ROOT with precompressed copies and long cache headers.
+
+    First in MIDDLEWARE: asset requests skip sessions, auth, the request log
+    and the metrics. The files are indexed once per worker (carbon/static.py).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.files = StaticFiles.from_settings()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self.files.find(request.path_info)
+        if static_file is None:
+            return self.get_response(request)
+        return static_file.serve(request)
+
+    async def __acall__(self, request):
+        static_file = self.files.find(request.path_info)
+        if static_file is None:
+            return await self.get_response(request)
+        # Opens the file and returns; the ASGI handler reads it off the event loop
+        return static_file.serve(request)
+
+
+class GZipMiddleware(gzip.GZipMiddleware):
+    """
+    GZipMiddleware that leaves server-sent event streams alone.
+
+    Compressed, each event would wait in the gzip buffer until enough
+    followed it to fill a block.
+    """
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+        return super().process_response(request, response)
+
+
+class RequestTimingMiddleware:
+    """
+    Time every request: SQL queries, templates and outbound API calls.
+
+    Each request gets a Server-Timing header (for staff, or everyone with
+    SERVER_TIMING_PUBLIC on) and one JSON log line on the ``carbon.requests`` logger. The line
+    is a warning, with the slowest queries and their origin, when the request
+    took longer than INSTRUMENTATION_SLOW_REQUEST_MS. Every request is also
+    added to the rolling window behind the admin performance page.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, 'INSTRUMENTATION_ENABLED', True):
+            return self.get_response(request)
+
+        with instrumentation.collect(guard=queryguard.enabled()) as stats:
+            with instrumentation.hook_connections():
+                response = self.get_response(request)
+        # Streaming bodies are produced after this point and are not included
+        return self.finish(request, response, stats, getattr(request, 'user', None))
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'INSTRUMENTATION_ENABLED', True):
+            return await self.get_response(request)
+
+        with instrumentation.collect(guard=queryguard.enabled()) as stats:
+            # Connections are per thread: the async ORM runs the request's
+            # queries on its thread-sensitive executor, so hook them there
+            hooks = await sync_to_async(instrumentation.hook_connections)()
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(hooks.close)()
+        user = await request.auser() if hasattr(request, 'auser') else None
+        return self.finish(request, response, stats, user)
+
+    def finish(self, request, response, stats, user):
+        match = request.resolver_match
+        url_name = match.view_name if match else 'unresolved'
+        instrumentation.window.add(url_name, stats)
+        metrics.HTTP_REQUESTS.observe(stats.duration, url_name=url_name, status=f'{response.status_code // 100}xx')
+
+        if getattr(settings, 'SERVER_TIMING_PUBLIC', False) or (user is not None and user.is_staff):
+            response['Server-Timing'] = stats.server_timing()
+
+        # Slow requests are logged as warnings, with their slowest queries
+        slow = stats.duration * 1000 >= getattr(settings, 'INSTRUMENTATION_SLOW_REQUEST_MS', 500)
+        fields = stats.as_dict()
+        if not slow:
+            del fields['slow_queries']
+        logger.log(logging.WARNING if slow else logging.INFO, json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'url_name': url_name,
+            'status': response.status_code,
+            **fields,
+        }))
+
+        # Development/test only: warn about or fail on N+1 and slow queries
+        queryguard.check(request, url_name, stats)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serve the analytics views from the read replica.
+
+    GET/HEAD requests to a view named in settings.REPLICA_READ_VIEWS read from
+    the replica. After a request writes to the primary, the client gets a
+    short-lived cookie that pins its reads to the primary, so a freshly saved
+    footprint shows up on the dashboard before replication catches up.
+    """
+    cookie_name = 'replica_pin'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routers.track_writes(), routers.read_from_replica(False):
+            response = self.get_response(request)
+            self.pin_after_write(response)
+        return response
+
+    async def __acall__(self, request):
+        # sync_to_async copies context changes (see ReplicaRouter) back to the caller
+        with routers.track_writes(), routers.read_from_replica(False):
+            response = await self.get_response(request)
+            self.pin_after_write(response)
+        return response
+
+    def pin_after_write(self, response):
+        if routers.has_written():
+            response.set_cookie(
+                self.cookie_name, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if routers.replica_alias() is None:
+            return None
+        if request.method not in ('GET', 'HEAD') or self.cookie_name in request.COOKIES:
+            return None
+        view_name = request.resolver_match.view_name if request.resolver_match else ''
+        if any(fnmatchcase(view_name, pattern) for pattern in settings.REPLICA_READ_VIEWS):
+            # Stays in effect until __call__ leaves read_from_replica(False)
+            routers.use_replica_for_request()
+        return None
@@ -0,0 +1,128 @@
+"""
+Run a view's independent read queries at the same time.
+
+With the database on the other side of a network, a page that issues five
+independent queries waits for five round trips one after another.
+run_reads() sends each call to a bounded thread pool instead. Each pool
+thread uses its own database connection, so the page waits about as long as
+its slowest query. Async views use the async ORM instead.
+
+Calls run with a copy of the caller's context. Replica routing
+(carbon/routers.py) and request instrumentation therefore behave as if the
+view had issued the queries itself. The calls run one after another on the
+caller's own connection when:
+
+* PARALLEL_READ_WORKERS is 0,
+* there is a single call,
+* or a transaction is open (tests included). Other connections can't see its
+  uncommitted rows.
+
+Either way the results come back in call order and are the same.
+
+Calls should only read. Anything that may write, like building a missing
+UserStats row, belongs on the request's own thread after the reads.
+
+Pool threads outlive requests, so they never see request_started or
+request_finished. Instead, each call is wrapped in close_old_connections(),
+which is what those signals run. The threads' connections then follow
+CONN_MAX_AGE like the request threads' do: closed after every call with the
+default of 0, and reused until they expire otherwise. Call shutdown() before
+dropping the database they point at, for example a test database.
+
+Each pool thread is one more database connection per process: up to
+PARALLEL_READ_WORKERS of them on top of the request threads' own, held
+while a read runs (or for CONN_MAX_AGE). Size it against the connection
+limit of the database or its pooler.
+"""
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from . import instrumentation
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _workers():
+    return getattr(settings, 'PARALLEL_READ_WORKERS', 0)
+
+
+class _Pool:
+    """A thread pool that keeps its threads' connections, to close them when it stops."""
+
+    def __init__(self, size):
+        self.size = size
+        self.connections = []
+        self.executor = ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix='parallel-reads', initializer=self._thread_started,
+        )
+
+    def _thread_started(self):
+        # The thread's own wrappers; they only connect on first use
+        self.connections.extend(connections[alias] for alias in connections)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        # Every thread has exited, so its connections can be closed from here
+        for connection in self.connections:
+            connection.inc_thread_sharing()
+            connection.close()
+
+
+def shutdown():
+    """Stop the pool and close its threads' database connections; the next reads start a new one."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def _in_transaction():
+    return any(conn.in_atomic_block for conn in connections.all(initialized_only=True))
+
+
+def _serial(calls):
+    return len(calls) < 2 or not _workers() or _in_transaction()
+
+
+def _run(call, origin):
+    # What request_started and request_finished do for a request thread
+    close_old_connections()
+    try:
+        if instrumentation.current() is None:
+            return call()
+        with instrumentation.hook_connections(), instrumentation.origin(origin):
+            return call()
+    finally:
+        close_old_connections()
+
+
+def _submit(calls):
+    global _pool
+    origin = instrumentation.query_origin()
+    retired = None
+    # Submitting under the lock means shutdown() can't stop the pool in between
+    with _pool_lock:
+        if _pool is None or _pool.size != _workers():
+            retired, _pool = _pool, _Pool(_workers())
+        futures = [
+            _pool.executor.submit(contextvars.copy_context().run, _run, call, origin)
+            for call in calls
+        ]
+    if retired is not None:
+        retired.shutdown()
+    return futures
+
+
+def run_reads(calls):
+    """Results of the zero-argument ``calls``, in order, run concurrently where possible."""
+    calls = list(calls)
+    if _serial(calls):
+        return [call() for call in calls]
+    return [future.result() for future in _submit(calls)]
+
@@ -0,0 +1,95 @@
+"""
+N+1 and slow-query guard for development and tests.
+
+With settings.QUERY_GUARD set to 'warn' or 'raise', RequestTimingMiddleware
+also groups each request's queries by shape (the SQL with IN/VALUES lists
+collapsed). After the response it reports:
+
+* n+1   - one shape run QUERY_GUARD_REPEAT_THRESHOLD times or more,
+* slow  - a single query slower than QUERY_GUARD_SLOW_MS.
+
+Each finding names the core.views / challenges.views line that issued the
+query. 'warn' emits a QueryGuardWarning; 'raise' raises QueryGuardError, which
+fails the test that made the request. The test runner in carbon/test_runner.py
+turns on 'raise' for the whole test suite.
+"""
+import re
+import warnings
+from fnmatch import fnmatchcase
+
+from django.conf import settings
+
+MODES = ('off', 'warn', 'raise')
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_VALUES_LIST = re.compile(r'VALUES (?:\([^()]*\), )*\([^()]*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryGuardWarning(UserWarning):
+    pass
+
+
+class QueryGuardError(AssertionError):
+    pass
+
+
+def mode():
+    value = getattr(settings, 'QUERY_GUARD', 'off')
+    if value not in MODES:
+        raise ValueError(f"QUERY_GUARD must be one of {MODES}, not {value!r}")
+    return value
+
+
+def enabled():
+    return mode() != 'off'
+
+
+def shape(sql):
+    """The query with parameter lists collapsed, so repeated lookups compare equal."""
+    sql = _WHITESPACE.sub(' ', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _VALUES_LIST.sub('VALUES (...)', sql)
+
+
+def findings(stats):
+    """N+1 and slow-query findings for a finished request's stats."""
+    threshold = getattr(settings, 'QUERY_GUARD_REPEAT_THRESHOLD', 3)
+    results = []
+    for sql, (count, seconds, origin) in stats.shapes.items():
+        if count >= threshold:
+            results.append({
+                'kind': 'n+1', 'count': count, 'ms': round(seconds * 1000, 2), 'sql': sql, 'origin': origin,
+            })
+    for seconds, sql, origin in stats.slow:
+        results.append({'kind': 'slow', 'count': 1, 'ms': round(seconds * 1000, 2), 'sql': sql, 'origin': origin})
+    return results
+
+
+def format_finding(finding):
+    if finding['kind'] == 'n+1':
+        what = f"same query ran {finding['count']} times ({finding['ms']} ms)"
+    else:
+        what = f"query took {finding['ms']} ms"
+    return f"{what} at {finding['origin'] or 'code outside the views'}: {finding['sql'][:300]}"
+
+
+def check(request, url_name, stats):
+    """Warn about or raise on the request's findings, depending on QUERY_GUARD."""
+    current = mode()
+    if current == 'off' or not stats.shapes:
+        return []
+    ignored = getattr(settings, 'QUERY_GUARD_IGNORE_VIEWS', ())
+    if any(fnmatchcase(url_name, pattern) for pattern in ignored):
+        return []
+
+    found = findings(stats)
+    if not found:
+        return found
+    message = f"{request.method} {request.path} ({url_name}):\n" + '\n'.join(
+        '  ' + format_finding(finding) for finding in found
+    )
+    if current == 'raise':
+        raise QueryGuardError(message)
+    warnings.warn(message, QueryGuardWarning, stacklevel=2)
+    return found
@@ -0,0 +1,224 @@
+"""
+Rate limits counted in the cache backend.
+
+A Limit counts hits per key (a user or client IP) in the configured cache,
+with one add() and one incr() per hit. Both are atomic on Redis and
+Memcached, and on the local-memory cache within one process. Use a shared
+cache for limits that hold across worker processes.
+
+Two kinds of window:
+
+* sliding (the default): the count of the current window, plus the previous
+  window's count weighted by how much of it still overlaps the last
+  ``period`` seconds. It smooths out bursts at window boundaries.
+* fixed: plain windows. Daily windows start at local midnight, which is how
+  the daily calculation cap counts. A ``seed`` callable gives a fresh
+  window its starting count, e.g. from the database after a cache restart.
+
+With a process-local cache (the local-memory default, when CACHE_URL isn't
+set), a limit with a seed treats the seed as the floor of every count: each
+check reads it again and catches the counter up. For the daily cap that is
+the user's footprints saved today, so saves made through other worker
+processes still count. Only their in-flight requests are missed.
+
+Views use the ``ratelimit`` decorator; over the limit they answer 429 with a
+Retry-After header. settings.RATE_LIMITS overrides the rate of any limit by
+name, and RATE_LIMIT_ENABLED = False turns the decorator off (the daily cap
+stays, it is part of the product).
+"""
+import math
+import re
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import JsonResponse
+from django.utils import timezone
+
+from . import metrics
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+_RATE = re.compile(r'^(\d+)/(\d*)([smhd])$')
+
+Rate = namedtuple('Rate', 'limit period')
+Decision = namedtuple('Decision', 'allowed count limit retry_after')
+
+
+def cache_is_shared():
+    """Whether the default cache is shared by the worker processes (not local memory)."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def parse_rate(rate):
+    """'10/m' -> Rate(10, 60); the period may have a multiplier, as in '100/15m'."""
+    match = _RATE.match(rate.replace(' ', ''))
+    if match is None:
+        raise ValueError(f"Invalid rate {rate!r}; expected e.g. '10/m', '3/d' or '100/15m'")
+    limit, multiplier, unit = match.groups()
+    return Rate(int(limit), int(multiplier or 1) * PERIODS[unit])
+
+
+class Limit:
+    def __init__(self, name, rate, fixed=False, seed=None):
+        self.name = name
+        self.default_rate = rate
+        self.fixed = fixed
+        self.seed = seed
+
+    @property
+    def rate(self):
+        return parse_rate(getattr(settings, 'RATE_LIMITS', {}).get(self.name, self.default_rate))
+
+    def _window(self, period, now):
+        """(start, end) of the window containing now, as epoch seconds."""
+        if self.fixed and period % PERIODS['d'] == 0:
+            # Daily windows follow the calendar: local midnight to midnight
+            local = datetime.fromtimestamp(now, tz=timezone.get_current_timezone())
+            midnight = local.replace(hour=0, minute=0, second=0, microsecond=0)
+            start = midnight.timestamp()
+            return start, (midnight + timedelta(days=period // PERIODS['d'])).timestamp()
+        start = now - now % period
+        return start, start + period
+
+    def _key(self, ident, start):
+        return f'ratelimit:{self.name}:{ident}:{int(start)}'
+
+    def _current(self, ident, now, rate):
+        """Key, window and cache timeout of the current window; seeds it if it is new."""
+        start, end = self._window(rate.period, now)
+        key = self._key(ident, start)
+        # Sliding windows are still read while they are the previous window
+        timeout = math.ceil(end - now) + (0 if self.fixed else rate.period) + 1
+        if self.seed is not None:
+            current = cache.get(key)
+            if current is None:
+                cache.add(key, self.seed(ident), timeout)
+            elif not cache_is_shared():
+                # Other processes count in their own caches; the seed is the floor
+                behind = self.seed(ident) - current
+                if behind > 0:
+                    try:
+                        cache.incr(key, behind)
+                    except ValueError:
+                        pass  # expired meanwhile; hit() starts it again
+        return key, start, end, timeout
+
+    def _previous_weight(self, ident, now, rate, start):
+        if self.fixed:
+            return 0
+        previous = cache.get(self._key(ident, start - rate.period)) or 0
+        return previous * (1 - (now - start) / rate.period)
+
+    def usage(self, ident, now=None):
+        """Hits counted against ident right now, without adding one."""
+        now = time.time() if now is None else now
+        rate = self.rate
+        key, start, end, timeout = self._current(ident, now, rate)
+        return (cache.get(key) or 0) + self._previous_weight(ident, now, rate, start)
+
+    def hit(self, ident, now=None):
+        """Count one hit for ident. Refused hits are not counted."""
+        now = time.time() if now is None else now
+        rate = self.rate
+        key, start, end, timeout = self._current(ident, now, rate)
+        cache.add(key, 0, timeout)
+        try:
+            current = cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            cache.add(key, 1, timeout)
+            current = 1
+        previous = self._previous_weight(ident, now, rate, start)
+        if current + previous <= rate.limit:
+            return Decision(True, math.floor(current + previous), rate.limit, 0)
+
+        self._decr(key)
+        return Decision(False, rate.limit, rate.limit, self._retry_after(current - 1, previous, now, start, end, rate))
+
+    def hit_many(self, ident, amount, now=None):
+        """Count up to amount hits for ident at once; returns how many fit under the limit."""
+        now = time.time() if now is None else now
+        rate = self.rate
+        key, start, end, timeout = self._current(ident, now, rate)
+        cache.add(key, 0, timeout)
+        try:
+            current = cache.incr(key, amount)
+        except ValueError:
+            cache.add(key, amount, timeout)
+            current = amount
+        over = min(amount, max(0, math.ceil(current + self._previous_weight(ident, now, rate, start) - rate.limit)))
+        if over:
+            self._decr(key, over)
+        return amount - over
+
+    def refund(self, ident, now=None, amount=1):
+        """Take back hits that didn't use what they were counted for."""
+        now = time.time() if now is None else now
+        start, _ = self._window(self.rate.period, now)
+        self._decr(self._key(ident, start), amount)
+
+    @staticmethod
+    def _decr(key, amount=1):
+        try:
+            cache.decr(key, amount)
+        except ValueError:
+            pass  # the window expired meanwhile
+
+    def _retry_after(self, current, previous, now, start, end, rate):
+        """Whole seconds until one more hit fits under the limit."""
+        room = rate.limit - 1
+        if self.fixed or current > room:
+            if self.fixed:
+                return max(1, math.ceil(end - now))
+            # Wait for the next window, then for this one to weigh little enough
+            fraction = 1 - room / current if current else 0
+            return max(1, math.ceil(end - now + fraction * rate.period))
+        # The previous window's weight has to drop below what is left
+        previous_count = previous / (1 - (now - start) / rate.period)
+        fraction = 1 - (room - current) / previous_count
+        return max(1, math.ceil(start + fraction * rate.period - now))
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def request_key(request, key):
+    """'user': the signed-in user, else the client IP; 'ip': always the client IP."""
+    if key == 'user' and request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f'ip:{client_ip(request)}'
+
+
+def too_many_requests(decision, message='Too many requests. Please slow down and try again shortly.'):
+    response = JsonResponse({'error': message, 'retry_after': decision.retry_after}, status=429)
+    response['Retry-After'] = str(decision.retry_after)
+    return response
+
+
+def ratelimit(name, rate, key='user', methods=('POST',)):
+    """
+    Allow ``rate`` (e.g. '10/m') requests per user or IP to the decorated view.
+
+    Only requests with one of ``methods`` are counted. The limit is exposed
+    as ``view.rate_limit``.
+    """
+    limit = Limit(name, rate)
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods and getattr(settings, 'RATE_LIMIT_ENABLED', True):
+                decision = limit.hit(request_key(request, key))
+                if not decision.allowed:
+                    metrics.RATE_LIMITED.inc(limit=name)
+                    return too_many_requests(decision)
+            return view_func(request, *args, **kwargs)
+        wrapper.rate_limit = limit
+        return wrapper
+    return decorator
@@ -0,0 +1,71 @@
+"""
+Database routing for the read-heavy analytics views.
+
+Views listed in ``settings.REPLICA_READ_VIEWS`` read the ``core`` and
+``challenges`` tables from the replica alias (see ``ReplicaRoutingMiddleware``).
+Everything else, including all writes, goes to the primary database.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+_wrote_to_primary = contextvars.ContextVar('wrote_to_primary', default=False)
+
+
+def replica_alias():
+    """Return the configured replica alias, or None when no replica is set up."""
+    alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def read_from_replica(enabled=True):
+    """Route analytical reads inside the block to the replica (if configured)."""
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+@contextmanager
+def track_writes():
+    """Record whether anything inside the block was written to the primary."""
+    token = _wrote_to_primary.set(False)
+    try:
+        yield
+    finally:
+        _wrote_to_primary.reset(token)
+
+
+def use_replica_for_request():
+    """Switch the rest of the current request to replica reads."""
+    _use_replica.set(True)
+
+
+def has_written():
+    return _wrote_to_primary.get()
+
+
+class ReplicaRouter:
+    """Send analytics reads to the replica and every write to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get():
+            return None
+        if model._meta.app_label not in getattr(settings, 'REPLICA_APPS', ()):
+            return None
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        _wrote_to_primary.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
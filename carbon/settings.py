@@ -52,20 +52,28 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Serves /static/ from STATIC_ROOT, before anything else runs (carbon/static.py)
+    'carbon.middleware.StaticFilesMiddleware',
+    'carbon.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Compresses HTML and JSON, not event streams; early in the list so it
+    # sees the final body
+    'carbon.middleware.GZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'carbon.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'carbon.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend plus render timing (see carbon/instrumentation.py)
+        'BACKEND': 'carbon.instrumentation.TimedDjangoTemplates',
         'DIRS': ['templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -80,6 +88,12 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'carbon.wsgi.application'
+ASGI_APPLICATION = 'carbon.asgi.application'
+
+# Serve dashboard, leaderboard and challenges.index with their async views.
+# carbon/asgi.py turns this on; under WSGI the sync views avoid the
+# async-to-sync hop on every request.
+ASYNC_VIEWS = os.getenv('DJANGO_ASYNC_VIEWS', '0') == '1'
 
 
 # Database
@@ -98,6 +112,160 @@ DATABASES = {
     }
 }
 
+# Set DJANGO_DB_ENGINE=sqlite to work against a local SQLite file instead
+if os.getenv('DJANGO_DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        }
+    }
+# Or DJANGO_DB_ENGINE=postgresql for a local Postgres, e.g. to run the
+# partitioning tests before migrating the hosted one. The connection comes
+# from libpq's PGHOST, PGPORT, PGUSER and PGPASSWORD
+elif os.getenv('DJANGO_DB_ENGINE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('PGDATABASE', 'postgres'),
+        }
+    }
+
+# Read replica for the analytics views (see carbon/routers.py). Point
+# DJANGO_REPLICA_HOST at a Postgres replica, or DJANGO_REPLICA_NAME at a
+# second database (e.g. another SQLite file) when testing locally.
+REPLICA_DATABASE_ALIAS = 'replica'
+if os.getenv('DJANGO_REPLICA_HOST'):
+    DATABASES[REPLICA_DATABASE_ALIAS] = {**DATABASES['default'], 'HOST': os.getenv('DJANGO_REPLICA_HOST')}
+elif os.getenv('DJANGO_REPLICA_NAME'):
+    DATABASES[REPLICA_DATABASE_ALIAS] = {**DATABASES['default'], 'NAME': os.getenv('DJANGO_REPLICA_NAME')}
+
+DATABASE_ROUTERS = ['carbon.routers.ReplicaRouter']
+
+# Only these apps' tables are read from the replica
+REPLICA_APPS = ['core', 'challenges']
+
+# URL names (fnmatch patterns) whose GET requests read from the replica
+REPLICA_READ_VIEWS = [
+    'dashboard',
+    'chart_data',
+    'leaderboard',
+    'leaderboard_stats',
+    'team_leaderboard',
+    'export_footprints',
+    'challenges:index',
+    'challenges:my_challenges',
+    'admin:*_changelist',
+]
+
+# Seconds a user's reads stay on the primary after they write something
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+
+# Threads that run a view's independent reads at the same time
+# (carbon/parallel.py); 0 runs them in turn. Each thread has its own database
+# connection, so every worker process can open this many on top of its
+# request threads' connections. Keep processes x (threads + this) under the
+# connection limit of the database or its pooler
+PARALLEL_READ_WORKERS = int(os.getenv('PARALLEL_READ_WORKERS', '4'))
+
+# Admin change lists for the big tables (carbon/changelist.py) show the
+# planner's row estimate on PostgreSQL once it reaches this many rows
+ADMIN_EXACT_COUNT_LIMIT = int(os.getenv('ADMIN_EXACT_COUNT_LIMIT', '10000'))
+# Rows per UPDATE / bulk_update in the admin bulk actions (carbon/bulk.py)
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', '1000'))
+
+# Per-request timing (carbon/middleware.py RequestTimingMiddleware)
+INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', '1') == '1'
+# Slowest queries reported per request, and requests kept per URL name
+INSTRUMENTATION_SLOW_QUERIES = 5
+INSTRUMENTATION_WINDOW = 1000
+# Requests slower than this are logged as warnings, with their slowest queries
+INSTRUMENTATION_SLOW_REQUEST_MS = int(os.getenv('INSTRUMENTATION_SLOW_REQUEST_MS', '500'))
+# Server-Timing headers go to staff only; set to send them to everyone (not
+# with DEBUG, which is on here: the header shows query counts and timings)
+SERVER_TIMING_PUBLIC = os.getenv('SERVER_TIMING_PUBLIC', '0') == '1'
+
+# N+1 / slow-query guard (carbon/queryguard.py): 'off', 'warn' or 'raise'.
+# The test runner always uses 'raise'.
+QUERY_GUARD = os.getenv('QUERY_GUARD', 'warn' if DEBUG else 'off')
+# Identical query shapes per request that count as an N+1
+QUERY_GUARD_REPEAT_THRESHOLD = 3
+QUERY_GUARD_SLOW_MS = int(os.getenv('QUERY_GUARD_SLOW_MS', '100'))
+# URL names (fnmatch patterns) the guard leaves alone
+QUERY_GUARD_IGNORE_VIEWS = ['admin:*']
+TEST_RUNNER = 'carbon.test_runner.QueryGuardTestRunner'
+
+# Prometheus metrics at /metrics (carbon/metrics.py). With several worker
+# processes, point METRICS_DIR at a directory they share so the endpoint
+# reports totals across workers. Set METRICS_TOKEN to require a bearer token.
+METRICS_DIR = os.getenv('METRICS_DIR') or None
+METRICS_FLUSH_SECONDS = 5
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Set CACHE_URL (e.g. redis://localhost:6379/1, with the ``redis`` package
+# installed) to share the cache between worker processes. Without it each
+# process has its own local-memory cache.
+CACHE_URL = os.getenv('CACHE_URL', '')
+CACHES = {
+    'default': (
+        {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}
+        if CACHE_URL else {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    ),
+}
+
+# Rate limits (carbon/ratelimit.py) are counted in the default cache, so they
+# only hold across worker processes with CACHE_URL set. The daily calculation
+# cap also checks today's saved footprints when the cache is local.
+# RATE_LIMITS overrides a limit's rate by name, e.g. {'ai_tips_api': '5/m'}.
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMITS = {}
+
+# How long identical Gemini tip prompts reuse the cached answer
+TIP_CACHE_SECONDS = 60 * 60 * 24
+
+# Dashboard chart series (core/timeseries.py): points per series by default
+# and at most, and how long a cached series lives. Writes move the user to a
+# new cache version, so the timeout only bounds how long stale entries stay.
+CHART_POINTS = 120
+CHART_MAX_POINTS = 1000
+CHART_CACHE_SECONDS = 60 * 60
+
+# Leaderboard distribution (core/distribution.py): histogram buckets, and how
+# long each period's figures are cached
+LEADERBOARD_HISTOGRAM_BUCKETS = 10
+LEADERBOARD_STATS_SECONDS = 5 * 60
+
+# Live event stream (carbon/events.py, core.views.event_stream): how long one
+# connection stays open before the browser reconnects, the keepalive comment
+# interval, and the events a slow client may fall behind before it is told
+# to reload. EVENTS_REDIS_URL relays events between worker processes.
+EVENTS_STREAM_SECONDS = 5 * 60
+EVENTS_KEEPALIVE_SECONDS = 15
+EVENTS_QUEUE_SIZE = 100
+EVENTS_REDIS_URL = os.getenv('EVENTS_REDIS_URL')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # One JSON line per request; raise to WARNING to silence
+        'carbon.requests': {
+            'handlers': ['console'],
+            'level': os.getenv('REQUEST_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        # One JSON line per batch of an admin bulk action (carbon/bulk.py)
+        'carbon.bulk': {
+            'handlers': ['console'],
+            'level': os.getenv('BULK_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 
 
 
@@ -137,6 +305,14 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS= [os.path.join(BASE_DIR, 'static')]
+# collectstatic writes hashed, precompressed copies here (carbon/storage.py)
+STATIC_ROOT = os.getenv('STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'carbon.storage.CompressedManifestStaticFilesStorage'},
+}
+# Cache lifetime of static files without a hash in their name; hashed ones are immutable
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', '60'))
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
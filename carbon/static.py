@@ -0,0 +1,154 @@
+"""
+In-process static file serving for production, in the manner of WhiteNoise.
+
+collectstatic (see carbon/storage.py) writes hashed files to STATIC_ROOT,
+with .gz and .br copies next to the text ones. StaticFiles indexes that
+directory once, when the worker starts, so serving a file costs a dict lookup
+and no filesystem checks. Each request gets the smallest copy its
+Accept-Encoding allows. Hashed names (the values in staticfiles.json) never
+change content, so they are sent with a one-year ``immutable`` Cache-Control.
+Unhashed names get STATIC_MAX_AGE seconds. Every copy has its own ETag, and
+If-None-Match is answered with 304.
+
+Files added after startup are not seen until the workers restart, which is
+what happens on a deploy anyway. With DEBUG on, paths missing from the index
+fall back to the staticfiles finders and are sent with ``no-cache``, so an
+ASGI/WSGI server can be used in development without running collectstatic.
+"""
+import json
+import mimetypes
+import os
+import posixpath
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified
+from django.utils.http import http_date
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Preferred first: Brotli is smaller, gzip is understood everywhere
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+TEXT_TYPES = ('application/javascript', 'application/json', 'application/manifest+json', 'image/svg+xml')
+
+
+def accepted_encodings(header):
+    """Content codings an Accept-Encoding header allows (those without q=0)."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = params.strip().removeprefix('q=')
+        if coding and quality not in ('0', '0.0', '0.00', '0.000'):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def content_type_for(path):
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type in TEXT_TYPES:
+        content_type += '; charset=utf-8'
+    return content_type
+
+
+class StaticFile:
+    """One file and its precompressed copies, stat()ed once."""
+
+    def __init__(self, path, cache_control):
+        self.content_type = content_type_for(path)
+        self.cache_control = cache_control
+        # encoding -> (path, size, etag); None is the file itself
+        self.variants = {None: self.describe(path)}
+        self.last_modified = http_date(os.stat(path).st_mtime)
+        for encoding, suffix in ENCODINGS:
+            if os.path.isfile(path + suffix):
+                self.variants[encoding] = self.describe(path + suffix, encoding)
+
+    @staticmethod
+    def describe(path, encoding=None):
+        stat = os.stat(path)
+        etag = f'{int(stat.st_mtime):x}-{stat.st_size:x}' + (f'-{encoding}' if encoding else '')
+        return path, stat.st_size, f'"{etag}"'
+
+    def select(self, accept_encoding):
+        """(encoding, path, size, etag) of the copy to send."""
+        accepted = accepted_encodings(accept_encoding) if len(self.variants) > 1 else ()
+        for encoding, _ in ENCODINGS:
+            if encoding in self.variants and encoding in accepted:
+                return (encoding, *self.variants[encoding])
+        return (None, *self.variants[None])
+
+    def serve(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        encoding, path, size, etag = self.select(request.headers.get('Accept-Encoding', ''))
+
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=self.content_type)
+            response['Content-Length'] = size
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=self.content_type)
+            # FileResponse names the file; these are not downloads
+            del response['Content-Disposition']
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if len(self.variants) > 1:
+            response['Vary'] = 'Accept-Encoding'
+        response['ETag'] = etag
+        response['Last-Modified'] = self.last_modified
+        response['Cache-Control'] = self.cache_control
+        response['X-Content-Type-Options'] = 'nosniff'
+        return response
+
+
+class StaticFiles:
+    """The files under ``root``, served at the URL path ``prefix``."""
+
+    def __init__(self, root, prefix, max_age=60, use_finders=False):
+        self.prefix = prefix
+        self.use_finders = use_finders
+        self.files = {}
+        if not prefix or not root or not os.path.isdir(root):
+            return
+
+        immutable = set()
+        manifest = os.path.join(root, 'staticfiles.json')
+        if os.path.isfile(manifest):
+            with open(manifest) as fh:
+                immutable = set(json.load(fh).get('paths', {}).values())
+
+        compressed = tuple(suffix for _, suffix in ENCODINGS)
+        for directory, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, root).replace(os.sep, '/')
+                # Copies are served in place of their file, not on their own
+                if name.endswith(compressed) and os.path.isfile(path.rsplit('.', 1)[0]):
+                    continue
+                cache_control = IMMUTABLE if relative in immutable else f'public, max-age={max_age}'
+                self.files[relative] = StaticFile(path, cache_control)
+
+    @classmethod
+    def from_settings(cls):
+        static_url = settings.STATIC_URL or ''
+        # Nothing to serve when the assets live on another host (a CDN)
+        prefix = None if urlsplit(static_url).netloc else '/' + static_url.strip('/') + '/'
+        return cls(
+            settings.STATIC_ROOT, prefix,
+            max_age=getattr(settings, 'STATIC_MAX_AGE', 60),
+            use_finders=settings.DEBUG,
+        )
+
+    def find(self, path_info):
+        """The StaticFile for a request path, or None when it isn't one."""
+        if not self.prefix or not path_info.startswith(self.prefix):
+            return None
+        relative = path_info[len(self.prefix):]
+        static_file = self.files.get(relative)
+        if static_file is None and self.use_finders:
+            normalized = posixpath.normpath(relative).lstrip('/')
+            found = finders.find(normalized) if normalized and not normalized.startswith('..') else None
+            if found:
+                static_file = StaticFile(found, 'no-cache')
+        return static_file
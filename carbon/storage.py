@@ -0,0 +1,62 @@
+"""
+Static files storage for production: hashed names plus precompressed copies.
+
+collectstatic copies each file to STATIC_ROOT under a name with its content
+hash (layout.css -> layout.3f2a9c1e4b7d.css). A file that changes gets a new
+URL, so browsers and proxies can cache every URL for good. Next to each text
+asset it also writes a gzip copy (.gz), and a Brotli copy (.br) when the
+``brotli`` package is installed. These are written once at build time and
+are only kept when they are meaningfully smaller. The static file server
+(or a front-end proxy) sends them to clients that accept the encoding,
+without compressing per request.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+# Optional Brotli compressor (may be None)
+try:
+    import brotli  # type: ignore
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.svg', '.json', '.map', '.txt', '.html', '.xml', '.ico')
+# Keep a compressed copy only when it saves at least this fraction
+MIN_SAVING = 0.05
+
+
+def compress_file(path):
+    """Write path.gz (and path.br) next to path; returns the suffixes written."""
+    with open(path, 'rb') as source:
+        data = source.read()
+    written = []
+    encoders = [('.gz', lambda raw: gzip.compress(raw, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        encoders.append(('.br', lambda raw: brotli.compress(raw, quality=11)))
+    for suffix, encode in encoders:
+        compressed = encode(data)
+        if len(compressed) <= len(data) * (1 - MIN_SAVING):
+            with open(path + suffix, 'wb') as target:
+                target.write(compressed)
+            written.append(suffix)
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)  # left over from an earlier, larger version
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also precompresses text assets."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed = set()
+        for name, hashed_name, result in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(result, Exception):
+                processed.update((name, hashed_name))
+            yield name, hashed_name, result
+        if dry_run:
+            return
+        # After every pass, so only the final hashed files are compressed
+        for name in sorted(processed):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                compress_file(self.path(name))
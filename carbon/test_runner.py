@@ -0,0 +1,44 @@
+import logging
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from . import parallel
+
+
+class QueryGuardTestRunner(DiscoverRunner):
+    """
+    The standard runner, with the N+1 / slow-query guard raising in every test.
+
+    Static URLs aren't hashed in tests, so they don't need a collectstatic run.
+    The per-request and per-batch loggers are raised to ERROR, so neither
+    their INFO lines nor the slow-request WARNINGs (which depend on how fast
+    the machine is) reach the output; assertLogs() still sees them.
+    """
+
+    quiet_loggers = ('carbon.requests', 'carbon.bulk')
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._query_guard = override_settings(
+            QUERY_GUARD='raise',
+            STORAGES={**settings.STORAGES, 'staticfiles': {
+                'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+            }},
+        )
+        self._query_guard.enable()
+        self._log_levels = {name: logging.getLogger(name).level for name in self.quiet_loggers}
+        for name, level in self._log_levels.items():
+            logging.getLogger(name).setLevel(max(level, logging.ERROR))
+
+    def teardown_test_environment(self, **kwargs):
+        self._query_guard.disable()
+        for name, level in self._log_levels.items():
+            logging.getLogger(name).setLevel(level)
+        super().teardown_test_environment(**kwargs)
+
+    def teardown_databases(self, old_config, **kwargs):
+        # Parallel-read threads may still hold connections to the test databases
+        parallel.shutdown()
+        super().teardown_databases(old_config, **kwargs)
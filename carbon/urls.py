@@ -18,11 +18,13 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
-# from . import views
+from . import views
 from django.contrib.auth.urls import views as auth_views
 
 
 urlpatterns = [
+    path('metrics', views.metrics_view, name='metrics'),
+    path('admin/performance/', views.performance_summary, name='performance_summary'),
     path('admin/', admin.site.urls),
     path('', include('core.urls')),
     path('challenges/', include('challenges.urls')),
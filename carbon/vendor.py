@@ -0,0 +1,80 @@
+"""
+Third-party files the pages use, served from our own static files.
+
+Chart.js (the dashboard), particles.js (the landing page) and the Inter web
+font used to come from cdn.jsdelivr.net and Google Fonts. Every page then
+opened connections to two or three other hosts before it could render, and
+the font stylesheet blocked rendering. ``python manage.py fetch_vendor``
+downloads the pinned versions in FILES into static/, next to our own
+assets, so collectstatic hashes, precompresses and caches them like the
+rest (carbon/storage.py). ``python manage.py build_assets`` runs it for any
+file that is missing. Both are build steps: commit the downloaded files, and
+don't run them on deploy, where a CDN outage or a changed upstream file
+would change what ships.
+
+The templates ask for them through the ``vendor`` tags
+(core/templatetags/vendor.py):
+
+* {% vendor_script %} loads the local copy, deferred. Until it has been
+  fetched, it falls back to the pinned CDN URL, so a fresh checkout still
+  works.
+* {% font_faces %} writes @font-face rules for the local Inter files, with
+  ``font-display: swap`` so text shows at once in a fallback font. Until
+  they have been fetched, it falls back to the Google Fonts stylesheet
+  (FONT_STYLESHEET), loaded without blocking rendering.
+"""
+import urllib.request
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+STATIC_DIR = Path(settings.BASE_DIR) / 'static'
+
+# Path under static/ -> pinned source URL
+FILES = {
+    'vendor/chart.umd.js': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.js',
+    'vendor/particles.min.js': 'https://cdn.jsdelivr.net/npm/particles.js@2.0.0/particles.min.js',
+    'fonts/inter-latin-400-normal.woff2':
+        'https://cdn.jsdelivr.net/npm/@fontsource/inter@5.0.16/files/inter-latin-400-normal.woff2',
+    'fonts/inter-latin-600-normal.woff2':
+        'https://cdn.jsdelivr.net/npm/@fontsource/inter@5.0.16/files/inter-latin-600-normal.woff2',
+    'fonts/inter-latin-700-normal.woff2':
+        'https://cdn.jsdelivr.net/npm/@fontsource/inter@5.0.16/files/inter-latin-700-normal.woff2',
+}
+
+# Where Inter comes from until the files in FONT_WEIGHTS are fetched
+FONT_STYLESHEET = 'https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700&display=swap'
+
+# Inter weights the pages use -> font file; 400 is preloaded
+FONT_WEIGHTS = {
+    400: 'fonts/inter-latin-400-normal.woff2',
+    600: 'fonts/inter-latin-600-normal.woff2',
+    700: 'fonts/inter-latin-700-normal.woff2',
+}
+
+
+@lru_cache(maxsize=None)
+def available(name):
+    """Whether the static file name has been fetched (checked once per process)."""
+    return finders.find(name) is not None
+
+
+def missing():
+    """The files in FILES that haven't been fetched."""
+    return [name for name in FILES if not (STATIC_DIR / name).exists()]
+
+
+def fetch(names=None, timeout=30):
+    """Download names (default: all of FILES) into static/; returns [(path, bytes)]."""
+    written = []
+    for name in names or FILES:
+        with urllib.request.urlopen(FILES[name], timeout=timeout) as response:
+            data = response.read()
+        path = STATIC_DIR / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        written.append((path, len(data)))
+    available.cache_clear()
+    return written
@@ -0,0 +1,36 @@
+import hmac
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render
+
+from . import instrumentation, metrics
+
+
+@staff_member_required
+def performance_summary(request):
+    """Rolling request timings per URL name for this server process."""
+    rows = instrumentation.window.summary()
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'results': rows})
+    return render(request, 'admin/performance_summary.html', {
+        'title': 'Request performance',
+        'rows': rows,
+        'window': instrumentation._setting('INSTRUMENTATION_WINDOW', 1000),
+    })
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, for ``Authorization: Bearer <METRICS_TOKEN>``
+    or a signed-in staff user. Everyone else gets a 403, also while no token
+    is set.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    # Constant time, so response timings don't give the token away
+    scraper = bool(token) and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    if not (scraper or request.user.is_staff):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,5 +1,15 @@
+from datetime import timedelta
+
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.utils import timezone
+
+from carbon import bulk
+from carbon.changelist import LargeTableAdmin
+from . import savings
 from .models import ChallengeType, UserChallenge, ChallengeProgress
+from .views import recompute_progress
 
 @admin.register(ChallengeType)
 class ChallengeTypeAdmin(admin.ModelAdmin):
@@ -7,17 +17,107 @@ class ChallengeTypeAdmin(admin.ModelAdmin):
     list_filter = ['category', 'duration_type', 'difficulty_level', 'is_active']
     search_fields = ['title', 'description']
     ordering = ['category', 'difficulty_level']
+    actions = ['deactivate', 'activate']
+
+    @admin.action(description='Deactivate selected challenge types')
+    def deactivate(self, request, queryset):
+        # Hidden from the challenge list; users who joined keep their challenges
+        self.message_user(request, bulk.update(queryset.filter(is_active=True), 'Deactivated', is_active=False).summary())
+
+    @admin.action(description='Activate selected challenge types')
+    def activate(self, request, queryset):
+        self.message_user(request, bulk.update(queryset.filter(is_active=False), 'Activated', is_active=True).summary())
+
+    # Deleting a type cascades to its users' challenges: delete those through
+    # savings first, so their carbon saved comes off the users' sums
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, ChallengeType.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            savings.delete_challenges(UserChallenge.objects.filter(challenge_type__in=queryset))
+            queryset.delete()
+
+# The two tables below grow with every user and day, so their lists page by
+# cursor, show estimated counts and search by exact username (an index lookup)
+# or title prefix instead of scanning for substrings
 
 @admin.register(UserChallenge)
-class UserChallengeAdmin(admin.ModelAdmin):
+class UserChallengeAdmin(LargeTableAdmin):
     list_display = ['user', 'challenge_type', 'status', 'progress_percentage', 'start_date', 'end_date']
+    list_select_related = ['user', 'challenge_type']
     list_filter = ['status', 'challenge_type__category', 'start_date']
-    search_fields = ['user__username', 'challenge_type__title']
+    search_fields = ['user__username__exact', '^challenge_type__title']
+    search_help_text = 'Exact username, or the start of a challenge title'
+    raw_id_fields = ['user']
     readonly_fields = ['created_at', 'updated_at']
+    cursor_fields = ('-id',)
+    # Set-based or batched (carbon/bulk.py), never a save() per row
+    actions = ['recompute_progress', 'expire', 'reactivate']
+
+    @admin.action(description='Recompute progress of selected challenges')
+    def recompute_progress(self, request, queryset):
+        self.message_user(request, recompute_progress(queryset).summary())
+
+    @admin.action(description='Expire selected challenges now')
+    def expire(self, request, queryset):
+        # Ends them with their current progress: completed from 80%, failed below
+        now = timezone.now()
+        progress = bulk.update(
+            queryset.filter(status__in=['active', 'paused']), 'Expired',
+            end_date=Case(When(end_date__lt=now, then=F('end_date')), default=Value(now)),
+            status=Case(When(progress_percentage__gte=80, then=Value('completed')), default=Value('failed')),
+            updated_at=now,
+        )
+        self.message_user(request, progress.summary())
+
+    @admin.action(description='Reactivate selected challenges from today')
+    def reactivate(self, request, queryset):
+        # A fresh start: from now, for the challenge type's duration, at 0%
+        now = timezone.now()
+        durations = ChallengeType.objects.filter(
+            pk__in=queryset.values('challenge_type_id'), duration_days__gt=0,
+        ).values_list('pk', 'duration_days')
+        end_date = Case(
+            *[When(challenge_type_id=pk, then=Value(now + timedelta(days=days))) for pk, days in durations],
+            default=Value(None), output_field=DateTimeField(),
+        )
+        progress = bulk.update(
+            queryset.exclude(status='active'), 'Reactivated',
+            status='active', start_date=now, end_date=end_date, progress_percentage=0, updated_at=now,
+        )
+        self.message_user(request, progress.summary())
+
+    # Deleting a challenge deletes its progress, and with it carbon saved (challenges/savings.py)
+    def delete_model(self, request, obj):
+        savings.delete_challenges(UserChallenge.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        savings.delete_challenges(queryset)
 
 @admin.register(ChallengeProgress)
-class ChallengeProgressAdmin(admin.ModelAdmin):
+class ChallengeProgressAdmin(LargeTableAdmin):
     list_display = ['user_challenge', 'date', 'completed', 'carbon_saved']
+    # __str__ of user_challenge shows its user and challenge type
+    list_select_related = ['user_challenge__user', 'user_challenge__challenge_type']
+    # No date_hierarchy: its year/month links are a DISTINCT over the whole table
     list_filter = ['completed', 'date', 'user_challenge__challenge_type__category']
-    search_fields = ['user_challenge__user__username', 'user_challenge__challenge_type__title']
-    date_hierarchy = 'date'
+    search_fields = ['user_challenge__user__username__exact', '^user_challenge__challenge_type__title']
+    search_help_text = 'Exact username, or the start of a challenge title'
+    raw_id_fields = ['user_challenge']
+    cursor_fields = ('-date', '-id')
+
+    # Edits and deletes change the running carbon-saved sums (challenges/savings.py)
+    def save_model(self, request, obj, form, change):
+        before = ChallengeProgress.objects.select_related('user_challenge').get(pk=obj.pk) if change else None
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            if before is not None:
+                savings.record(before.user_challenge, -savings.amount(before))
+            savings.record(obj.user_challenge, savings.amount(obj))
+
+    def delete_model(self, request, obj):
+        savings.delete_progress(ChallengeProgress.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        savings.delete_progress(queryset)
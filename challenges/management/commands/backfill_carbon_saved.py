@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from challenges import savings
+from challenges.models import ChallengeProgress
+
+
+class Command(BaseCommand):
+    help = "Set every challenge progress row's carbon_saved from its challenge type's carbon impact"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true',
+                            help='Only fill rows that have no carbon_saved yet')
+
+    def handle(self, *args, **options):
+        queryset = ChallengeProgress.objects.all()
+        if options['missing']:
+            queryset = queryset.filter(carbon_saved__isnull=True)
+        self.stdout.write(self.style.SUCCESS(savings.backfill(queryset).summary()))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from challenges import savings
+
+
+class Command(BaseCommand):
+    help = 'Compare the running carbon-saved sums with a full aggregate of challenge progress'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Rebuild the sums of every user with a difference')
+
+    def handle(self, *args, **options):
+        challenges, users = savings.mismatches()
+        for row in challenges:
+            self.stdout.write(
+                f"  challenge {row['pk']} (user {row['user_id']}): "
+                f"running {row['carbon_saved']}, expected {row['expected']}"
+            )
+        for row in users:
+            self.stdout.write(f"  user {row['user_id']}: running {row['carbon_saved']}, expected {row['expected']}")
+
+        if not challenges and not users:
+            self.stdout.write(self.style.SUCCESS('Carbon-saved sums match the progress history.'))
+            return
+
+        user_ids = {row['user_id'] for row in challenges} | {row['user_id'] for row in users}
+        summary = f'{len(challenges)} challenge and {len(users)} user sums differ ({len(user_ids)} users)'
+        if not options['fix']:
+            raise CommandError(f'{summary}; rerun with --fix to rebuild them.')
+        savings.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(f'{summary}; rebuilt.'))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challenges', '0002_challengetype_userchallenge_challengeprogress_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='challengeprogress',
+            index=models.Index(fields=['date', 'id'], name='chal_progress_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:25
+
+from django.db import migrations, models
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_carbon_saved(apps, schema_editor):
+    # One UPDATE with a correlated sum, like challenges.savings.rebuild()
+    UserChallenge = apps.get_model('challenges', 'UserChallenge')
+    ChallengeProgress = apps.get_model('challenges', 'ChallengeProgress')
+    saved = ChallengeProgress.objects.filter(
+        user_challenge=OuterRef('pk'), completed=True, carbon_saved__isnull=False,
+    ).order_by().values('user_challenge').annotate(total=Sum('carbon_saved')).values('total')
+    output_field = DecimalField(max_digits=10, decimal_places=2)
+    UserChallenge.objects.update(
+        carbon_saved=Coalesce(Subquery(saved, output_field=output_field), Value(0), output_field=output_field),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('challenges', '0003_challengeprogress_chal_progress_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userchallenge',
+            name='carbon_saved',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(fill_carbon_saved, migrations.RunPython.noop),
+    ]
@@ -57,6 +57,8 @@ class UserChallenge(models.Model):
     start_date = models.DateTimeField(default=timezone.now)
     end_date = models.DateTimeField(null=True, blank=True)
     progress_percentage = models.IntegerField(default=0)
+    # Running sum of completed progress_entries' carbon_saved (challenges/savings.py)
+    carbon_saved = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -100,6 +102,10 @@ class ChallengeProgress(models.Model):
     class Meta:
         unique_together = ['user_challenge', 'date']  # One progress entry per day per challenge
         ordering = ['-date']
+        indexes = [
+            # The admin list pages through all entries newest first (carbon/changelist.py)
+            models.Index(fields=['date', 'id'], name='chal_progress_date_id_idx'),
+        ]
     
     def __str__(self):
         return f'{self.user_challenge} - {self.date} - {"✓" if self.completed else "✗"}'
@@ -0,0 +1,193 @@
+"""
+Carbon saved through challenges: what each day saves, and the running totals.
+
+A challenge type's carbon_impact is the estimate for doing the whole
+challenge. saving() spreads it evenly over the challenge's days (30 for
+ongoing challenges, the window completion_rate uses), so each completed day
+saves carbon_impact / days. A day that wasn't completed saves 0. This is
+plain arithmetic on the challenge type, with no queries, so update_progress
+sets carbon_saved as it saves the row. backfill() fills in rows written
+before this existed, a batch at a time (``python manage.py
+backfill_carbon_saved``).
+
+A completed ChallengeProgress with a carbon_saved value counts towards two
+running sums: UserChallenge.carbon_saved and the user's
+UserStats.carbon_saved (core/stats.py). Pages read those instead of summing
+the user's whole progress history.
+
+Every write that changes what a progress row adds goes through here, in the
+same transaction as the write:
+
+* record() for one row that was created or toggled: two single-row
+  ``UPDATE ... SET carbon_saved = carbon_saved + x`` statements.
+* delete_progress() and delete_challenges() for deletes. They total the
+  rows being deleted in one grouped query, then subtract.
+* rebuild() recomputes users' sums from scratch, to repair them.
+
+``python manage.py verify_carbon_saved`` compares the running sums with a
+full aggregate and can rebuild the users that differ.
+"""
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Abs, Coalesce
+
+from carbon import bulk
+from core import stats
+from core.models import UserStats
+from .models import ChallengeProgress, UserChallenge
+
+# Sums are kept to the cent; SQLite adds decimals as floats
+TOLERANCE = Decimal('0.005')
+SAVED = DecimalField(max_digits=12, decimal_places=2)
+CENT = Decimal('0.01')
+# Ongoing challenges have no duration; completion_rate counts them over 30 days
+ONGOING_DAYS = 30
+
+
+def daily_saving(challenge_type):
+    """kg CO₂ one completed day of the challenge saves."""
+    days = challenge_type.duration_days or ONGOING_DAYS
+    return (Decimal(challenge_type.carbon_impact) / days).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def saving(challenge_type, completed):
+    """carbon_saved for a day's progress on a challenge of challenge_type."""
+    return daily_saving(challenge_type) if completed else Decimal(0)
+
+
+def amount(progress):
+    """What one ChallengeProgress adds to the running sums."""
+    if progress.completed and progress.carbon_saved is not None:
+        return Decimal(progress.carbon_saved)
+    return Decimal(0)
+
+
+def counted(progress):
+    """The progress rows that count towards the sums."""
+    return progress.filter(completed=True, carbon_saved__isnull=False)
+
+
+def record(user_challenge, change):
+    """Add change (may be negative) to the challenge's and its user's sums."""
+    if not change:
+        return
+    with transaction.atomic():
+        UserChallenge.objects.filter(pk=user_challenge.pk).update(carbon_saved=F('carbon_saved') + change)
+        stats.record_saved(user_challenge.user_id, change)
+
+
+def _add(per_challenge):
+    """Add {(user challenge id, user id): change} to the sums, one UPDATE per challenge and user."""
+    per_user = defaultdict(Decimal)
+    for (user_challenge_id, user_id), change in per_challenge.items():
+        if change:
+            UserChallenge.objects.filter(pk=user_challenge_id).update(carbon_saved=F('carbon_saved') + change)
+            per_user[user_id] += change
+    for user_id, change in per_user.items():
+        stats.record_saved(user_id, change)
+
+
+def delete_progress(queryset):
+    """Delete ChallengeProgress rows and take what they counted off the sums."""
+    with transaction.atomic():
+        removed = {
+            (row['user_challenge_id'], row['user_challenge__user_id']): -row['saved']
+            for row in counted(queryset).order_by().values('user_challenge_id', 'user_challenge__user_id')
+            .annotate(saved=Sum('carbon_saved'))
+        }
+        queryset.delete()
+        _add(removed)
+
+
+def delete_challenges(queryset):
+    """Delete UserChallenges (and their progress) and take their sums off their users'."""
+    with transaction.atomic():
+        per_user = queryset.exclude(carbon_saved=0).order_by().values('user_id').annotate(saved=Sum('carbon_saved'))
+        per_user = [(row['user_id'], row['saved']) for row in per_user]
+        queryset.delete()
+        for user_id, saved in per_user:
+            stats.record_saved(user_id, -saved)
+
+
+def _expected_by_challenge():
+    return Coalesce(Subquery(
+        counted(ChallengeProgress.objects.filter(user_challenge=OuterRef('pk')))
+        .order_by().values('user_challenge').annotate(total=Sum('carbon_saved')).values('total'),
+        output_field=SAVED,
+    ), Value(0), output_field=SAVED)
+
+
+def _expected_by_user():
+    return Coalesce(Subquery(
+        counted(ChallengeProgress.objects.filter(user_challenge__user=OuterRef('user')))
+        .order_by().values('user_challenge__user').annotate(total=Sum('carbon_saved')).values('total'),
+        output_field=SAVED,
+    ), Value(0), output_field=SAVED)
+
+
+def _differs(queryset, expected):
+    """Rows of queryset whose carbon_saved is off from the expected expression."""
+    return queryset.annotate(expected=expected).annotate(
+        difference=Abs(F('carbon_saved') - F('expected'), output_field=SAVED),
+    ).filter(difference__gte=TOLERANCE)
+
+
+def mismatches():
+    """
+    (challenges, users): the running sums that differ from a full aggregate.
+
+    Each is a list of dicts with the id, the running sum and the expected sum.
+    Users without a UserStats row are skipped; theirs is built on first use.
+    """
+    challenges = _differs(UserChallenge.objects.all(), _expected_by_challenge()).order_by('pk').values(
+        'pk', 'user_id', 'carbon_saved', 'expected',
+    )
+    users = _differs(UserStats.objects.all(), _expected_by_user()).order_by('pk').values(
+        'user_id', 'carbon_saved', 'expected',
+    )
+    return list(challenges), list(users)
+
+
+def rebuild(user_ids):
+    """Recompute the users' challenge sums and UserStats rows from scratch."""
+    user_ids = set(user_ids)
+    with transaction.atomic():
+        UserChallenge.objects.filter(user_id__in=user_ids).update(carbon_saved=_expected_by_challenge())
+        stats.rebuild(user_ids)
+
+
+def backfill(queryset=None):
+    """
+    Set carbon_saved with saving() on every progress row in queryset (default all).
+
+    One pass in primary-key batches (carbon/bulk.py). Each batch updates its
+    rows and the running sums they change in one transaction, so the sums
+    stay right while it runs. Returns the carbon.bulk.Progress.
+    """
+    queryset = ChallengeProgress.objects.all() if queryset is None else queryset
+    daily = {}
+
+    def apply(rows):
+        changed, changes = [], defaultdict(Decimal)
+        for progress in rows:
+            challenge_type = progress.user_challenge.challenge_type
+            if challenge_type.pk not in daily:
+                daily[challenge_type.pk] = daily_saving(challenge_type)
+            new = daily[challenge_type.pk] if progress.completed else Decimal(0)
+            if progress.carbon_saved is None or Decimal(progress.carbon_saved) != new:
+                key = (progress.user_challenge_id, progress.user_challenge.user_id)
+                changes[key] += new - amount(progress)
+                progress.carbon_saved = new
+                changed.append(progress)
+        # A missing UserStats row would be built from the rows before this batch
+        stats.ensure(user_id for _, user_id in changes)
+        _add(changes)
+        return changed
+
+    def load(batch):
+        return batch.select_related('user_challenge__challenge_type')
+
+    return bulk.bulk_update_batches(queryset, ['carbon_saved'], apply, 'Backfilled carbon saved', load=load)
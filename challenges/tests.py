@@ -1,3 +1,302 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from carbon import events
+from core import live, stats
+from . import savings, urls as challenges_urls
+from .admin import ChallengeProgressAdmin, ChallengeTypeAdmin, UserChallengeAdmin
+from .views import calculate_completion_rate
+from .models import ChallengeProgress, ChallengeType, UserChallenge
+
+
+@override_settings(REPLICA_READ_VIEWS=[])
+class ChallengeViewQueryTests(TestCase):
+    """Every view in challenges.urls, with several joined challenges (the test runner raises on N+1s)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='testpass123')
+        today = timezone.now().date()
+        cls.challenge_types = [
+            ChallengeType.objects.create(
+                title=f'Challenge {i}', description='', category='energy', duration_type='weekly',
+                duration_days=7 if i else 0, carbon_impact=2, difficulty_level=1,
+            )
+            for i in range(5)
+        ]
+        for challenge_type in cls.challenge_types[:4]:
+            user_challenge = UserChallenge.objects.create(user=cls.user, challenge_type=challenge_type)
+            for day in range(10):
+                ChallengeProgress.objects.create(
+                    user_challenge=user_challenge, date=today - timedelta(days=day), completed=day % 2 == 0,
+                )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_every_challenges_url_is_covered(self):
+        tested = {name.removeprefix('test_') for name in dir(self) if name.startswith('test_')}
+        self.assertLessEqual({pattern.name for pattern in challenges_urls.urlpatterns}, tested)
+
+    def test_index(self):
+        self.assertEqual(self.client.get(reverse('challenges:index')).status_code, 200)
+
+    def test_join_challenge(self):
+        response = self.client.post(reverse('challenges:join_challenge', args=[self.challenge_types[4].id]))
+        self.assertTrue(response.json()['success'])
+
+    def test_my_challenges(self):
+        response = self.client.get(reverse('challenges:my_challenges'))
+        items = response.context['challenges_with_progress']
+        self.assertEqual(len(items), 4)
+        for item in items:
+            self.assertEqual(len(item['recent_progress']), 7)
+
+    def test_my_challenges_completion_rates(self):
+        items = self.client.get(reverse('challenges:my_challenges')).context['challenges_with_progress']
+        rates = {item['challenge'].challenge_type.duration_days: item['completion_rate'] for item in items}
+        # Ongoing: 5 of the last 30 days; weekly: the 1 completed day since today's start
+        self.assertEqual(rates[0], 16)
+        self.assertEqual(rates[7], 14)
+
+    def test_update_progress(self):
+        user_challenge = UserChallenge.objects.filter(user=self.user).first()
+        response = self.client.post(
+            reverse('challenges:update_progress', args=[user_challenge.id]),
+            json.dumps({'completed': True}), content_type='application/json',
+        )
+        self.assertTrue(response.json()['success'])
+
+    def test_update_progress_keeps_carbon_saved(self):
+        # A weekly challenge with carbon_impact 2 saves 0.29 kg a day
+        user_challenge = UserChallenge.objects.get(user=self.user, challenge_type=self.challenge_types[1])
+        ChallengeProgress.objects.filter(user_challenge=user_challenge, date=timezone.now().date()).update(
+            carbon_saved=Decimal('2.50'),
+        )
+        savings.rebuild([self.user.id])
+        saved = stats.get(self.user.id).carbon_saved
+        url = reverse('challenges:update_progress', args=[user_challenge.id])
+
+        self.client.post(url, json.dumps({'completed': False}), content_type='application/json')
+        self.assertEqual(stats.get(self.user.id).carbon_saved, saved - Decimal('2.50'))
+        self.client.post(url, json.dumps({'completed': True}), content_type='application/json')
+        self.assertEqual(stats.get(self.user.id).carbon_saved, saved - Decimal('2.50') + Decimal('0.29'))
+        user_challenge.refresh_from_db()
+        self.assertEqual(user_challenge.carbon_saved, Decimal('0.29'))
+        self.assertEqual(savings.mismatches(), ([], []))
+        self.assertContains(self.client.get(reverse('challenges:my_challenges')), '0.3kg CO₂ saved so far')
+
+    def test_update_progress_publishes_an_event(self):
+        user_challenge = UserChallenge.objects.get(user=self.user, challenge_type=self.challenge_types[1])
+        url = reverse('challenges:update_progress', args=[user_challenge.id])
+
+        def post():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(url, json.dumps({'completed': True}), content_type='application/json')
+
+        async def listen():
+            with events.subscribe({live.user_channel(self.user.id)}) as subscription:
+                await sync_to_async(post)()
+                return await asyncio.wait_for(subscription.get(), 1)
+
+        channel, data = async_to_sync(listen)()
+        user_challenge.refresh_from_db()
+        self.assertEqual(data['type'], 'progress')
+        self.assertEqual((data['challenge'], data['completed']), (user_challenge.pk, True))
+        self.assertEqual(data['carbon_saved'], str(user_challenge.carbon_saved))
+        self.assertEqual(data['date'], timezone.now().date().isoformat())
+
+    def test_backfill_carbon_saved(self):
+        out = StringIO()
+        call_command('backfill_carbon_saved', stdout=out)
+        self.assertIn('Backfilled carbon saved: 40 rows', out.getvalue())
+        # 5 completed days on each challenge: 2 kg over 30 days (ongoing) or over 7 days
+        self.assertEqual(stats.get(self.user.id).carbon_saved, 5 * Decimal('0.07') + 3 * 5 * Decimal('0.29'))
+        self.assertEqual(savings.mismatches(), ([], []))
+
+        call_command('backfill_carbon_saved', missing=True, stdout=out)
+        self.assertIn('Backfilled carbon saved: 0 rows', out.getvalue())
+
+
+@override_settings(REPLICA_READ_VIEWS=[])
+class ChallengeProgressAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='testpass123')
+        cls.users = [User.objects.create_user(f'user{i}', password='testpass123') for i in range(3)]
+        challenge_type = ChallengeType.objects.create(
+            title='Cold showers', description='', category='energy', duration_type='weekly',
+            duration_days=7, carbon_impact=2, difficulty_level=1,
+        )
+        today = timezone.now().date()
+        for user in cls.users:
+            user_challenge = UserChallenge.objects.create(user=user, challenge_type=challenge_type)
+            for day in range(8):
+                ChallengeProgress.objects.create(user_challenge=user_challenge, date=today - timedelta(days=day))
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:challenges_challengeprogress_changelist')
+
+    def page(self, params=None, per_page=10):
+        with mock.patch.object(ChallengeProgressAdmin, 'list_per_page', per_page):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(self.url, params or {})
+        return response, len(queries)
+
+    def test_cursor_walks_every_row_in_order(self):
+        seen, params = [], {}
+        while True:
+            cl = self.page(params)[0].context['cl']
+            seen += [(entry.date, entry.id) for entry in cl.result_list]
+            if not cl.next_cursor:
+                break
+            params = {'cursor': cl.next_cursor}
+        self.assertEqual(len(seen), 24)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertEqual(cl.result_count, 24)
+        self.assertFalse(cl.result_count_estimated)
+
+    def test_next_link(self):
+        response = self.page()[0]
+        self.assertContains(response, f"?cursor={response.context['cl'].next_cursor}")
+        self.assertContains(response, '24 challenge progresss')
+
+    def test_queries_do_not_grow_with_the_page(self):
+        self.assertEqual(self.page(per_page=2)[1], self.page(per_page=20)[1])
+
+    def test_search_matches_exact_username(self):
+        self.assertEqual(self.page({'q': 'user1'})[0].context['cl'].result_count, 8)
+        self.assertEqual(self.page({'q': 'user'})[0].context['cl'].result_count, 0)
+        self.assertEqual(self.page({'q': 'Cold'})[0].context['cl'].result_count, 24)
+
+    def test_bad_cursor_is_rejected(self):
+        response, _ = self.page({'cursor': 'nonsense'})
+        self.assertRedirects(response, f'{self.url}?e=1', fetch_redirect_response=False)
+
+
+@override_settings(REPLICA_READ_VIEWS=[], BULK_BATCH_SIZE=2)
+class ChallengeBulkActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', password='testpass123')
+        cls.weekly = ChallengeType.objects.create(
+            title='Bike to work', description='', category='transport', duration_type='weekly',
+            duration_days=7, carbon_impact=2, difficulty_level=1,
+        )
+        cls.ongoing = ChallengeType.objects.create(
+            title='Meatless days', description='', category='food', duration_type='ongoing',
+            duration_days=0, carbon_impact=2, difficulty_level=1,
+        )
+        today = timezone.now().date()
+        start = timezone.now() - timedelta(days=6)
+        for i in range(5):
+            user = User.objects.create_user(f'user{i}', password='testpass123')
+            for challenge_type in (cls.weekly, cls.ongoing):
+                user_challenge = UserChallenge.objects.create(user=user, challenge_type=challenge_type, start_date=start)
+                for day in range(i + 2):
+                    ChallengeProgress.objects.create(
+                        user_challenge=user_challenge, date=today - timedelta(days=day), completed=day % 2 == 0,
+                    )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def run_action(self, model, action, queryset):
+        url = reverse(f'admin:challenges_{model}_changelist')
+        return self.client.post(url, {
+            'action': action, '_selected_action': list(queryset.values_list('pk', flat=True)),
+        }, follow=True)
+
+    def test_recompute_progress_matches_update_challenge_progress(self):
+        UserChallenge.objects.update(progress_percentage=0)
+        response = self.run_action('userchallenge', 'recompute_progress', UserChallenge.objects.all())
+        self.assertContains(response, 'Recomputed progress: 10 rows in 5 batches')
+        for user_challenge in UserChallenge.objects.select_related('challenge_type'):
+            self.assertEqual(user_challenge.progress_percentage, calculate_completion_rate(user_challenge))
+
+    def test_expire_sets_a_final_status(self):
+        UserChallenge.objects.filter(challenge_type=self.weekly).update(progress_percentage=85)
+        self.run_action('userchallenge', 'expire', UserChallenge.objects.all())
+        statuses = dict(UserChallenge.objects.values_list('challenge_type_id', 'status').distinct())
+        self.assertEqual(statuses, {self.weekly.id: 'completed', self.ongoing.id: 'failed'})
+        self.assertFalse(UserChallenge.objects.filter(end_date__gt=timezone.now()).exists())
+
+    def test_reactivate_restarts_the_challenge(self):
+        UserChallenge.objects.update(status='failed', progress_percentage=40)
+        self.run_action('userchallenge', 'reactivate', UserChallenge.objects.all())
+        for user_challenge in UserChallenge.objects.all():
+            self.assertEqual((user_challenge.status, user_challenge.progress_percentage), ('active', 0))
+            if user_challenge.challenge_type_id == self.weekly.id:
+                self.assertEqual(user_challenge.end_date - user_challenge.start_date, timedelta(days=7))
+            else:
+                self.assertIsNone(user_challenge.end_date)
+
+    def test_deactivate_challenge_types(self):
+        response = self.run_action('challengetype', 'deactivate', ChallengeType.objects.all())
+        self.assertContains(response, 'Deactivated: 2 rows in 1 batch')
+        self.assertFalse(ChallengeType.objects.filter(is_active=True).exists())
+
+
+@override_settings(REPLICA_READ_VIEWS=[])
+class CarbonSavedSumsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='testpass123', is_staff=True, is_superuser=True)
+        challenge_type = ChallengeType.objects.create(
+            title='Bike', description='', category='transport', duration_type='weekly',
+            duration_days=7, carbon_impact=3, difficulty_level=1,
+        )
+        self.user_challenge = UserChallenge.objects.create(user=self.user, challenge_type=challenge_type)
+        today = timezone.now().date()
+        for day in range(4):
+            ChallengeProgress.objects.create(
+                user_challenge=self.user_challenge, date=today - timedelta(days=day),
+                completed=day != 3, carbon_saved=Decimal('1.25'),
+            )
+        savings.rebuild([self.user.id])
+
+    def assertSums(self, expected):
+        self.user_challenge.refresh_from_db()
+        self.assertEqual(self.user_challenge.carbon_saved, expected)
+        self.assertEqual(stats.get(self.user.id).carbon_saved, expected)
+        self.assertEqual(savings.mismatches(), ([], []))
+
+    def test_rebuild_counts_completed_rows(self):
+        self.assertSums(Decimal('3.75'))
+
+    def test_admin_deletes_subtract(self):
+        admin = ChallengeProgressAdmin(ChallengeProgress, None)
+        admin.delete_queryset(None, ChallengeProgress.objects.filter(date__lt=timezone.now().date()))
+        self.assertSums(Decimal('1.25'))
+
+        UserChallengeAdmin(UserChallenge, None).delete_queryset(None, UserChallenge.objects.all())
+        self.assertEqual(stats.get(self.user.id).carbon_saved, 0)
+
+    def test_admin_challenge_type_delete_subtracts(self):
+        ChallengeTypeAdmin(ChallengeType, None).delete_model(None, self.user_challenge.challenge_type)
+        self.assertFalse(UserChallenge.objects.exists())
+        self.assertEqual(stats.get(self.user.id).carbon_saved, 0)
+        self.assertEqual(savings.mismatches(), ([], []))
+
+    def test_verify_command(self):
+        UserChallenge.objects.update(carbon_saved=0)
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, '1 challenge and 0 user sums differ'):
+            call_command('verify_carbon_saved', stdout=out)
+        self.assertIn('running 0.00, expected 3.75', out.getvalue())
+
+        call_command('verify_carbon_saved', fix=True, stdout=out)
+        self.assertSums(Decimal('3.75'))
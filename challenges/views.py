@@ -1,9 +1,20 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Count, Q
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q
+from django.db.models.functions import TruncDate
+from datetime import timedelta
+from decimal import Decimal
+from carbon import bulk, metrics
+from carbon.ratelimit import ratelimit
+from core import live, stats
+from . import savings
 from .models import ChallengeType, UserChallenge, ChallengeProgress
 import json
 @login_required
@@ -26,7 +37,30 @@ def index(request):
     }
     return render(request, 'challenges/index.html', context)
 
+
 @login_required
+async def index_async(request):
+    """index for ASGI deployments, through the async ORM."""
+    user = await request.auser()
+    challenges, user_challenges = await asyncio.gather(
+        _alist(ChallengeType.objects.filter(is_active=True)),
+        _alist(UserChallenge.objects.filter(
+            user=user,
+            status='active'
+        ).values_list('challenge_type_id', flat=True)),
+    )
+    context = {
+        'challenges': challenges,
+        'user_challenges': user_challenges,
+    }
+    return await sync_to_async(render)(request, 'challenges/index.html', context)
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+@login_required
+@ratelimit('join_challenge', '20/m')
 def join_challenge(request, challenge_id):
     """Allow user to join a challenge"""
     if request.method == 'POST':
@@ -49,13 +83,14 @@ def join_challenge(request, challenge_id):
                 existing_challenge.status = 'active'
                 existing_challenge.start_date = timezone.now()
                 existing_challenge.progress_percentage = 0
-                existing_challenge.save()
+                existing_challenge.save(update_fields=['status', 'start_date', 'progress_percentage', 'updated_at'])
         else:
             # Create new user challenge
             UserChallenge.objects.create(
                 user=request.user,
                 challenge_type=challenge_type
             )
+        metrics.CHALLENGE_JOINS.inc(category=challenge_type.category)
         
         return JsonResponse({
             'success': True, 
@@ -67,35 +102,39 @@ def join_challenge(request, challenge_id):
 @login_required
 def my_challenges(request):
     """Display user's active challenges"""
+    today = timezone.now().date()
     active_challenges = UserChallenge.objects.filter(
         user=request.user, 
         status='active'
-    ).select_related('challenge_type')
+    ).select_related('challenge_type').annotate(
+        completed_days=Count('progress_entries', filter=completed_days_filter(today)),
+    ).prefetch_related(
+        # Last 7 days of progress for every challenge in one query
+        Prefetch('progress_entries', queryset=ChallengeProgress.objects.order_by('-date')[:7], to_attr='recent_progress'),
+    )
     
-    # Get recent progress for each challenge
     challenges_with_progress = []
     for challenge in active_challenges:
-        recent_progress = ChallengeProgress.objects.filter(
-            user_challenge=challenge
-        ).order_by('-date')[:7]  # Last 7 days
-        
         challenges_with_progress.append({
             'challenge': challenge,
-            'recent_progress': recent_progress,
-            'completion_rate': calculate_completion_rate(challenge)
+            'recent_progress': challenge.recent_progress,
+            'completion_rate': completion_rate(challenge, challenge.completed_days)
         })
     
     context = {
         'challenges_with_progress': challenges_with_progress,
+        # Lifetime carbon saved and current streak, kept up to date by core/stats.py
+        'user_stats': stats.get(request.user.id),
     }
     return render(request, 'challenges/my_challenges.html', context)
 
 @login_required
+@ratelimit('update_progress', '30/m')
 def update_progress(request, challenge_id):
     """Update daily progress for a challenge"""
     if request.method == 'POST':
         user_challenge = get_object_or_404(
-            UserChallenge, 
+            UserChallenge.objects.select_related('challenge_type'), 
             id=challenge_id, 
             user=request.user
         )
@@ -104,23 +143,34 @@ def update_progress(request, challenge_id):
         completed = data.get('completed', False)
         notes = data.get('notes', '')
         
-        # Create or update today's progress
-        progress, created = ChallengeProgress.objects.get_or_create(
-            user_challenge=user_challenge,
-            date=timezone.now().date(),
-            defaults={
-                'completed': completed,
-                'notes': notes
-            }
-        )
-        
-        if not created:
-            progress.completed = completed
-            progress.notes = notes
-            progress.save()
-        
-        # Update overall progress percentage
-        update_challenge_progress(user_challenge)
+        # What the day saves is arithmetic on the challenge type (challenges/savings.py)
+        carbon_saved = savings.saving(user_challenge.challenge_type, completed)
+        with transaction.atomic():
+            # Create or update today's progress
+            progress, created = ChallengeProgress.objects.get_or_create(
+                user_challenge=user_challenge,
+                date=timezone.now().date(),
+                defaults={
+                    'completed': completed,
+                    'notes': notes,
+                    'carbon_saved': carbon_saved,
+                }
+            )
+            
+            saved_before = Decimal(0) if created else savings.amount(progress)
+            if not created:
+                progress.completed = completed
+                progress.notes = notes
+                progress.carbon_saved = carbon_saved
+                progress.save()
+            # Running sums for this challenge and the user (challenges/savings.py)
+            savings.record(user_challenge, savings.amount(progress) - saved_before)
+            
+            # Update overall progress percentage
+            update_challenge_progress(user_challenge)
+            # Open My Challenges pages get the change as an event (core/live.py)
+            live.progress_updated(user_challenge, progress)
+        metrics.PROGRESS_UPDATES.inc(completed=str(bool(completed)).lower())
         
         return JsonResponse({
             'success': True, 
@@ -129,15 +179,31 @@ def update_progress(request, challenge_id):
     
     return JsonResponse({'success': False, 'message': 'Invalid request'})
 
+def completed_days_filter(today):
+    """
+    Filter for counting a UserChallenge's completed progress_entries in SQL,
+    over the same window as calculate_completion_rate.
+    """
+    return Q(progress_entries__completed=True) & (
+        Q(challenge_type__duration_days=0, progress_entries__date__gte=today - timedelta(days=30))
+        | Q(challenge_type__duration_days__gt=0, progress_entries__date__gte=TruncDate('start_date'))
+    )
+
+def completion_rate(user_challenge, completed_days):
+    """Completion percentage from the number of completed days"""
+    if user_challenge.challenge_type.duration_days == 0:  # Ongoing challenge
+        total_days = 30
+    else:
+        total_days = user_challenge.challenge_type.duration_days
+    return min(100, int((completed_days / total_days) * 100)) if total_days > 0 else 0
+
 def calculate_completion_rate(user_challenge):
     """Calculate completion rate for a challenge"""
     if user_challenge.challenge_type.duration_days == 0:  # Ongoing challenge
         # For ongoing challenges, look at last 30 days
-        total_days = 30
         start_date = timezone.now().date() - timezone.timedelta(days=30)
     else:
         # For timed challenges, calculate from start date
-        total_days = user_challenge.challenge_type.duration_days
         start_date = user_challenge.start_date.date()
     
     completed_days = ChallengeProgress.objects.filter(
@@ -146,11 +212,10 @@ def calculate_completion_rate(user_challenge):
         date__gte=start_date
     ).count()
     
-    return min(100, int((completed_days / total_days) * 100)) if total_days > 0 else 0
+    return completion_rate(user_challenge, completed_days)
 
-def update_challenge_progress(user_challenge):
-    """Update the overall progress percentage of a challenge"""
-    completion_rate = calculate_completion_rate(user_challenge)
+def apply_completion_rate(user_challenge, completion_rate):
+    """Set progress_percentage, and the status it leads to, without saving"""
     user_challenge.progress_percentage = completion_rate
     
     # Mark as completed if reached 100% or time expired with good progress
@@ -158,5 +223,37 @@ def update_challenge_progress(user_challenge):
         user_challenge.status = 'completed'
     elif user_challenge.is_expired and completion_rate < 50:
         user_challenge.status = 'failed'
-    
-    user_challenge.save()
\ No newline at end of file
+
+def update_challenge_progress(user_challenge):
+    """Update the overall progress percentage of a challenge"""
+    apply_completion_rate(user_challenge, calculate_completion_rate(user_challenge))
+    # Not carbon_saved: its running sum is only changed by challenges/savings.py
+    user_challenge.save(update_fields=['progress_percentage', 'status', 'updated_at'])
+
+def recompute_progress(queryset):
+    """
+    update_challenge_progress for every challenge in queryset, in batches:
+    one query counts a batch's completed days, one bulk_update saves it.
+    Returns the carbon.bulk.Progress.
+    """
+    today = timezone.now().date()
+    now = timezone.now()
+
+    def apply(challenges):
+        changed = []
+        for challenge in challenges:
+            before = (challenge.progress_percentage, challenge.status)
+            apply_completion_rate(challenge, completion_rate(challenge, challenge.completed_days))
+            if (challenge.progress_percentage, challenge.status) != before:
+                challenge.updated_at = now  # bulk_update skips auto_now
+                changed.append(challenge)
+        return changed
+
+    def load(batch):
+        return batch.select_related('challenge_type').annotate(
+            completed_days=Count('progress_entries', filter=completed_days_filter(today)),
+        )
+
+    return bulk.bulk_update_batches(
+        queryset, ['progress_percentage', 'status', 'updated_at'], apply, 'Recomputed progress', load=load,
+    )
\ No newline at end of file
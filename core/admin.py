@@ -1,4 +1,135 @@
+from django import forms
 from django.contrib import admin
-from .models import CarbonFootprint
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.contrib.auth.models import User
+
+from carbon import bulk
+from carbon.changelist import LargeTableAdmin
+from . import stats, teams, timeseries
+from .models import CarbonFootprint, Membership, Organization, Team
 # Register your models here.
-admin.site.register(CarbonFootprint)
\ No newline at end of file
+
+@admin.register(CarbonFootprint)
+class CarbonFootprintAdmin(LargeTableAdmin):
+    # Pages by cursor with estimated counts (carbon/changelist.py); the
+    # created_at index covers the order
+    list_display = ['__str__', 'total_emission', 'created_at']
+    list_select_related = ['user']
+    list_filter = ['created_at']
+    search_fields = ['user__username__exact']
+    search_help_text = 'Exact username'
+    raw_id_fields = ['user']
+    cursor_fields = ('-created_at', '-id')
+    actions = ['recalculate_emissions']
+
+    @admin.action(description='Recalculate emissions of selected footprints')
+    def recalculate_emissions(self, request, queryset):
+        # After an emission factor changes; one UPDATE per batch, computed in SQL
+        progress = bulk.update(
+            queryset, 'Recalculated emissions', total_emission=CarbonFootprint.total_emission_expression(),
+        )
+        self.users_changed(queryset.values_list('user_id', flat=True).distinct())
+        self.message_user(request, progress.summary())
+
+    # Edits and deletes can't be applied as a delta: the owners' chart series
+    # (core/timeseries.py), UserStats (core/stats.py) and team totals
+    # (core/teams.py) are redone
+    def users_changed(self, user_ids):
+        user_ids = set(user_ids)
+        timeseries.invalidate(user_ids)
+        stats.rebuild(user_ids)
+        teams.rebuild_for_users(user_ids)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # A footprint moved to another user changes both users
+        self.users_changed({obj.user_id, form.initial.get('user') or obj.user_id})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.users_changed([obj.user_id])
+
+    def delete_queryset(self, request, queryset):
+        user_ids = list(queryset.values_list('user_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        self.users_changed(user_ids)
+
+
+class TeamInline(admin.TabularInline):
+    model = Team
+    fields = ['name', 'slug', 'member_count', 'total_emission', 'entries_count']
+    readonly_fields = ['member_count', 'total_emission', 'entries_count']
+    prepopulated_fields = {'slug': ['name']}
+    extra = 0
+
+
+@admin.register(Organization)
+class OrganizationAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug', 'member_count', 'total_emission', 'entries_count']
+    readonly_fields = ['member_count', 'total_emission', 'entries_count']
+    prepopulated_fields = {'slug': ['name']}
+    inlines = [TeamInline]
+    actions = ['rebuild_totals']
+
+    @admin.action(description='Rebuild team totals of selected organizations')
+    def rebuild_totals(self, request, queryset):
+        team_ids = list(Team.objects.filter(organization__in=queryset).values_list('pk', flat=True))
+        teams.rebuild(team_ids)
+        self.message_user(request, f'Rebuilt totals of {len(team_ids)} teams.')
+
+
+class MembershipForm(forms.ModelForm):
+    class Meta:
+        model = Membership
+        fields = ['user', 'team']
+
+    def clean(self):
+        # organization isn't on the form, so the model's unique (user,
+        # organization) check is skipped; one team per organization
+        cleaned_data = super().clean()
+        user, team = cleaned_data.get('user'), cleaned_data.get('team')
+        if user and team:
+            others = Membership.objects.filter(user=user, organization_id=team.organization_id)
+            if self.instance.pk:
+                others = others.exclude(pk=self.instance.pk)
+            if others.exists():
+                self.add_error('team', f'{user} is already in a team of {team.organization}.')
+        return cleaned_data
+
+
+@admin.register(Membership)
+class MembershipAdmin(admin.ModelAdmin):
+    # Memberships go through core/teams.py, which moves the team totals
+    form = MembershipForm
+    list_display = ['user', 'team', 'joined_at']
+    list_select_related = ['user', 'team__organization']
+    list_filter = ['organization']
+    search_fields = ['user__username__exact']
+    raw_id_fields = ['user']
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            teams.move(obj)
+        else:
+            obj.pk = teams.join(obj.user, obj.team).pk
+
+    def delete_model(self, request, obj):
+        teams.leave(obj)
+
+    def delete_queryset(self, request, queryset):
+        for membership in queryset:
+            teams.leave(membership)
+
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class UserAdmin(BaseUserAdmin):
+    # Deleting a user cascades to their memberships; delete through teams,
+    # so the teams' and organizations' totals lose them too
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, User.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        teams.delete_users(queryset)
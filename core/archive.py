@@ -0,0 +1,155 @@
+"""
+Archival of old CarbonFootprint rows.
+
+Footprints older than the retention window are exported to compressed JSONL
+files and then compacted into one FootprintMonthlySummary row per user and
+month. UserStats (core/stats.py) and the chart series count the summaries,
+so users see the same lifetime numbers while the live table stays small.
+"""
+import os
+from datetime import date, datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from . import timeseries
+from .exports import CATEGORIES, gzip_chunks, jsonl_lines
+from .models import CarbonFootprint, FootprintMonthlySummary
+
+
+def _totals_aggregates():
+    expressions = CarbonFootprint.emission_expressions()
+    return {
+        'total': Sum('total_emission'),
+        'entries': Count('id'),
+        'last_updated': Max('created_at'),
+        **{name: Sum(expressions[name]) for name in CATEGORIES},
+    }
+
+
+def footprint_totals(queryset):
+    """Aggregate totals, per-category sums and entry count for a footprint queryset."""
+    return _zero_missing(queryset.order_by().aggregate(**_totals_aggregates()))
+
+
+async def afootprint_totals(queryset):
+    """Async version of footprint_totals()."""
+    return _zero_missing(await queryset.order_by().aaggregate(**_totals_aggregates()))
+
+
+def _zero_missing(totals):
+    # Aggregates over no rows come back as None
+    last_updated = totals.pop('last_updated')
+    totals = {key: value or 0 for key, value in totals.items()}
+    totals['last_updated'] = last_updated
+    return totals
+
+
+def archive_cutoff(retention_days, now=None):
+    """Start of the month containing now - retention_days; whole months are archived."""
+    now = now or timezone.now()
+    oldest_kept = now - timedelta(days=retention_days)
+    return oldest_kept.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def months_to_archive(cutoff):
+    """First days of the months that still have live rows before cutoff."""
+    months = (
+        CarbonFootprint.objects.filter(created_at__lt=cutoff)
+        .annotate(month=TruncMonth('created_at'))
+        .order_by('month')
+        .values_list('month', flat=True)
+        .distinct()
+    )
+    return [m.date() for m in months]
+
+
+def export_rows(queryset, path):
+    """Write the rows to a gzip-compressed JSONL file; returns the row count."""
+    tmp_path = path + '.tmp'
+    count = 0
+
+    def counted(lines):
+        nonlocal count
+        for line in lines:
+            count += 1
+            yield line
+
+    with open(tmp_path, 'wb') as fh:
+        for chunk in gzip_chunks(counted(jsonl_lines(queryset))):
+            fh.write(chunk)
+    os.replace(tmp_path, path)
+    return count
+
+
+def compact_month(month, cutoff, export_dir):
+    """
+    Export and compact the footprints of one month created before cutoff.
+
+    Returns (rows archived, export path). Everything happens in one
+    transaction, and the rows are only deleted after the export file exists.
+    """
+    next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    start = timezone.make_aware(datetime(month.year, month.month, 1))
+    end = min(timezone.make_aware(datetime(next_month.year, next_month.month, 1)), cutoff)
+
+    with transaction.atomic():
+        rows = CarbonFootprint.objects.filter(created_at__gte=start, created_at__lt=end)
+        # Pin the row set so footprints imported meanwhile aren't deleted unexported
+        max_id = rows.aggregate(max_id=Max('id'))['max_id']
+        if max_id is None:
+            return 0, None
+        rows = rows.filter(id__lte=max_id)
+
+        stamp = timezone.now().strftime('%Y%m%dT%H%M%S')
+        path = os.path.join(export_dir, f'footprints_{month:%Y_%m}_{stamp}.jsonl.gz')
+        exported = export_rows(rows.order_by('id'), path)
+
+        expressions = CarbonFootprint.emission_expressions()
+        per_user = rows.order_by().values('user_id').annotate(
+            total=Sum('total_emission'),
+            entries=Count('id'),
+            first=Min('created_at'),
+            last=Max('created_at'),
+            **{name: Sum(expressions[name]) for name in CATEGORIES},
+        )
+        existing = {
+            s.user_id: s for s in FootprintMonthlySummary.objects.select_for_update().filter(month=month)
+        }
+
+        new_summaries, updated = [], []
+        for row in per_user:
+            summary = existing.get(row['user_id'])
+            if summary is None:
+                new_summaries.append(FootprintMonthlySummary(
+                    user_id=row['user_id'],
+                    month=month,
+                    total_emission=row['total'] or 0,
+                    entries_count=row['entries'],
+                    first_created_at=row['first'],
+                    last_created_at=row['last'],
+                    **{name: row[name] or 0 for name in CATEGORIES},
+                ))
+                continue
+
+            # Merge into a summary from an earlier run (e.g. late historical imports)
+            summary.total_emission += row['total'] or 0
+            summary.entries_count += row['entries']
+            summary.first_created_at = min(summary.first_created_at, row['first'])
+            summary.last_created_at = max(summary.last_created_at, row['last'])
+            for name in CATEGORIES:
+                setattr(summary, name, getattr(summary, name) + (row[name] or 0))
+            updated.append(summary)
+
+        FootprintMonthlySummary.objects.bulk_create(new_summaries, batch_size=1000)
+        FootprintMonthlySummary.objects.bulk_update(
+            updated,
+            ['total_emission', 'entries_count', 'first_created_at', 'last_created_at', *CATEGORIES],
+            batch_size=1000,
+        )
+        rows.delete()
+        timeseries.invalidate(row['user_id'] for row in per_user)
+
+    return exported, path
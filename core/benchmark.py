@@ -0,0 +1,495 @@
+"""
+Request benchmarks for the core and challenges endpoints.
+
+Each scenario drives one endpoint through the full middleware stack with
+django.test.Client. It records wall-clock latency and the number of SQL
+queries per request (from RequestTimingMiddleware). Results are plain dicts so they can be dumped to JSON
+and compared against an earlier run.
+
+run_concurrent() compares the two deployments on the read paths: the WSGI
+handler with sync views, one request per thread, against the ASGI handler
+with the async views, many requests in flight on one event loop.
+
+run_transfer() measures what goes over the wire: response size and latency
+for the main pages, an API and the stylesheet, once per Accept-Encoding.
+page_weight() adds up what each page template makes the browser download.
+"""
+import asyncio
+import gzip
+import importlib
+import json
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from html import unescape
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import clear_url_caches, reverse
+
+from carbon import instrumentation, parallel, storage
+from carbon.instrumentation import percentile
+from challenges.models import UserChallenge
+from .models import CarbonFootprint
+
+TRACK_FORM = {
+    'car_travel_km': 25, 'fuel_type': 'petrol', 'flights_hours': 0,
+    'public_transport_km': 10, 'meals_per_day': 3, 'meal_type': 'medium',
+    'electricity_kwh': 300, 'waste_kg': 20, 'waste_type': 'medium',
+}
+
+TIPS_PAYLOAD = json.dumps({
+    'result': 180,
+    'emission_breakdown': {'total': 180, 'transportation': 60, 'food': 70, 'electricity': 40, 'waste': 10},
+})
+
+PERIODS = ['daily', 'weekly', 'monthly', 'all']
+
+# Each user may only save a few footprints a day
+TRACK_LIMIT_PER_USER = CarbonFootprint.DAILY_LIMIT
+
+
+class Scenario:
+    def __init__(self, name, make_request):
+        self.name = name
+        self.make_request = make_request
+
+
+def _track(run, i):
+    return run.client_for(i).post(reverse('track'), TRACK_FORM)
+
+
+def _dashboard(run, i):
+    return run.client_for(i).get(reverse('dashboard'), {'period': PERIODS[i % len(PERIODS)]})
+
+
+def _leaderboard(run, i):
+    return run.client_for(i).get(reverse('leaderboard'), {'period': PERIODS[i % len(PERIODS)]})
+
+
+def _tips_api(run, i):
+    return run.client_for(i).post(reverse('tips_api'), TIPS_PAYLOAD, content_type='application/json')
+
+
+def _challenges_index(run, i):
+    return run.client_for(i).get(reverse('challenges:index'))
+
+
+def _my_challenges(run, i):
+    return run.client_for(i).get(reverse('challenges:my_challenges'))
+
+
+def _update_progress(run, i):
+    user_challenge_id = run.user_challenge_for(i)
+    return run.client_for(run.challenge_user_for(i)).post(
+        reverse('challenges:update_progress', args=[user_challenge_id]),
+        json.dumps({'completed': i % 2 == 0, 'notes': 'benchmark'}),
+        content_type='application/json',
+    )
+
+
+SCENARIOS = [
+    Scenario('track', _track),
+    Scenario('dashboard', _dashboard),
+    Scenario('leaderboard', _leaderboard),
+    Scenario('tips_api', _tips_api),
+    Scenario('challenges.index', _challenges_index),
+    Scenario('my_challenges', _my_challenges),
+    Scenario('update_progress', _update_progress),
+]
+
+
+# Read paths with async views: scenario name -> (URL name, cycles through PERIODS)
+CONCURRENT_SCENARIOS = {
+    'dashboard': ('dashboard', True),
+    'leaderboard': ('leaderboard', True),
+    'challenges.index': ('challenges:index', False),
+}
+
+# Transfer benchmark: scenario name -> request(client, headers, stylesheet URL)
+TRANSFER_SCENARIOS = {
+    'landing': lambda client, headers, css: client.get(reverse('landing'), headers=headers),
+    'dashboard': lambda client, headers, css: client.get(reverse('dashboard'), headers=headers),
+    'leaderboard': lambda client, headers, css: client.get(reverse('leaderboard'), headers=headers),
+    'challenges.index': lambda client, headers, css: client.get(reverse('challenges:index'), headers=headers),
+    'tips_api': lambda client, headers, css: client.post(
+        reverse('tips_api'), TIPS_PAYLOAD, content_type='application/json', headers=headers,
+    ),
+    'utilities.css': lambda client, headers, css: client.get(css, headers=headers),
+}
+
+# Label -> Accept-Encoding header sent (None sends none)
+TRANSFER_ENCODINGS = {'identity': None, 'gzip': 'gzip', 'br': 'br, gzip'}
+
+
+def transfer_encodings():
+    """TRANSFER_ENCODINGS, without br when the brotli package (and so every .br copy) is missing."""
+    if storage.brotli is None:
+        return {label: header for label, header in TRANSFER_ENCODINGS.items() if label != 'br'}
+    return TRANSFER_ENCODINGS
+
+# Page-weight report: template -> (URL name, needs a logged-in user)
+PAGE_WEIGHT_PAGES = {
+    'landing.html': ('landing', False),
+    'registration/login.html': ('login', False),
+    'registration/register.html': ('register', False),
+    'track.html': ('track', True),
+    'dashboard.html': ('dashboard', True),
+    'leaderboard.html': ('leaderboard', True),
+    'challenges/index.html': ('challenges:index', True),
+    'challenges/my_challenges.html': ('challenges:my_challenges', True),
+}
+
+_TAG = re.compile(r'<(script|link|img|iframe)\b([^>]*)>', re.IGNORECASE)
+_ATTRIBUTE = re.compile(r'([\w-]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+
+# Reloaded in this order so the root URLconf picks up the app patterns
+URL_MODULES = ('core.urls', 'challenges.urls', 'carbon.urls')
+
+
+@contextmanager
+def deployment(asgi):
+    """Route URLs the way carbon/asgi.py (asgi=True) or carbon/wsgi.py does."""
+    def load(enabled):
+        with override_settings(ASYNC_VIEWS=enabled):
+            for name in URL_MODULES:
+                importlib.reload(importlib.import_module(name))
+        clear_url_caches()
+
+    original = settings.ASYNC_VIEWS
+    load(asgi)
+    try:
+        yield
+    finally:
+        load(original)
+
+
+@contextmanager
+def simulated_latency(seconds):
+    """
+    Add a fixed round trip to every query inside the block, on every thread.
+
+    Local databases answer in microseconds; this approximates a hosted one.
+    The delay is added to connections that are already open on this thread
+    and to every connection opened meanwhile, e.g. by the parallel-read pool.
+    """
+    if not seconds:
+        yield
+        return
+
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def add_delay(sender, connection, **kwargs):
+        # First, so execute_wrapper() blocks that are open right now still pop their own hook
+        connection.execute_wrappers.insert(0, delay)
+
+    # Pool threads that are already connected would skip the delay
+    parallel.shutdown()
+    for conn in connections.all(initialized_only=True):
+        conn.execute_wrappers.insert(0, delay)
+    connection_created.connect(add_delay)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(add_delay)
+        parallel.shutdown()
+        for conn in connections.all(initialized_only=True):
+            if delay in conn.execute_wrappers:
+                conn.execute_wrappers.remove(delay)
+
+
+def _request_args(name, i):
+    url_name, periods = CONCURRENT_SCENARIOS[name]
+    return reverse(url_name), {'period': PERIODS[i % len(PERIODS)]} if periods else {}
+
+
+def run_concurrent(users, name, requests, concurrency, asgi):
+    """
+    Send ``requests`` GETs to a read scenario with ``concurrency`` in flight.
+
+    WSGI uses one thread (and database connection) per in-flight request,
+    like a threaded WSGI server. ASGI runs every request on one event loop;
+    as in Django's ASGIHandler, each in-flight request gets its own
+    thread-sensitive context, so its ORM calls share one thread. Returns the
+    summarize() dict without query counts.
+    """
+    # Log every user in up front; the lanes only reuse the session cookies
+    cookies = []
+    for user in users:
+        client = Client()
+        client.force_login(user)
+        cookies.append(client.cookies)
+
+    def args_for(i):
+        return cookies[i % len(cookies)], *_request_args(name, i)
+
+    def wsgi_lane(lane):
+        latencies, statuses = [], []
+        client = Client()
+        try:
+            for i in range(lane, requests, concurrency):
+                client.cookies, path, params = args_for(i)
+                started = time.perf_counter()
+                response = client.get(path, params)
+                latencies.append(time.perf_counter() - started)
+                statuses.append(response.status_code)
+        finally:
+            connections.close_all()
+        return latencies, statuses
+
+    async def asgi_lane(lane):
+        latencies, statuses = [], []
+        client = AsyncClient()
+        async with ThreadSensitiveContext():
+            try:
+                for i in range(lane, requests, concurrency):
+                    client.cookies, path, params = args_for(i)
+                    started = time.perf_counter()
+                    response = await client.get(path, params)
+                    latencies.append(time.perf_counter() - started)
+                    statuses.append(response.status_code)
+            finally:
+                await sync_to_async(connections.close_all)()
+        return latencies, statuses
+
+    async def asgi_lanes():
+        return await asyncio.gather(*(asgi_lane(lane) for lane in range(concurrency)))
+
+    with deployment(asgi):
+        started = time.perf_counter()
+        if asgi:
+            lanes = asyncio.run(asgi_lanes())
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                lanes = list(pool.map(wsgi_lane, range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies = [latency for lane in lanes for latency in lane[0]]
+    statuses = [status for lane in lanes for status in lane[1]]
+    return summarize(latencies, [], statuses, elapsed)
+
+
+def _body(response):
+    if response.streaming:
+        try:
+            return b''.join(response.streaming_content)
+        finally:
+            response.close()
+    return response.content
+
+
+def run_transfer(users, iterations, warmup=3):
+    """
+    Bytes sent and latency per scenario in TRANSFER_SCENARIOS and encoding.
+
+    The static files are collected into a temporary STATIC_ROOT first, so
+    the stylesheet is served by StaticFilesMiddleware from its precompressed
+    copies. Pages are compressed per request by GZipMiddleware, which pads
+    its output with a few random bytes, so ``bytes`` is a mean. Without the
+    brotli package a br request would only get gzip back, so there are no br
+    rows (transfer_encodings()). ``content_encoding`` is what the server
+    actually sent: pages are gzipped even when br was asked for. Returns
+    {scenario: {encoding: summarize() dict plus 'bytes' and 'content_encoding'}}.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        stylesheet = settings.STATIC_URL + staticfiles_storage.stored_name('css/utilities.css')
+        # A new client builds its middleware, and so its static index, on first use
+        client = Client()
+        client.force_login(users[0])
+        for name, make_request in TRANSFER_SCENARIOS.items():
+            results[name] = {}
+            for label, accept_encoding in transfer_encodings().items():
+                headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+                for _ in range(warmup):
+                    _body(make_request(client, headers, stylesheet))
+                latencies, statuses, sizes = [], [], []
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    request_started = time.perf_counter()
+                    response = make_request(client, headers, stylesheet)
+                    sizes.append(len(_body(response)))
+                    latencies.append(time.perf_counter() - request_started)
+                    statuses.append(response.status_code)
+                elapsed = time.perf_counter() - started
+                result = summarize(latencies, [], statuses, elapsed)
+                result['bytes'] = round(sum(sizes) / len(sizes)) if sizes else 0
+                result['content_encoding'] = response.get('Content-Encoding', 'identity') if sizes else None
+                results[name][label] = result
+    return results
+
+
+def page_resources(html):
+    """
+    [(kind, url, render_blocking)] for the subresources a page loads.
+
+    kind is css, js, img or frame. Images count their ``src``, the smallest
+    candidate. Scripts block rendering unless they are deferred, async or
+    modules; stylesheets block unless they are for print only.
+    """
+    found = []
+    for tag, attributes in _TAG.findall(html):
+        attrs = {
+            name.lower(): unescape(double or single or bare)
+            for name, double, single, bare in _ATTRIBUTE.findall(attributes)
+        }
+        tag = tag.lower()
+        if tag == 'script' and attrs.get('src'):
+            blocking = not ({'defer', 'async'} & attrs.keys() or attrs.get('type') == 'module')
+            found.append(('js', attrs['src'], blocking))
+        elif tag == 'link' and attrs.get('rel', '').lower() == 'stylesheet':
+            found.append(('css', attrs['href'], attrs.get('media', 'all') != 'print'))
+        elif tag == 'img' and attrs.get('src'):
+            found.append(('img', attrs['src'], False))
+        elif tag == 'iframe' and attrs.get('src'):
+            found.append(('frame', attrs['src'], False))
+    return found
+
+
+def page_weight(users):
+    """
+    Bytes each template in PAGE_WEIGHT_PAGES makes a browser download.
+
+    The page is fetched gzipped, like a browser would, and so is every
+    same-origin static file it links (from a temporary collectstatic, as in
+    run_transfer()). Files from other hosts can't be measured offline; they
+    are counted in ``external``. Returns {template: {'html', 'css', 'js',
+    'img' (compressed bytes), 'total', 'requests', 'external', 'blocking'}}.
+    """
+    headers = {'Accept-Encoding': 'br, gzip'}
+    results = {}
+    with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        anonymous, logged_in = Client(), Client()
+        logged_in.force_login(users[0])
+        for template, (url_name, login) in PAGE_WEIGHT_PAGES.items():
+            response = (logged_in if login else anonymous).get(reverse(url_name), headers=headers)
+            body = _body(response)
+            html = gzip.decompress(body) if response.get('Content-Encoding') == 'gzip' else body
+            weight = {'status': response.status_code, 'html': len(body), 'css': 0, 'js': 0, 'img': 0,
+                      'requests': 1, 'external': 0, 'blocking': 0}
+            for kind, url, blocking in page_resources(html.decode()):
+                weight['blocking'] += blocking
+                if not url.startswith(settings.STATIC_URL):
+                    weight['external'] += 1
+                    continue
+                weight['requests'] += 1
+                weight[kind] += len(_body(anonymous.get(url, headers=headers)))
+            weight['total'] = weight['html'] + weight['css'] + weight['js'] + weight['img']
+            results[template] = weight
+    return results
+
+
+def summarize(latencies, query_counts, statuses, elapsed):
+    ordered = sorted(latencies)
+    codes = {}
+    for status in statuses:
+        codes[str(status)] = codes.get(str(status), 0) + 1
+    return {
+        'requests': len(latencies),
+        'errors': sum(1 for status in statuses if status >= 400),
+        'status_codes': codes,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'queries_avg': round(sum(query_counts) / len(query_counts), 2) if query_counts else 0.0,
+        'queries_max': max(query_counts, default=0),
+    }
+
+
+class BenchmarkRun:
+    """Runs scenarios against a set of users, reusing one logged-in client per user."""
+
+    def __init__(self, users):
+        self.users = users
+        self._clients = {}
+        # One joined challenge per user that has any; not every user joins one
+        user_ids = [user.id for user in users]
+        self._user_challenges = dict(
+            UserChallenge.objects.filter(user_id__in=user_ids).order_by('user_id', '-id')
+            .values_list('user_id', 'id')
+        )
+        by_id = {user.id: user for user in users}
+        self._challenge_users = [by_id[user_id] for user_id in sorted(self._user_challenges) if user_id in by_id]
+
+    def user_for(self, i):
+        return self.users[i % len(self.users)]
+
+    def client_for(self, i):
+        """Logged-in client for the i-th user (or for a User instance)."""
+        user = i if isinstance(i, User) else self.user_for(i)
+        if user.id not in self._clients:
+            client = Client()
+            client.force_login(user)
+            self._clients[user.id] = client
+        return self._clients[user.id]
+
+    def challenge_user_for(self, i):
+        return self._challenge_users[i % len(self._challenge_users)]
+
+    def user_challenge_for(self, i):
+        return self._user_challenges[self.challenge_user_for(i).id]
+
+    def supports(self, scenario):
+        # update_progress needs at least one user who joined a challenge
+        if scenario.name == 'update_progress':
+            return bool(self._challenge_users)
+        return True
+
+    def run(self, scenario, iterations, warmup=5):
+        if scenario.name == 'track':
+            iterations = min(iterations, TRACK_LIMIT_PER_USER * len(self.users))
+            warmup = 0  # warmup saves would eat into the daily limit
+
+        for i in range(warmup):
+            scenario.make_request(self, i)
+
+        # Query counts come from the request instrumentation, which also
+        # sees the queries the parallel-read pool runs on other connections
+        instrumentation.window.clear()
+        latencies, statuses = [], []
+        started = time.perf_counter()
+        for i in range(iterations):
+            # Log in outside the timed section
+            self.client_for(self.challenge_user_for(i) if scenario.name == 'update_progress' else i)
+            request_started = time.perf_counter()
+            response = scenario.make_request(self, i)
+            latencies.append(time.perf_counter() - request_started)
+            statuses.append(response.status_code)
+        elapsed = time.perf_counter() - started
+        return summarize(latencies, instrumentation.window.query_counts(), statuses, elapsed)
+
+
+def compare(current, baseline, tolerance):
+    """
+    Compare two result sets; returns a list of (scenario, metric, old, new, regressed).
+
+    p95 latency regresses when it grows by more than ``tolerance`` (a
+    fraction); query counts regress when they grow by more than half a
+    query per request.
+    """
+    rows = []
+    for name, result in current['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if not old:
+            continue
+        p95_regressed = result['p95_ms'] > old['p95_ms'] * (1 + tolerance)
+        rows.append((name, 'p95_ms', old['p95_ms'], result['p95_ms'], p95_regressed))
+        queries_regressed = result['queries_avg'] > old['queries_avg'] + 0.5
+        rows.append((name, 'queries_avg', old['queries_avg'], result['queries_avg'], queries_regressed))
+    return rows
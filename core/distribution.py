@@ -0,0 +1,183 @@
+"""
+How the leaderboard's per-user totals are spread: count, sum, mean, median,
+p10/p90, a histogram, and where one user's total falls.
+
+Everything is computed in the database over the leaderboard's per-user query
+(views.leaderboard_queries), used as a subquery, so no per-user rows reach
+Python. PostgreSQL gets the percentiles from ``percentile_cont`` and the
+histogram from ``width_bucket``. SQLite has neither. There, one query
+numbers the totals in order (``ROW_NUMBER()``) and reads the rows on either
+side of each percentile's position, which are interpolated the same way
+percentile_cont does. Histogram buckets come from a CAST.
+
+cached_summary() keeps each period's figures for LEADERBOARD_STATS_SECONDS.
+A user's own percentile is not cached: it is two small queries, the user's
+total and the counts below and equal to it. Those go through the ORM, so
+async views get them from the async ORM (auser_standing()). The summary
+needs raw SQL, which has no async API; acached_summary() runs it on the
+request's database thread.
+"""
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, Q
+from django.utils import timezone
+
+PERCENTILES = {'p10': 0.1, 'median': 0.5, 'p90': 0.9}
+
+
+def _subquery(per_user):
+    """(sql, params) selecting ``total`` from each per-user row."""
+    sql, params = per_user.query.get_compiler(per_user.db).as_sql()
+    return f'SELECT per_user.total FROM ({sql}) AS per_user', params
+
+
+def _fetch(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _interpolated(connection, totals_sql, params, count, fractions):
+    """percentile_cont of the totals for each of fractions, from the rows at their positions (one query)."""
+    positions = [fraction * (count - 1) for fraction in fractions]
+    wanted = sorted({i for position in positions for i in (math.floor(position), math.ceil(position))})
+    rows = dict(_fetch(
+        connection,
+        f'SELECT position, total FROM (SELECT ROW_NUMBER() OVER (ORDER BY total) - 1 AS position, total '
+        f'FROM ({totals_sql}) AS t) AS ranked WHERE position IN ({", ".join(["%s"] * len(wanted))})',
+        [*params, *wanted],
+    ))
+    values = []
+    for position in positions:
+        low, high = rows[math.floor(position)], rows[math.ceil(position)]
+        values.append(low + (high - low) * (position - math.floor(position)))
+    return values
+
+
+def _histogram(connection, totals_sql, params, low, high, buckets):
+    """[{start, end, count}] for ``buckets`` equal-width buckets between low and high."""
+    if high <= low:
+        counts = {0: _fetch(connection, f'SELECT COUNT(*) FROM ({totals_sql}) AS t', params)[0][0]}
+        width = 0
+    else:
+        width = (high - low) / buckets
+        if connection.vendor == 'postgresql':
+            # width_bucket numbers buckets from 1 and puts the maximum in buckets + 1; LEAST keeps it in the last
+            bucket = 'LEAST(width_bucket(total, %s, %s, %s), %s) - 1'
+            bucket_params = [low, high, buckets, buckets]
+        else:
+            # Totals are >= low, so the CAST rounds down; MIN keeps the maximum in the last bucket
+            bucket = 'MIN(CAST((total - %s) / %s AS INTEGER), %s)'
+            bucket_params = [low, width, buckets - 1]
+        rows = _fetch(
+            connection,
+            f'SELECT {bucket} AS bucket, COUNT(*) FROM ({totals_sql}) AS t GROUP BY bucket',
+            [*bucket_params, *params],
+        )
+        counts = dict(rows)
+    return [
+        {
+            'start': round(low + i * width, 2),
+            'end': round(low + (i + 1) * width, 2) if width else round(high, 2),
+            'count': counts.get(i, 0),
+        }
+        for i in range(buckets if width else 1)
+    ]
+
+
+def summary(per_user, buckets=None):
+    """
+    The distribution of the ``total`` column of per_user, as a JSON-ready dict.
+
+    Keys: count, sum, mean, min, max, p10, median, p90 (kg CO₂, rounded to
+    0.01; None without users) and histogram.
+    """
+    buckets = buckets or getattr(settings, 'LEADERBOARD_HISTOGRAM_BUCKETS', 10)
+    connection = connections[per_user.db]
+    totals_sql, params = _subquery(per_user)
+
+    columns = 'COUNT(*), COALESCE(SUM(total), 0), AVG(total), MIN(total), MAX(total)'
+    if connection.vendor == 'postgresql':
+        columns += ''.join(
+            f', percentile_cont({fraction}) WITHIN GROUP (ORDER BY total)' for fraction in PERCENTILES.values()
+        )
+    row = _fetch(connection, f'SELECT {columns} FROM ({totals_sql}) AS t', params)[0]
+    count, total, mean, low, high = row[:5]
+
+    result = {'count': count, 'sum': round(total, 2)}
+    if not count:
+        return {**result, **dict.fromkeys(['mean', 'min', 'max', *PERCENTILES]), 'histogram': []}
+
+    if connection.vendor == 'postgresql':
+        percentiles = dict(zip(PERCENTILES, row[5:]))
+    else:
+        percentiles = dict(zip(PERCENTILES, _interpolated(connection, totals_sql, params, count, PERCENTILES.values())))
+    result.update({'mean': mean, 'min': low, 'max': high, **percentiles})
+    result = {key: round(value, 2) if isinstance(value, float) else value for key, value in result.items()}
+    result['histogram'] = _histogram(connection, totals_sql, params, low, high, buckets)
+    return result
+
+
+def _summary_key(time_period):
+    return f'leaderboard_stats:{time_period}:{timezone.localdate().isoformat()}'
+
+
+def cached_summary(time_period, per_user):
+    """summary() of one leaderboard period, cached; daily figures are keyed by the date."""
+    key = _summary_key(time_period)
+    data = cache.get(key)
+    if data is None:
+        data = summary(per_user)
+        cache.set(key, data, getattr(settings, 'LEADERBOARD_STATS_SECONDS', 5 * 60))
+    return data
+
+
+async def acached_summary(time_period, per_user):
+    """Async version of cached_summary()."""
+    key = _summary_key(time_period)
+    data = await cache.aget(key)
+    if data is None:
+        data = await sync_to_async(summary)(per_user)
+        await cache.aset(key, data, getattr(settings, 'LEADERBOARD_STATS_SECONDS', 5 * 60))
+    return data
+
+
+def _counts(mine):
+    """Aggregates over the per-user rows: how many there are, and how many are below and equal to mine."""
+    return {
+        'count': Count('user_id'),
+        'below': Count('user_id', filter=Q(total__lt=mine)),
+        'equal': Count('user_id', filter=Q(total=mine)),
+    }
+
+
+def _standing(mine, counts):
+    return {
+        'total': round(mine, 2),
+        'percentile': round(100 * (counts['below'] + counts['equal'] / 2) / counts['count'], 1),
+    }
+
+
+def user_standing(per_user, user_id):
+    """
+    {total, percentile} for one user, or None without entries in the period.
+
+    percentile is the share of users with a lower total, counting ties as
+    half (a percentile rank): lower is better, like the totals.
+    """
+    mine = list(per_user.filter(user_id=user_id).values_list('total', flat=True)[:1])
+    if not mine:
+        return None
+    return _standing(mine[0], per_user.aggregate(**_counts(mine[0])))
+
+
+async def auser_standing(per_user, user_id):
+    """Async version of user_standing()."""
+    mine = [total async for total in per_user.filter(user_id=user_id).values_list('total', flat=True)[:1]]
+    if not mine:
+        return None
+    return _standing(mine[0], await per_user.aaggregate(**_counts(mine[0])))
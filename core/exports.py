@@ -0,0 +1,88 @@
+"""
+Streaming export of CarbonFootprint history as CSV or JSONL.
+
+Rows are pulled with QuerySet.iterator() and serialised one at a time, so
+memory use stays flat no matter how many footprints are exported. The same
+generators back the export endpoint, the export_footprints command and the
+archive files written by archive_footprints.
+"""
+import csv
+import json
+import zlib
+
+from django.db.models import F
+
+from .models import CarbonFootprint
+
+CATEGORIES = ('transportation', 'food', 'electricity', 'waste')
+
+EXPORT_FIELDS = [
+    'id', 'user_id', 'username', 'created_at', 'car_travel_km', 'fuel_type', 'flights_hours',
+    'public_transport_km', 'meals_per_day', 'meal_type', 'electricity_kwh',
+    'waste_kg', 'waste_type', 'total_emission', *CATEGORIES,
+]
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+CHUNK_SIZE = 2000
+# Gzip output is flushed in blocks of roughly this many bytes
+GZIP_BLOCK_SIZE = 64 * 1024
+
+
+def export_rows(queryset):
+    """Yield one dict per footprint, including the per-category breakdown."""
+    expressions = CarbonFootprint.emission_expressions()
+    rows = (
+        queryset.annotate(username=F('user__username'), **{name: expressions[name] for name in CATEGORIES})
+        .values(*EXPORT_FIELDS)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    for row in rows:
+        row['created_at'] = row['created_at'].isoformat()
+        for name in CATEGORIES:
+            row[name] = round(float(row[name] or 0), 2)
+        yield row
+
+
+class _Echo:
+    """File-like object whose write() just returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(queryset):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS).encode('utf-8')
+    for row in export_rows(queryset):
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS]).encode('utf-8')
+
+
+def jsonl_lines(queryset):
+    for row in export_rows(queryset):
+        yield (json.dumps(row) + '\n').encode('utf-8')
+
+
+def export_lines(queryset, fmt):
+    if fmt == 'csv':
+        return csv_lines(queryset)
+    return jsonl_lines(queryset)
+
+
+def gzip_chunks(chunks):
+    """Gzip-compress a stream of byte chunks on the fly."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)  # gzip container
+    pending = []
+    pending_size = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= GZIP_BLOCK_SIZE:
+            data = compressor.compress(b''.join(pending))
+            pending, pending_size = [], 0
+            if data:
+                yield data
+    yield compressor.compress(b''.join(pending)) + compressor.flush()
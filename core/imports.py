@@ -0,0 +1,245 @@
+"""
+Bulk import of historical CarbonFootprint rows from CSV or JSONL.
+
+The input is streamed and processed in batches. Each row is validated with
+CarbonFootprintForm's rules. Emissions are computed column-wise for the
+whole batch, and the rows go in with bulk_create, one transaction per batch.
+The column names match the export format (core/exports.py), so an export can
+be re-imported as-is.
+
+Rows dated today count towards the daily calculation cap like tracked ones,
+when the caller passes it (DAILY_CALCULATIONS, for imports by users). Rows
+over the cap are reported as invalid; earlier days aren't capped.
+"""
+import csv
+import gzip
+import io
+import json
+import time
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from carbon import metrics
+from . import stats, timeseries
+from .forms import CarbonFootprintForm
+from .models import CarbonFootprint
+
+FORMATS = ('csv', 'jsonl')
+BATCH_SIZE = 1000
+# Only the first errors are kept in the report
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportReport:
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.created = 0
+        self.invalid = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def add_error(self, line, errors):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'dry_run': self.dry_run,
+            'rows': self.rows,
+            'created': self.created,
+            'invalid': self.invalid,
+            'errors': self.errors,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+        }
+
+
+def detect_format(filename):
+    name = filename.lower().removesuffix('.gz')
+    return 'jsonl' if name.endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(fileobj, fmt, compressed=False):
+    """Yield (line number, row dict) from a binary file object without loading it whole."""
+    if compressed:
+        fileobj = gzip.GzipFile(fileobj=fileobj)
+    text = io.TextIOWrapper(fileobj, encoding='utf-8', newline='')
+
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(text, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as exc:
+            row = {'__error__': f'Invalid JSON: {exc.msg}'}
+        yield line_number, row
+
+
+def batch_emissions(rows):
+    """
+    Total emission for each cleaned row, computed a column at a time.
+
+    Gives exactly what CarbonFootprint.calculate_emission() would for each row.
+    """
+    model = CarbonFootprint
+    car = [r['car_travel_km'] * model.FUEL_EMISSION_FACTORS.get(r['fuel_type'], 0) for r in rows]
+    flight = [r['flights_hours'] * 900 * model.FLIGHT_EMISSION_FACTOR for r in rows]
+    public = [r['public_transport_km'] * model.PUBLIC_TRANSPORT_FACTOR for r in rows]
+    food = [r['meals_per_day'] * model.FOOD_EMISSION_FACTORS.get(r['meal_type'], 0) * 30 for r in rows]
+    electricity = [r['electricity_kwh'] * model.ELECTRICITY_FACTOR for r in rows]
+    waste = [r['waste_kg'] * model.WASTE_EMISSION_FACTORS.get(r['waste_type'], 0) for r in rows]
+    return [round(c + f + p + fo + e + w, 2) for c, f, p, fo, e, w in zip(car, flight, public, food, electricity, waste)]
+
+
+def _resolve_users(batch, allow_other_users):
+    """Map the batch's usernames to user ids with a single query."""
+    if not allow_other_users:
+        return {}
+    usernames = {row.get('username') for _, row in batch if row.get('username')}
+    return dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+
+
+def _is_today(created_at, today):
+    return timezone.localdate(created_at) == today
+
+
+def validate_batch(batch, report, default_user=None, allow_other_users=False, daily_limit=None):
+    """Validate a batch of rows; returns (cleaned data, user id, created_at) tuples."""
+    user_ids = _resolve_users(batch, allow_other_users)
+    now = timezone.now()
+    today = timezone.localdate(now)
+    valid = []
+
+    for line, row in batch:
+        if '__error__' in row:
+            report.add_error(line, {'__all__': [row['__error__']]})
+            continue
+
+        form = CarbonFootprintForm(data=row)
+        if not form.is_valid():
+            report.add_error(line, {field: list(errors) for field, errors in form.errors.items()})
+            continue
+
+        username = row.get('username') if allow_other_users else None
+        if username:
+            user_id = user_ids.get(username)
+            if user_id is None:
+                report.add_error(line, {'username': [f"Unknown user '{username}'."]})
+                continue
+        elif default_user is not None:
+            user_id = default_user.pk
+        else:
+            report.add_error(line, {'username': ['This field is required.']})
+            continue
+
+        created_at = now
+        if row.get('created_at'):
+            created_at = parse_datetime(str(row['created_at']))
+            if created_at is None:
+                report.add_error(line, {'created_at': ['Enter a valid date/time.']})
+                continue
+            if timezone.is_naive(created_at):
+                created_at = timezone.make_aware(created_at)
+            if created_at > now:
+                report.add_error(line, {'created_at': ['Date/time is in the future.']})
+                continue
+
+        valid.append((line, (form.cleaned_data, user_id, created_at)))
+
+    if daily_limit is not None:
+        valid = _within_daily_limit(valid, report, daily_limit, today)
+    return [row for _, row in valid]
+
+
+def _within_daily_limit(valid, report, daily_limit, today):
+    """valid without the rows dated today that don't fit under each user's daily limit."""
+    today_lines = defaultdict(list)
+    for line, (_, user_id, created_at) in valid:
+        if _is_today(created_at, today):
+            today_lines[user_id].append(line)
+    refused = set()
+    for user_id, lines in today_lines.items():
+        # One check per user and batch; the first rows fit, the rest are refused
+        allowed = daily_limit.hit_many(user_id, len(lines))
+        refused.update(lines[allowed:])
+    if not refused:
+        return valid
+    metrics.DAILY_LIMIT_REJECTIONS.inc(len(refused))
+    message = f'Daily calculation limit reached ({daily_limit.rate.limit} per day); only earlier days can be imported.'
+    for line in sorted(refused):
+        report.add_error(line, {'created_at': [message]})
+    return [(line, row) for line, row in valid if line not in refused]
+
+
+def _refund(valid, daily_limit):
+    """Take back the daily-cap hits of rows that weren't saved."""
+    if daily_limit is None:
+        return
+    today = timezone.localdate()
+    counts = Counter(user_id for _, user_id, created_at in valid if _is_today(created_at, today))
+    for user_id, count in counts.items():
+        daily_limit.refund(user_id, amount=count)
+
+
+def import_footprints(rows, default_user=None, allow_other_users=False, batch_size=BATCH_SIZE, dry_run=False,
+                      daily_limit=None):
+    """
+    Import (line, row) pairs from read_rows().
+
+    Rows are owned by their ``username`` column when allow_other_users is set,
+    otherwise by default_user. With dry_run nothing is written. daily_limit
+    (a ratelimit.Limit) caps the rows dated today per user.
+    """
+    report = ImportReport(dry_run=dry_run)
+    started = time.monotonic()
+    rows = iter(rows)
+
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        report.rows += len(batch)
+
+        valid = validate_batch(batch, report, default_user, allow_other_users, daily_limit)
+        if not valid:
+            continue
+
+        emissions = batch_emissions([cleaned for cleaned, _, _ in valid])
+        footprints = [
+            CarbonFootprint(user_id=user_id, created_at=created_at, total_emission=total, **cleaned)
+            for (cleaned, user_id, created_at), total in zip(valid, emissions)
+        ]
+        if dry_run:
+            _refund(valid, daily_limit)
+        else:
+            try:
+                with transaction.atomic():
+                    CarbonFootprint.objects.bulk_create(footprints, batch_size=batch_size)
+                    stats.record_footprints(footprints)
+                    timeseries.invalidate(footprint.user_id for footprint in footprints)
+            except Exception:
+                _refund(valid, daily_limit)
+                raise
+            metrics.FOOTPRINT_SAVES.inc(len(footprints), source='import')
+        report.created += len(footprints)
+
+    report.elapsed = time.monotonic() - started
+    return report
@@ -0,0 +1,91 @@
+"""
+What the write paths tell the live event stream (carbon/events.py, served by
+core.views.event_stream).
+
+* footprints_recorded() from stats.record_footprints(). It sends one
+  ``rank`` event per user on the ``leaderboard`` channel, with the user's
+  all-time total and rank before and after, counted in one query over
+  UserStats. A write touching more than MAX_RANK_EVENTS users (a big import)
+  sends a single ``reset`` instead, and open leaderboards offer a reload.
+* progress_updated() from the challenges' update_progress. It sends a
+  ``progress`` event on the user's own channel with the challenge's new
+  percentage and carbon saved.
+
+Nothing is computed while no stream is listening. With listeners, the rank
+counts wait for the write's commit (transaction.on_commit), so they never
+run inside the transaction or hold up its locks.
+"""
+from django.db import transaction
+from django.db.models import Count, Q
+
+from carbon import events
+from .models import UserStats
+
+LEADERBOARD = 'leaderboard'
+MAX_RANK_EVENTS = 20
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def footprints_recorded(previous):
+    """previous is {user id: all-time total before the write, or None for a new row}."""
+    if not previous or not events.has_listeners():
+        return
+    if len(previous) > MAX_RANK_EVENTS:
+        events.publish(LEADERBOARD, {'type': 'reset'})
+        return
+    previous = dict(previous)
+    transaction.on_commit(lambda: _publish_ranks(previous))
+
+
+def _ahead_of(total, username):
+    return Q(total_emission__lt=total) | Q(total_emission=total, user__username__lt=username)
+
+
+def _publish_ranks(previous):
+    """After the commit: the users' new totals and ranks, counted in one query."""
+    current = list(UserStats.objects.filter(user_id__in=previous).values(
+        'user_id', 'user__username', 'total_emission', 'entries_count',
+    ))
+    # Rank = 1 + users ahead: a lower total, or the same total and an earlier
+    # username, the order of the all-time leaderboard (views.leaderboard_context)
+    ranked = UserStats.objects.filter(entries_count__gt=0)
+    counts = {}
+    for row in current:
+        user_id, username = row['user_id'], row['user__username']
+        counts[f'rank_{user_id}'] = Count('pk', filter=_ahead_of(row['total_emission'], username))
+        if previous[user_id] is not None:
+            counts[f'previous_{user_id}'] = Count('pk', filter=_ahead_of(previous[user_id], username))
+    counts = ranked.aggregate(**counts) if counts else {}
+
+    for row in current:
+        user_id = row['user_id']
+        previous_rank = counts.get(f'previous_{user_id}')
+        events.publish(LEADERBOARD, {
+            'type': 'rank',
+            'user_id': user_id,
+            'username': row['user__username'],
+            'total': round(row['total_emission'], 2),
+            'entries': row['entries_count'],
+            'rank': counts[f'rank_{user_id}'] + 1,
+            'previous_rank': previous_rank + 1 if previous_rank is not None else None,
+        })
+
+
+def progress_updated(user_challenge, progress):
+    """After update_progress has saved progress and user_challenge's percentage and sums."""
+    if not events.has_listeners():
+        return
+    # The running sum was moved with an F() update
+    user_challenge.refresh_from_db(fields=['carbon_saved'])
+    events.publish(user_channel(user_challenge.user_id), {
+        'type': 'progress',
+        'challenge': user_challenge.pk,
+        'date': progress.date.isoformat(),
+        'completed': progress.completed,
+        'progress_percentage': user_challenge.progress_percentage,
+        'status': user_challenge.status,
+        'carbon_saved': str(user_challenge.carbon_saved),
+    })
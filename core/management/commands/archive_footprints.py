@@ -0,0 +1,47 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import archive
+from core.models import CarbonFootprint
+
+# Anything shorter could cut into the periods the daily/weekly/monthly views show
+MIN_RETENTION_DAYS = 45
+
+
+class Command(BaseCommand):
+    help = 'Export old footprints to compressed files and compact them into monthly summaries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=365,
+                            help='Keep footprints newer than this many days live (default: 365)')
+        parser.add_argument('--export-dir', default='archive',
+                            help='Directory for the exported .jsonl.gz files (default: ./archive)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be archived')
+
+    def handle(self, *args, **options):
+        if options['retention_days'] < MIN_RETENTION_DAYS:
+            raise CommandError(f'--retention-days must be at least {MIN_RETENTION_DAYS}.')
+
+        cutoff = archive.archive_cutoff(options['retention_days'])
+        months = archive.months_to_archive(cutoff)
+        self.stdout.write(f"Archiving footprints created before {cutoff:%Y-%m-%d} ({len(months)} months)")
+
+        if options['dry_run']:
+            for month in months:
+                count = CarbonFootprint.objects.filter(
+                    created_at__year=month.year, created_at__month=month.month, created_at__lt=cutoff
+                ).count()
+                self.stdout.write(f"  {month:%Y-%m}: {count} footprints")
+            return
+
+        os.makedirs(options['export_dir'], exist_ok=True)
+        total = 0
+        for month in months:
+            count, path = archive.compact_month(month, cutoff, options['export_dir'])
+            total += count
+            if count:
+                self.stdout.write(self.style.SUCCESS(f"  {month:%Y-%m}: archived {count} footprints to {path}"))
+
+        self.stdout.write(self.style.SUCCESS(f'\nArchived {total} footprints.'))
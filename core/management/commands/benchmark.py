@@ -0,0 +1,234 @@
+import json
+import logging
+import platform
+import subprocess
+from contextlib import contextmanager
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from carbon import parallel
+from core import benchmark, synthetic
+
+
+@contextmanager
+def _quiet(logger_name):
+    logger = logging.getLogger(logger_name)
+    disabled, logger.disabled = logger.disabled, True
+    try:
+        yield
+    finally:
+        logger.disabled = disabled
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the core and challenges endpoints against a throwaway database filled with synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Synthetic users (N)')
+        parser.add_argument('--footprints', type=int, default=20, help='Mean footprints per user (M)')
+        parser.add_argument('--challenges', type=int, default=8, help='Minimum challenge types (K)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=200, help='Timed requests per endpoint')
+        parser.add_argument('--only', nargs='+', metavar='SCENARIO',
+                            choices=[s.name for s in benchmark.SCENARIOS],
+                            help='Run only these scenarios')
+        parser.add_argument('--output', default='benchmark_results.json', help='Where to write the JSON results')
+        parser.add_argument('--compare', metavar='BASELINE', help='Earlier results file to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed p95 slowdown before flagging a regression (default: 0.2 = 20%%)')
+        parser.add_argument('--fail-on-regression', action='store_true')
+        parser.add_argument('--concurrency', type=int, default=0, metavar='N',
+                            help='Also compare WSGI and ASGI on the read paths with N requests in flight')
+        parser.add_argument('--transfer', action='store_true',
+                            help='Also measure response bytes and latency per Accept-Encoding')
+        parser.add_argument('--page-weight', action='store_true',
+                            help='Also report the bytes and requests each page template costs a browser')
+        parser.add_argument('--db-latency-ms', type=float, default=0,
+                            help='Round trip added to every timed query, to approximate a remote database')
+
+    def handle(self, *args, **options):
+        # Never touch real data: run against a fresh test database of the configured engine
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # Keep every read on the (test) primary even if a replica is configured,
+            # keep per-request log lines out of the timings, and keep every
+            # timed request in the window the query counts come from. The
+            # request rate limits are off and the cache is private, so
+            # counters from an earlier run can't turn requests into 429s (the
+            # daily calculation cap still applies; see TRACK_LIMIT_PER_USER).
+            overrides = override_settings(
+                REPLICA_READ_VIEWS=[], QUERY_GUARD='off', INSTRUMENTATION_ENABLED=True,
+                INSTRUMENTATION_WINDOW=max(options['iterations'], 1000),
+                RATE_LIMIT_ENABLED=False,
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}},
+            )
+            with overrides, _quiet('carbon.requests'):
+                results = self.run_benchmarks(options)
+        finally:
+            parallel.shutdown()  # its threads hold connections to the test database
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        with open(options['output'], 'w') as fh:
+            json.dump(results, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"\nResults written to {options['output']}"))
+
+        if options['compare']:
+            self.compare(results, options)
+
+    def run_benchmarks(self, options):
+        self.stdout.write(
+            f"Generating {options['users']} users x {options['footprints']} footprints, "
+            f"{options['challenges']} challenges (seed {options['seed']})..."
+        )
+        # History ends at midnight so the track scenario starts with a fresh daily limit
+        report = synthetic.generate(
+            users=options['users'],
+            footprints=options['footprints'],
+            challenges=options['challenges'],
+            seed=options['seed'],
+            end=timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0),
+        )
+        users = list(User.objects.filter(id__in=report['user_ids']).order_by('id'))
+
+        with benchmark.simulated_latency(options['db_latency_ms'] / 1000):
+            return self.run_timed(users, options)
+
+    def run_timed(self, users, options):
+        run = benchmark.BenchmarkRun(users)
+        scenarios = [s for s in benchmark.SCENARIOS if not options['only'] or s.name in options['only']]
+        results = {}
+
+        self.stdout.write(f"\n{'endpoint':<18}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'queries':>9}{'errors':>8}")
+        for scenario in scenarios:
+            if not run.supports(scenario):
+                self.stdout.write(self.style.WARNING(f'{scenario.name:<18}skipped (no joined challenges)'))
+                continue
+            result = run.run(scenario, options['iterations'])
+            results[scenario.name] = result
+            self.stdout.write(
+                f"{scenario.name:<18}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                f"{result['throughput_rps']:>10.1f}{result['queries_avg']:>9.1f}{result['errors']:>8}"
+            )
+
+        concurrency = {}
+        if options['concurrency']:
+            concurrency = self.run_concurrency(users, options)
+
+        transfer = {}
+        if options['transfer']:
+            transfer = self.run_transfer(users, options)
+
+        weights = {}
+        if options['page_weight']:
+            weights = self.run_page_weight(users)
+
+        return {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'git_commit': self.git_commit(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'users': options['users'],
+                'footprints_per_user': options['footprints'],
+                'challenges': options['challenges'],
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+                'concurrency': options['concurrency'],
+                'transfer': options['transfer'],
+                'page_weight': options['page_weight'],
+                'db_latency_ms': options['db_latency_ms'],
+            },
+            'results': results,
+            'concurrency': concurrency,
+            'transfer': transfer,
+            'page_weight': weights,
+        }
+
+    def run_concurrency(self, users, options):
+        n = options['concurrency']
+        # One request in flight is a sync WSGI worker; N threads a threaded one
+        deployments = [('wsgi', 1, False), (f'wsgi x{n}', n, False), (f'asgi x{n}', n, True)]
+        names = [name for name in benchmark.CONCURRENT_SCENARIOS if not options['only'] or name in options['only']]
+
+        self.stdout.write(f"\nWSGI vs ASGI, {options['iterations']} requests per row")
+        self.stdout.write(f"{'endpoint':<18}{'deployment':<12}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>10}{'errors':>8}")
+        results = {}
+        for name in names:
+            results[name] = {}
+            for label, in_flight, asgi in deployments:
+                result = benchmark.run_concurrent(users, name, options['iterations'], in_flight, asgi)
+                results[name][label] = result
+                self.stdout.write(
+                    f"{name:<18}{label:<12}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+                    f"{result['throughput_rps']:>10.1f}{result['errors']:>8}"
+                )
+        return results
+
+    def run_transfer(self, users, options):
+        self.stdout.write(f"\nBytes sent per Accept-Encoding, {options['iterations']} requests per row")
+        if 'br' not in benchmark.transfer_encodings():
+            self.stdout.write(self.style.WARNING('brotli is not installed, so there are no br rows (pip install brotli)'))
+        self.stdout.write(
+            f"{'endpoint':<18}{'encoding':<10}{'served':<10}{'bytes':>10}{'saved':>8}"
+            f"{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}"
+        )
+        results = benchmark.run_transfer(users, options['iterations'])
+        for name, encodings in results.items():
+            identity = encodings['identity']['bytes']
+            for label, result in encodings.items():
+                saved = f"{1 - result['bytes'] / identity:.0%}" if identity else '-'
+                # What came back, which isn't always what was asked for (pages are gzipped for br)
+                served = result['content_encoding'] or '-'
+                self.stdout.write(
+                    f"{name:<18}{label:<10}{served:<10}{result['bytes']:>10}{saved:>8}"
+                    f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['errors']:>8}"
+                )
+        return results
+
+    def run_page_weight(self, users):
+        # Static files come as .br copies only when brotli is installed; pages are always gzipped
+        static_encoding = 'br' if 'br' in benchmark.transfer_encodings() else 'gzip, brotli not installed'
+        self.stdout.write(f'\nPage weight per template (KiB: pages gzipped, static files {static_encoding}; '
+                          f'requests include the page)')
+        self.stdout.write(
+            f"{'template':<32}{'html':>8}{'css':>8}{'js':>8}{'img':>8}{'total':>8}"
+            f"{'requests':>10}{'external':>10}{'blocking':>10}"
+        )
+        results = benchmark.page_weight(users)
+        for template, weight in results.items():
+            kib = [f"{weight[key] / 1024:>8.1f}" for key in ('html', 'css', 'js', 'img', 'total')]
+            line = f"{template:<32}{''.join(kib)}{weight['requests']:>10}{weight['external']:>10}{weight['blocking']:>10}"
+            self.stdout.write(self.style.ERROR(line) if weight['status'] >= 400 else line)
+        return results
+
+    def compare(self, results, options):
+        try:
+            with open(options['compare']) as fh:
+                baseline = json.load(fh)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Could not read baseline: {exc}")
+
+        rows = benchmark.compare(results, baseline, options['tolerance'])
+        regressions = [row for row in rows if row[4]]
+        self.stdout.write(f"\nCompared with {options['compare']}:")
+        for name, metric, old, new, regressed in rows:
+            line = f"  {name:<18}{metric:<13}{old:>10.2f} -> {new:>10.2f}"
+            self.stdout.write(self.style.ERROR(line + '  REGRESSION') if regressed else line)
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'{len(regressions)} regression(s) against {options["compare"]}')
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
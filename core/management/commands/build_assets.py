@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from carbon import css, images, js, vendor
+
+
+class Command(BaseCommand):
+    help = ('Build the static assets: utility CSS, minified script bundles, responsive image copies '
+            'and any vendor file not fetched yet')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Exit with an error if any asset is out of date instead of writing it')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            stale = images.stale() + js.stale()
+            if not css.OUTPUT.exists() or css.OUTPUT.read_text(encoding='utf-8') != css.build():
+                stale.append(str(css.OUTPUT))
+            if stale:
+                raise CommandError(f"Out of date: {', '.join(stale)}; run `python manage.py build_assets`.")
+            self.stdout.write('Static assets are up to date.')
+            missing = vendor.missing()
+            if missing:
+                # The pages still work from the CDN fallbacks, so this warns rather than fails
+                self.stderr.write(self.style.WARNING(
+                    f"Not fetched: {', '.join(missing)}; run `python manage.py build_assets` and commit them."
+                ))
+            return
+
+        changed = css.write()
+        status = 'Wrote' if changed else 'Unchanged:'
+        self.stdout.write(self.style.SUCCESS(f'{status} {css.OUTPUT} ({css.OUTPUT.stat().st_size / 1024:.1f} KiB)'))
+
+        for path, changed in js.write():
+            status = 'Wrote' if changed else 'Unchanged:'
+            self.stdout.write(self.style.SUCCESS(f'{status} {path} ({path.stat().st_size / 1024:.1f} KiB)'))
+
+        written = images.write()
+        total = sum(size for _, size in written)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {len(written)} image copies to {images.STATIC_DIR / images.OUTPUT_DIR} ({total / 1024:.1f} KiB)'
+        ))
+
+        missing = vendor.missing()
+        if missing:
+            try:
+                written = vendor.fetch(missing)
+            except OSError as exc:
+                raise CommandError(f'Could not download the vendor files: {exc}')
+            for path, size in written:
+                self.stdout.write(self.style.SUCCESS(f'Wrote {path} ({size / 1024:.1f} KiB)'))
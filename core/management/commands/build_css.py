@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from carbon import css
+
+
+class Command(BaseCommand):
+    help = 'Write static/css/utilities.css with the utility classes the templates use'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Exit with an error if the file is out of date instead of writing it')
+
+    def handle(self, *args, **options):
+        rules, unknown = css.utilities()
+        if unknown:
+            # Either a utility css.py doesn't cover yet, or a typo; see css.NOT_UTILITIES
+            raise CommandError('No rule for these class names: ' + ', '.join(sorted(unknown)))
+
+        if options['check']:
+            current = css.OUTPUT.read_text(encoding='utf-8') if css.OUTPUT.exists() else ''
+            if current != css.build():
+                raise CommandError(f'{css.OUTPUT} is out of date; run `python manage.py build_css`.')
+            self.stdout.write(f'{css.OUTPUT} is up to date.')
+            return
+
+        changed = css.write()
+        size = css.OUTPUT.stat().st_size
+        status = 'Wrote' if changed else 'Unchanged:'
+        self.stdout.write(self.style.SUCCESS(f'{status} {css.OUTPUT} ({len(rules)} utilities, {size / 1024:.1f} KiB)'))
@@ -1,57 +1,44 @@
-from django.core.management.base import BaseCommand
-from django.contrib.auth.models import User
-from core.models import CarbonFootprint
-import random
+from django.core.management.base import BaseCommand, CommandError
+
+from core import synthetic
 
 
 class Command(BaseCommand):
-    help = 'Create test data for leaderboard'
+    help = 'Fill the database with realistic synthetic users, footprints, challenges and progress'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help=f'Scale factor; 1.0 = {synthetic.USERS_PER_SCALE} users (default: 1.0)')
+        parser.add_argument('--users', type=int, help='Exact number of users (overrides --scale)')
+        parser.add_argument('--footprints', type=int, default=20, help='Mean footprints per user (default: 20)')
+        parser.add_argument('--challenges', type=int, default=8,
+                            help='Minimum number of active challenge types (default: 8)')
+        parser.add_argument('--days', type=int, default=365, help='How far back the history goes (default: 365)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Parallel worker processes (PostgreSQL only; SQLite always uses 1)')
 
     def handle(self, *args, **options):
-        # Check existing data
-        user_count = User.objects.count()
-        footprint_count = CarbonFootprint.objects.count()
-        
-        self.stdout.write(f"Current users: {user_count}")
-        self.stdout.write(f"Current footprints: {footprint_count}")
-        
-        # Create test users if they don't exist
-        test_users = ['alice', 'bob', 'charlie', 'diana', 'eve']
-        
-        for username in test_users:
-            user, created = User.objects.get_or_create(
-                username=username,
-                defaults={
-                    'email': f'{username}@example.com',
-                    'first_name': username.capitalize(),
-                }
-            )
-            if created:
-                user.set_password('testpass123')
-                user.save()
-                self.stdout.write(f"Created user: {username}")
-            
-            # Create random footprint entries for each user
-            for i in range(random.randint(1, 5)):
-                footprint = CarbonFootprint.objects.create(
-                    user=user,
-                    car_travel_km=random.uniform(10, 100),
-                    fuel_type=random.choice(['petrol', 'diesel', 'electric', 'hybrid']),
-                    flights_hours=random.uniform(0, 10),
-                    public_transport_km=random.uniform(5, 50),
-                    meals_per_day=random.randint(2, 4),
-                    meal_type=random.choice(['light', 'medium', 'heavy', 'meat_heavy']),
-                    electricity_kwh=random.uniform(200, 800),
-                    waste_kg=random.uniform(10, 50),
-                    waste_type=random.choice(['low', 'medium', 'high'])
-                )
-                self.stdout.write(f"Created footprint for {username}: {footprint.total_emission:.2f} kg CO₂")
-        
-        # Show leaderboard data
-        self.stdout.write("\n=== LEADERBOARD DATA ===")
-        users_with_data = User.objects.filter(footprints__isnull=False).distinct()
-        
-        for user in users_with_data:
-            total_emission = sum(fp.total_emission for fp in user.footprints.all())
-            entry_count = user.footprints.count()
-            self.stdout.write(f"{user.username}: {total_emission:.2f} kg CO₂ ({entry_count} entries)")
\ No newline at end of file
+        if options['scale'] <= 0 or options['days'] < 1 or options['workers'] < 1:
+            raise CommandError('--scale, --days and --workers must be positive')
+
+        self.stdout.write(
+            f"Generating data (scale {options['scale']}, seed {options['seed']}, {options['workers']} worker(s))..."
+        )
+        report = synthetic.generate(
+            scale=options['scale'],
+            users=options['users'],
+            footprints=options['footprints'],
+            challenges=options['challenges'],
+            days=options['days'],
+            seed=options['seed'],
+            workers=options['workers'],
+            log=self.stdout.write,
+        )
+
+        for name, count in report['counts'].items():
+            self.stdout.write(f"  {name}: {count}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['rows']} rows in {report['elapsed']:.1f}s ({report['rows_per_sec']:.0f} rows/sec). "
+            f"Users log in with password '{synthetic.PASSWORD}'."
+        ))
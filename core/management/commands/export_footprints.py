@@ -0,0 +1,41 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core import exports
+from core.models import CarbonFootprint
+
+
+class Command(BaseCommand):
+    help = "Stream a user's (or all users') footprint history as CSV or JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to export (default: all users)')
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Gzip-compress the output')
+        parser.add_argument('--output', '-o', help='Output file (default: stdout)')
+
+    def handle(self, *args, **options):
+        footprints = CarbonFootprint.objects.order_by('user_id', 'created_at')
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+            footprints = footprints.filter(user=user)
+
+        chunks = exports.export_lines(footprints, options['format'])
+        if options['gzip']:
+            chunks = exports.gzip_chunks(chunks)
+
+        if options['output']:
+            with open(options['output'], 'wb') as fh:
+                for chunk in chunks:
+                    fh.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f"Exported footprints to {options['output']}"))
+        else:
+            out = sys.stdout.buffer
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
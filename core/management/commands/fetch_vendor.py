@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from carbon import vendor
+
+
+class Command(BaseCommand):
+    help = ('Download the pinned third-party scripts and fonts into static/ (carbon/vendor.py); '
+            'a build step whose output is committed, not something to run on deploy')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Exit with an error if any file is missing instead of downloading it')
+
+    def handle(self, *args, **options):
+        missing = vendor.missing()
+        if options['check']:
+            if missing:
+                raise CommandError(f"Not fetched: {', '.join(missing)}; run `python manage.py fetch_vendor`.")
+            self.stdout.write('Vendor files are present.')
+            return
+
+        try:
+            written = vendor.fetch()
+        except OSError as exc:
+            raise CommandError(f'Could not download the vendor files: {exc}')
+        for path, size in written:
+            self.stdout.write(self.style.SUCCESS(f'Wrote {path} ({size / 1024:.1f} KiB)'))
@@ -0,0 +1,50 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core import imports
+
+
+class Command(BaseCommand):
+    help = 'Bulk import historical footprints from a CSV or JSONL file (optionally .gz)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file to import')
+        parser.add_argument('--format', choices=imports.FORMATS,
+                            help='Input format (default: guessed from the file name)')
+        parser.add_argument('--user', help="Owner for rows without a 'username' column")
+        parser.add_argument('--batch-size', type=int, default=imports.BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Validate only, write nothing')
+
+    def handle(self, *args, **options):
+        default_user = None
+        if options['user']:
+            try:
+                default_user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        path = options['path']
+        fmt = options['format'] or imports.detect_format(path)
+        try:
+            fh = open(path, 'rb')
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        with fh:
+            rows = imports.read_rows(fh, fmt, compressed=path.endswith('.gz'))
+            report = imports.import_footprints(
+                rows,
+                default_user=default_user,
+                allow_other_users=True,
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+            )
+
+        for error in report.errors:
+            self.stdout.write(self.style.WARNING(f"Line {error['line']}: {error['errors']}"))
+
+        verb = 'Would import' if report.dry_run else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{verb} {report.created} of {report.rows} rows ({report.invalid} invalid) "
+            f"in {report.elapsed:.2f}s - {report.rows_per_sec:.0f} rows/sec"
+        ))
@@ -0,0 +1,87 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core import archive, partitions
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming monthly CarbonFootprint partitions and archive and drop old ones (PostgreSQL only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3,
+                            help='Number of future months to have partitions for (default: 3)')
+        parser.add_argument('--retain-months', type=int, default=None,
+                            help='Archive and drop partitions older than this many months (default: keep everything)')
+        parser.add_argument('--archive-dir', default=None,
+                            help='Directory for the exports of archived partitions (needed with --retain-months)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be done')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Footprint partitioning is only available on PostgreSQL.')
+        if not partitions.is_partitioned(connection):
+            raise CommandError(f'{partitions.TABLE} is not partitioned; run "manage.py migrate core" first.')
+        if options['retain_months'] is not None and not options['archive_dir']:
+            raise CommandError('--retain-months needs --archive-dir.')
+        if options['retain_months'] is not None and options['retain_months'] < 2:
+            # As in archive_footprints, the monthly view's rows have to stay live
+            raise CommandError('--retain-months must be at least 2.')
+
+        dry_run = options['dry_run']
+        existing = partitions.list_partitions(connection)
+        this_month = partitions.month_start(timezone.now())
+
+        # Make sure every month from now to --ahead months out has a partition
+        wanted = [partitions.add_months(this_month, i) for i in range(options['ahead'] + 1)]
+        to_create = [month for month in wanted if month not in existing]
+
+        to_detach = []
+        if options['retain_months'] is not None:
+            cutoff = partitions.add_months(this_month, -options['retain_months'])
+            to_detach = [month for month in existing if month < cutoff]
+
+        if options['archive_dir'] and not dry_run:
+            os.makedirs(options['archive_dir'], exist_ok=True)
+
+        for month in to_create:
+            name = partitions.partition_name(month)
+            if dry_run:
+                self.stdout.write(f'Would create {name}')
+                continue
+
+            with transaction.atomic(), connection.cursor() as cursor:
+                partitions.create_partition(cursor, month)
+            self.stdout.write(self.style.SUCCESS(f'Created partition {name}'))
+
+        if to_detach and not dry_run:
+            # Compact the rows into monthly summaries first, like archive_footprints,
+            # so UserStats rebuilds and the charts still count them. One pass
+            # covers every retired partition (and stray rows in the default one)
+            for summary_month in archive.months_to_archive(cutoff):
+                count, path = archive.compact_month(summary_month, cutoff, options['archive_dir'])
+                if count:
+                    self.stdout.write(f'  {summary_month:%Y-%m}: archived {count} footprints to {path}')
+
+        for month in to_detach:
+            name = partitions.partition_name(month)
+            if dry_run:
+                self.stdout.write(f'Would archive and drop {name}')
+                continue
+
+            with transaction.atomic(), connection.cursor() as cursor:
+                left = partitions.locked_row_count(cursor, name)
+                if not left:
+                    partitions.detach_partition(cursor, month)
+                    partitions.drop_table(cursor, name)
+            if left:
+                # Rows written after compacting; the next run archives them
+                self.stdout.write(self.style.WARNING(f'Kept {name}: {left} footprints were added meanwhile'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Archived and dropped {name}'))
+
+        if not to_create and not to_detach:
+            self.stdout.write('Partitions are up to date.')
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import teams
+from core.models import Team
+
+
+class Command(BaseCommand):
+    help = 'Recompute team and organization totals from their members'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', action='append', dest='organizations', metavar='SLUG',
+                            help='Only rebuild the teams of this organization (repeatable)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        team_ids = Team.objects.order_by('pk')
+        if options['organizations']:
+            team_ids = team_ids.filter(organization__slug__in=options['organizations'])
+        team_ids = list(team_ids.values_list('pk', flat=True))
+        for team_id in team_ids:
+            # One team per transaction, so a big organization doesn't hold every lock at once
+            teams.rebuild([team_id])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt totals of {len(team_ids)} teams in {time.monotonic() - started:.1f}s.'
+        ))
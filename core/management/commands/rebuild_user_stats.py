@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute every UserStats row from footprints, archived summaries and challenge progress'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', metavar='ID',
+                            help='Only rebuild this user id (repeatable)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['users']:
+            count = len(stats.rebuild(options['users']))
+        else:
+            self.stdout.write('Rebuilding user stats...')
+            count = stats.rebuild_all(log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt stats for {count} users in {time.monotonic() - started:.1f}s.'
+        ))
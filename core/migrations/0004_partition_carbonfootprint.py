@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+from core import partitions
+
+
+def partition_footprints(apps, schema_editor):
+    # Declarative partitioning is PostgreSQL-only; other backends keep a plain table
+    if schema_editor.connection.vendor == 'postgresql':
+        partitions.convert_to_partitioned(schema_editor.connection)
+
+
+def unpartition_footprints(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        partitions.convert_to_plain(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_carbonfootprint_electricity_kwh_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_footprints, unpartition_footprints),
+        migrations.AddIndex(
+            model_name='carbonfootprint',
+            index=models.Index(fields=['user', 'created_at'], name='core_fp_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='carbonfootprint',
+            index=models.Index(fields=['created_at'], name='core_fp_created_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_partition_carbonfootprint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FootprintMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the summarised month')),
+                ('transportation', models.FloatField(default=0)),
+                ('food', models.FloatField(default=0)),
+                ('electricity', models.FloatField(default=0)),
+                ('waste', models.FloatField(default=0)),
+                ('total_emission', models.FloatField(default=0)),
+                ('entries_count', models.IntegerField(default=0)),
+                ('first_created_at', models.DateTimeField()),
+                ('last_created_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='footprint_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-month'],
+                'unique_together': {('user', 'month')},
+            },
+        ),
+    ]
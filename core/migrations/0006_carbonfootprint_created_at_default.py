@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-19 15:17
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_footprintmonthlysummary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='carbonfootprint',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0006_carbonfootprint_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_emission', models.FloatField(default=0)),
+                ('transportation', models.FloatField(default=0)),
+                ('food', models.FloatField(default=0)),
+                ('electricity', models.FloatField(default=0)),
+                ('waste', models.FloatField(default=0)),
+                ('entries_count', models.IntegerField(default=0)),
+                ('first_entry_at', models.DateTimeField(blank=True, null=True)),
+                ('last_entry_at', models.DateTimeField(blank=True, null=True)),
+                ('streak_days', models.IntegerField(default=0)),
+                ('streak_end', models.DateField(blank=True, null=True)),
+                ('carbon_saved', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'user stats',
+            },
+        ),
+    ]
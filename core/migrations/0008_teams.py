@@ -0,0 +1,74 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_userstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Organization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('member_count', models.IntegerField(default=0, editable=False)),
+                ('total_emission', models.FloatField(default=0, editable=False)),
+                ('entries_count', models.IntegerField(default=0, editable=False)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Team',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField()),
+                ('member_count', models.IntegerField(default=0, editable=False)),
+                ('total_emission', models.FloatField(default=0, editable=False)),
+                ('entries_count', models.IntegerField(default=0, editable=False)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='teams', to='core.organization')),
+            ],
+            options={
+                'ordering': ['organization', 'name'],
+                'unique_together': {('organization', 'slug')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Membership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('joined_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to=settings.AUTH_USER_MODEL)),
+                ('organization', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='core.organization')),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='core.team')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['team', 'user'], name='core_membership_team_idx')],
+                'unique_together': {('user', 'organization')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TeamDailyTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total_emission', models.FloatField(default=0)),
+                ('entries_count', models.IntegerField(default=0)),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_totals', to='core.team')),
+            ],
+            options={
+                'unique_together': {('team', 'day')},
+            },
+        ),
+    ]
@@ -1,5 +1,11 @@
+from datetime import timedelta
+
 from django.db import models
+from django.db.models.functions import Cast, Round
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from carbon import ratelimit
 
 class CarbonFootprint(models.Model):
     FUEL_CHOICES = [
@@ -49,6 +55,9 @@ class CarbonFootprint(models.Model):
     PUBLIC_TRANSPORT_FACTOR = 0.100  # kg CO₂ per km (bus/metro avg)
     ELECTRICITY_FACTOR = 0.4         # kg CO₂ per kWh (grid average)
 
+    # Calculations a user may save per day
+    DAILY_LIMIT = 3
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="footprints")
     
     
@@ -69,8 +78,17 @@ class CarbonFootprint(models.Model):
     waste_kg = models.FloatField(default=0, help_text="Monthly waste generation in kg")
     waste_type = models.CharField(max_length=20, choices=WASTE_TYPE_CHOICES, default="medium")
     
-    created_at = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add, so imports can keep historical timestamps
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     total_emission = models.FloatField(default=0, editable=False)  # auto-calculated (kg CO₂)
+
+    class Meta:
+        # On PostgreSQL the table is also range-partitioned by month on
+        # created_at (see core/partitions.py and migration 0004)
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='core_fp_user_created_idx'),
+            models.Index(fields=['created_at'], name='core_fp_created_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         # Calculate and set the total emission before saving
@@ -127,6 +145,35 @@ class CarbonFootprint(models.Model):
             'total': round(car_emission + flight_emission + public_emission + food_emission + electricity_emission + waste_emission, 2)
         }
 
+    @classmethod
+    def emission_expressions(cls):
+        """SQL expressions for the per-category emissions, mirroring get_emission_breakdown"""
+        def factor(field, factors):
+            return models.Case(
+                *[models.When(**{field: key}, then=models.Value(value)) for key, value in factors.items()],
+                default=models.Value(0.0),
+                output_field=models.FloatField(),
+            )
+
+        return {
+            'transportation': (
+                models.F('car_travel_km') * factor('fuel_type', cls.FUEL_EMISSION_FACTORS)
+                + models.F('flights_hours') * 900 * cls.FLIGHT_EMISSION_FACTOR
+                + models.F('public_transport_km') * cls.PUBLIC_TRANSPORT_FACTOR
+            ),
+            'food': models.F('meals_per_day') * factor('meal_type', cls.FOOD_EMISSION_FACTORS) * 30,
+            'electricity': models.F('electricity_kwh') * cls.ELECTRICITY_FACTOR,
+            'waste': models.F('waste_kg') * factor('waste_type', cls.WASTE_EMISSION_FACTORS),
+        }
+
+    @classmethod
+    def total_emission_expression(cls):
+        """SQL expression for total_emission, mirroring calculate_emission"""
+        total = sum(cls.emission_expressions().values())
+        # PostgreSQL only rounds numerics to a number of places
+        rounded = Round(Cast(total, models.DecimalField(max_digits=20, decimal_places=6)), 2)
+        return Cast(rounded, models.FloatField())
+
     @classmethod
     def get_daily_calculation_count(cls, user, date=None):
         """Get the number of calculations a user has made today"""
@@ -139,17 +186,203 @@ class CarbonFootprint(models.Model):
             created_at__date=date
         ).count()
     
+    @classmethod
+    def _calculations_on(cls, user, date):
+        # Today's count comes from the DAILY_CALCULATIONS counter, other days from the rows
+        if date is None or date == timezone.localdate():
+            return DAILY_CALCULATIONS.usage(user.pk)
+        return cls.get_daily_calculation_count(user, date)
+
     @classmethod
     def can_calculate_today(cls, user, date=None):
-        """Check if user can make another calculation today (limit: 3 per day)"""
-        daily_count = cls.get_daily_calculation_count(user, date)
-        return daily_count < 3
+        """Check if user can make another calculation today (limit: DAILY_CALCULATIONS)"""
+        return cls._calculations_on(user, date) < DAILY_CALCULATIONS.rate.limit
     
     @classmethod
     def get_remaining_calculations(cls, user, date=None):
         """Get remaining calculations for today"""
-        daily_count = cls.get_daily_calculation_count(user, date)
-        return max(0, 3 - daily_count)
+        return max(0, DAILY_CALCULATIONS.rate.limit - cls._calculations_on(user, date))
 
     def __str__(self):
         return f"{self.user.username} - {self.created_at.date()} - {self.total_emission} kg CO₂"
+
+
+# The daily calculation cap, counted per user in the cache. A new day (or an
+# emptied cache) starts from the footprints already saved today.
+DAILY_CALCULATIONS = ratelimit.Limit(
+    'daily_calculations',
+    f'{CarbonFootprint.DAILY_LIMIT}/d',
+    fixed=True,
+    seed=lambda user_id: CarbonFootprint.get_daily_calculation_count(user_id),
+)
+
+
+class FootprintMonthlySummary(models.Model):
+    """
+    Per-user monthly rollup of CarbonFootprint rows that have been archived.
+
+    Created by the archive_footprints command; UserStats and the chart
+    series add these to the live rows.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="footprint_summaries")
+    month = models.DateField(help_text="First day of the summarised month")
+
+    transportation = models.FloatField(default=0)
+    food = models.FloatField(default=0)
+    electricity = models.FloatField(default=0)
+    waste = models.FloatField(default=0)
+    total_emission = models.FloatField(default=0)
+
+    entries_count = models.IntegerField(default=0)
+    first_created_at = models.DateTimeField()
+    last_created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['user', 'month']
+        ordering = ['-month']
+
+    def __str__(self):
+        return f"{self.user.username} - {self.month:%Y-%m} - {self.total_emission} kg CO₂ ({self.entries_count} entries)"
+
+
+class UserStats(models.Model):
+    """
+    Lifetime figures for one user, so pages don't aggregate them per request.
+
+    Kept up to date by core/stats.py as footprints and challenge progress are
+    written. Archived footprints still count. ``rebuild_user_stats``
+    recomputes the rows from scratch.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+
+    total_emission = models.FloatField(default=0)
+    transportation = models.FloatField(default=0)
+    food = models.FloatField(default=0)
+    electricity = models.FloatField(default=0)
+    waste = models.FloatField(default=0)
+
+    entries_count = models.IntegerField(default=0)
+    first_entry_at = models.DateTimeField(null=True, blank=True)
+    last_entry_at = models.DateTimeField(null=True, blank=True)
+
+    # Consecutive days with a live footprint, up to and including streak_end
+    streak_days = models.IntegerField(default=0)
+    streak_end = models.DateField(null=True, blank=True)
+
+    # Sum of completed ChallengeProgress.carbon_saved
+    carbon_saved = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "user stats"
+
+    @property
+    def current_streak(self):
+        """streak_days while the streak is still alive (an entry today or yesterday), else 0."""
+        if self.streak_end and self.streak_end >= timezone.localdate() - timedelta(days=1):
+            return self.streak_days
+        return 0
+
+    def totals(self):
+        """Same shape as core.archive.footprint_totals, for all time."""
+        return {
+            'total': self.total_emission,
+            'entries': self.entries_count,
+            'last_updated': self.last_entry_at,
+            'transportation': self.transportation,
+            'food': self.food,
+            'electricity': self.electricity,
+            'waste': self.waste,
+        }
+
+    def __str__(self):
+        return f"{self.user.username} - {self.entries_count} entries - {self.total_emission} kg CO₂"
+
+
+class Organization(models.Model):
+    """
+    A group of teams, such as a company, with its own team leaderboard.
+
+    member_count, total_emission and entries_count are the sums of its teams,
+    kept up to date by core/teams.py.
+    """
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    member_count = models.IntegerField(default=0, editable=False)
+    total_emission = models.FloatField(default=0, editable=False)
+    entries_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class Team(models.Model):
+    """
+    A team within an organization.
+
+    The running sums cover its current members' whole history (their
+    UserStats); TeamDailyTotal holds the same per day for the shorter periods.
+    """
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name="teams")
+    name = models.CharField(max_length=100)
+    slug = models.SlugField()
+
+    member_count = models.IntegerField(default=0, editable=False)
+    total_emission = models.FloatField(default=0, editable=False)
+    entries_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        unique_together = ['organization', 'slug']
+        ordering = ['organization', 'name']
+
+    @property
+    def average_emission(self):
+        """All-time kg CO₂ per member."""
+        return self.total_emission / self.member_count if self.member_count else 0
+
+    def __str__(self):
+        return f"{self.organization.name} / {self.name}"
+
+
+class Membership(models.Model):
+    """A user's place in a team; one team per organization."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="memberships")
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name="memberships")
+    # Copied from the team, so the one-team-per-organization rule is a constraint
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name="memberships", editable=False)
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['user', 'organization']
+        indexes = [models.Index(fields=['team', 'user'], name='core_membership_team_idx')]
+
+    def save(self, *args, **kwargs):
+        self.organization_id = self.team.organization_id
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.user.username} in {self.team}"
+
+
+class TeamDailyTotal(models.Model):
+    """
+    A team's emissions on one day: the sum of its members' footprints that day.
+
+    Period leaderboards add up a team's rows since the period started, so
+    they read a few rows per team however many members it has.
+    """
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name="daily_totals")
+    day = models.DateField()
+    total_emission = models.FloatField(default=0)
+    entries_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['team', 'day']
+
+    def __str__(self):
+        return f"{self.team} - {self.day} - {self.total_emission} kg CO₂"
@@ -0,0 +1,154 @@
+"""
+Monthly range partitioning of the CarbonFootprint table on PostgreSQL.
+
+Migration 0004 turns ``core_carbonfootprint`` into a table partitioned by
+``created_at``. Each month lives in ``core_carbonfootprint_pYYYY_MM``; rows
+that fall outside every monthly partition land in the default partition.
+The ORM keeps talking to the parent table, so model code is unchanged.
+
+``python manage.py manage_partitions`` creates the coming months'
+partitions. With --retain-months it retires old ones: their rows go through
+archive.compact_month() first (exported, and folded into
+FootprintMonthlySummary, which UserStats and the charts count), and only the
+emptied partition is detached and dropped.
+"""
+import re
+from datetime import datetime, timezone
+
+TABLE = 'core_carbonfootprint'
+DEFAULT_PARTITION = f'{TABLE}_default'
+SEQUENCE = f'{TABLE}_id_seq'
+
+_PARTITION_RE = re.compile(rf'^{TABLE}_p(\d{{4}})_(\d{{2}})$')
+
+
+def month_start(value):
+    """First instant (UTC) of the month containing ``value``."""
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return datetime(month.year + years, month_index + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def is_partitioned(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = %s",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(connection):
+    """Return {month: partition name} for the attached monthly partitions."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits i "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "JOIN pg_class child ON child.oid = i.inhrelid "
+            "WHERE parent.relname = %s",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        match = _PARTITION_RE.match(name)
+        if match:
+            month = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+            partitions[month] = name
+    return dict(sorted(partitions.items()))
+
+
+def create_partition(cursor, month):
+    """
+    Create and attach the partition for ``month``.
+
+    Rows for that month that already landed in the default partition are moved
+    into the new partition first, otherwise ATTACH would refuse the range.
+    """
+    name = partition_name(month)
+    start, end = month, add_months(month, 1)
+    cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} '
+        f'WHERE created_at >= %s AND created_at < %s RETURNING *) '
+        f'INSERT INTO {name} SELECT * FROM moved',
+        [start, end],
+    )
+    cursor.execute(
+        f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+        [start, end],
+    )
+    return name
+
+
+def detach_partition(cursor, month):
+    name = partition_name(month)
+    cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+    return name
+
+
+def locked_row_count(cursor, name):
+    """Rows in a partition, locking it against writes until the transaction ends."""
+    cursor.execute(f'LOCK TABLE {name} IN ACCESS EXCLUSIVE MODE')
+    cursor.execute(f'SELECT COUNT(*) FROM {name}')
+    return cursor.fetchone()[0]
+
+
+def drop_table(cursor, name):
+    cursor.execute(f'DROP TABLE {name}')
+
+
+def convert_to_partitioned(connection, months_ahead=3):
+    """Rebuild the plain footprint table as a monthly-partitioned one."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_plain')
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE {TABLE}_plain) PARTITION BY RANGE (created_at)')
+        cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT')
+
+        cursor.execute(f'SELECT MIN(created_at) FROM {TABLE}_plain')
+        oldest = cursor.fetchone()[0] or datetime.now(timezone.utc)
+        month = month_start(oldest)
+        last = add_months(month_start(datetime.now(timezone.utc)), months_ahead)
+        while month <= last:
+            create_partition(cursor, month)
+            month = add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_plain')
+        cursor.execute(f'DROP TABLE {TABLE}_plain')
+
+        # The partition key has to be part of the primary key
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, created_at)')
+        _restore_keys(cursor)
+
+
+def convert_to_plain(connection):
+    """Reverse of convert_to_partitioned: fold every partition back into one table."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_partitioned')
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE {TABLE}_partitioned)')
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_partitioned')
+        # Also drops every partition and the sequence owned by the old id column
+        cursor.execute(f'DROP TABLE {TABLE}_partitioned')
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id)')
+        _restore_keys(cursor)
+
+
+def _restore_keys(cursor):
+    """Recreate the id sequence, the user foreign key and its index."""
+    cursor.execute(f'CREATE SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id')
+    cursor.execute(f"SELECT setval('{SEQUENCE}', COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}")
+    cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+    cursor.execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_user_id_fk_auth_user_id '
+        f'FOREIGN KEY (user_id) REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+    cursor.execute(f'CREATE INDEX {TABLE}_user_id_idx ON {TABLE} (user_id)')
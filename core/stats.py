@@ -0,0 +1,236 @@
+"""
+Per-user lifetime statistics (UserStats), kept up to date as data is written.
+
+The dashboard, the all-time leaderboard and My Challenges used to aggregate a
+user's footprints, archived summaries and challenge progress on every request.
+They now read one UserStats row instead.
+
+Writers keep the rows current inside their own transaction:
+
+* record_footprints() after new footprints are saved. One grouped query
+  sums the new rows per user and day, and each user's row is locked and
+  moved forward, the streak included. The same per-day rows then go to
+  teams.record_days() for the users' teams, and the users' old totals to
+  live.footprints_recorded() for the live leaderboard.
+* record_saved() when challenge progress changes the carbon saved, as a
+  single UPDATE ... SET carbon_saved = carbon_saved + x. It is called by
+  challenges/savings.py, which keeps the per-challenge sums too.
+* rebuild() after edits and deletes, which can't be applied as a delta. It
+  recomputes the given users from scratch with a few grouped queries.
+
+A user without a row (for example, one who signed up before UserStats
+existed) gets one built from scratch on first use. ``python manage.py
+rebuild_user_stats`` rebuilds every user.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from carbon import routers
+from challenges.models import ChallengeProgress
+from . import live, teams
+from .exports import CATEGORIES
+from .models import CarbonFootprint, FootprintMonthlySummary, UserStats
+
+BATCH_SIZE = 1000
+FIELDS = [
+    'total_emission', *CATEGORIES, 'entries_count', 'first_entry_at', 'last_entry_at',
+    'streak_days', 'streak_end', 'carbon_saved', 'updated_at',
+]
+
+
+def streak(days):
+    """(length, last day) of the run of consecutive days ending at the latest of ``days`` (newest first)."""
+    length, end = 0, None
+    for day in days:
+        if end is None:
+            length, end = 1, day
+        elif day == end - timedelta(days=length):
+            length += 1
+        elif day < end - timedelta(days=length):
+            break
+    return length, end
+
+
+def _extend_streak(stats, days):
+    """Move stats' streak forward over new entry days (oldest first); False when it needs recomputing."""
+    for day in days:
+        if stats.streak_end is None or day > stats.streak_end + timedelta(days=1):
+            stats.streak_days, stats.streak_end = 1, day
+        elif day == stats.streak_end + timedelta(days=1):
+            stats.streak_days += 1
+            stats.streak_end = day
+        elif day == stats.streak_end - timedelta(days=stats.streak_days):
+            # A backdated entry right before the run may join it to an older one
+            return False
+    return True
+
+
+def _live_totals(footprints):
+    expressions = CarbonFootprint.emission_expressions()
+    return footprints.order_by().annotate(
+        total=Sum('total_emission'),
+        entries=Count('id'),
+        first=Min('created_at'),
+        last=Max('created_at'),
+        **{name: Sum(expressions[name]) for name in CATEGORIES},
+    )
+
+
+def _add(stats, row):
+    """Add a _live_totals() or archived row to stats."""
+    stats.total_emission += row['total'] or 0
+    for name in CATEGORIES:
+        setattr(stats, name, getattr(stats, name) + (row[name] or 0))
+    stats.entries_count += row['entries'] or 0
+    if row['first'] and (stats.first_entry_at is None or row['first'] < stats.first_entry_at):
+        stats.first_entry_at = row['first']
+    if row['last'] and (stats.last_entry_at is None or row['last'] > stats.last_entry_at):
+        stats.last_entry_at = row['last']
+
+
+def _build(user_ids):
+    """Fresh UserStats for user_ids (at most BATCH_SIZE of them), unsaved."""
+    built = {user_id: UserStats(user_id=user_id) for user_id in user_ids}
+    footprints = CarbonFootprint.objects.filter(user_id__in=user_ids)
+
+    for row in _live_totals(footprints.values('user_id')):
+        _add(built[row['user_id']], row)
+
+    archived = FootprintMonthlySummary.objects.filter(user_id__in=user_ids).order_by().values('user_id').annotate(
+        total=Sum('total_emission'),
+        entries=Sum('entries_count'),
+        first=Min('first_created_at'),
+        last=Max('last_created_at'),
+        **{name: Sum(name) for name in CATEGORIES},
+    )
+    for row in archived:
+        _add(built[row['user_id']], row)
+
+    saved = ChallengeProgress.objects.filter(
+        user_challenge__user_id__in=user_ids, completed=True, carbon_saved__isnull=False,
+    ).order_by().values('user_challenge__user_id').annotate(saved=Sum('carbon_saved'))
+    for row in saved:
+        built[row['user_challenge__user_id']].carbon_saved = row['saved']
+
+    # Distinct entry days, newest first per user; only live rows have days
+    days = defaultdict(list)
+    rows = footprints.annotate(day=TruncDate('created_at')).order_by('user_id', '-day')
+    for user_id, day in rows.values_list('user_id', 'day').distinct():
+        days[user_id].append(day)
+    for user_id, user_days in days.items():
+        built[user_id].streak_days, built[user_id].streak_end = streak(user_days)
+
+    return list(built.values())
+
+
+def rebuild(user_ids):
+    """Recompute the users' rows from scratch; returns {user id: UserStats}."""
+    user_ids = sorted(set(user_ids))
+    rebuilt = {}
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[start:start + BATCH_SIZE]
+        # Always from the primary: a lagging replica would write stale numbers back
+        with transaction.atomic(), routers.read_from_replica(False):
+            # Writers wait on these locks, so their deltas land on the rebuilt rows
+            list(UserStats.objects.select_for_update().filter(user_id__in=batch).order_by('user_id').values_list('pk'))
+            stats = _build(batch)
+            UserStats.objects.bulk_create(
+                stats, update_conflicts=True, unique_fields=['user'], update_fields=FIELDS,
+            )
+        rebuilt.update((s.user_id, s) for s in stats)
+    return rebuilt
+
+
+def rebuild_all(log=None):
+    """rebuild() every user, a batch at a time; returns the number of users."""
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        rebuild(user_ids[start:start + BATCH_SIZE])
+        if log:
+            log(f'  {min(start + BATCH_SIZE, len(user_ids))} of {len(user_ids)} users')
+    return len(user_ids)
+
+
+def record_footprints(footprints):
+    """Add newly saved footprints to their users' stats, in the transaction that saved them."""
+    ids = [footprint.pk for footprint in footprints]
+    if not ids:
+        return
+    with transaction.atomic(), routers.read_from_replica(False):
+        rows = defaultdict(list)
+        for start in range(0, len(ids), BATCH_SIZE):
+            new = CarbonFootprint.objects.filter(pk__in=ids[start:start + BATCH_SIZE])
+            for row in _live_totals(new.annotate(day=TruncDate('created_at')).values('user_id', 'day')):
+                rows[row['user_id']].append(row)
+
+        existing = {
+            stats.user_id: stats
+            for stats in UserStats.objects.select_for_update().filter(user_id__in=rows).order_by('user_id')
+        }
+        changed, rebuild_ids = [], set(rows) - set(existing)
+        previous = {user_id: existing[user_id].total_emission if user_id in existing else None for user_id in rows}
+        now = timezone.now()
+        for user_id, user_rows in rows.items():
+            stats = existing.get(user_id)
+            if stats is None:
+                continue
+            for row in user_rows:
+                _add(stats, row)
+            if _extend_streak(stats, sorted(row['day'] for row in user_rows)):
+                stats.updated_at = now  # bulk_update skips auto_now
+                changed.append(stats)
+            else:
+                rebuild_ids.add(user_id)
+        UserStats.objects.bulk_update(changed, FIELDS)
+        # Users without a row yet, or whose streak can't be extended, from scratch
+        rebuild(rebuild_ids)
+        teams.record_days(rows)
+        live.footprints_recorded(previous)
+
+
+def ensure(user_ids):
+    """Build the rows of users who don't have one yet."""
+    user_ids = set(user_ids)
+    existing = UserStats.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True)
+    rebuild(user_ids - set(existing))
+
+
+def record_saved(user_id, amount):
+    """Add amount (may be negative) to the user's carbon_saved."""
+    if not amount:
+        return
+    updated = UserStats.objects.filter(user_id=user_id).update(carbon_saved=F('carbon_saved') + amount)
+    if not updated:
+        rebuild([user_id])
+
+
+def find(user_id):
+    """The user's UserStats, or None before it is built; only reads."""
+    return UserStats.objects.filter(user_id=user_id).first()
+
+
+async def afind(user_id):
+    """Async version of find()."""
+    return await UserStats.objects.filter(user_id=user_id).afirst()
+
+
+def get(user_id, found=None):
+    """The user's UserStats, built on first use; found is the result of an earlier find()."""
+    stats = found or find(user_id)
+    if stats is None:
+        stats = rebuild([user_id])[user_id]
+    return stats
+
+
+def user_totals():
+    """All-time totals per user, in the shape of the leaderboard's per-user rows."""
+    return UserStats.objects.filter(entries_count__gt=0).order_by().values(
+        'user_id', 'user__username',
+        total=F('total_emission'), entries=F('entries_count'), last_updated=F('last_entry_at'),
+    )
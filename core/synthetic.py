@@ -0,0 +1,336 @@
+"""
+High-volume synthetic data for benchmarks and local performance work.
+
+generate() builds a realistic data set from a scale factor and a seed:
+
+* users sign up over the generation window; how much they log follows a
+  heavy-tailed distribution (most users log a little, a few log a lot),
+* footprints are spread over the days after sign-up, never more than the
+  daily calculation limit (3) per user per day, with values drawn around a
+  per-user travel/diet/energy profile,
+* users join challenges from the catalog and log daily ChallengeProgress
+  with a per-user adherence rate; UserChallenge status and progress follow,
+* progress rows get their carbon_saved, and each user's UserStats row and
+  challenge sums are built once their rows are in.
+
+Rows are written with bulk_create in batches. Users are split into fixed-size
+chunks with their own seeded RNG, which are processed by parallel worker
+processes. The output only depends on the seed, not on the worker count.
+"""
+import math
+import multiprocessing
+import random
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from challenges import savings
+from challenges.models import ChallengeProgress, ChallengeType, UserChallenge
+from .imports import batch_emissions
+from .models import CarbonFootprint
+
+BATCH_SIZE = 5000
+# Users handled per worker task; fixed so results don't depend on --workers
+CHUNK_USERS = 500
+USERS_PER_SCALE = 1000
+PASSWORD = 'testpass123'
+USERNAME_PREFIX = 'synthetic'
+DAILY_LIMIT = CarbonFootprint.DAILY_LIMIT
+
+DURATION_TYPES = {0: 'ongoing', 1: 'daily', 7: 'weekly', 14: 'weekly', 30: 'monthly'}
+
+FUEL_WEIGHTS = {'petrol': 50, 'diesel': 20, 'hybrid': 15, 'electric': 15}
+MEAL_WEIGHTS = {'light': 20, 'medium': 45, 'heavy': 25, 'meat_heavy': 10}
+WASTE_WEIGHTS = {'low': 30, 'medium': 50, 'high': 20}
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _poisson(rng, lam):
+    # Knuth's method; lam is small here
+    limit, k, p = math.exp(-lam), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+
+def _profile(rng):
+    """A user's typical habits; individual entries vary around these."""
+    return {
+        'car_km': rng.lognormvariate(3.2, 0.8),          # median ~25 km
+        'fuel_type': _weighted(rng, FUEL_WEIGHTS),
+        'flyer': rng.random() < 0.15,
+        'public_km': rng.lognormvariate(2.3, 0.9),
+        'meals_per_day': rng.choice([2, 3, 3, 3, 4]),
+        'meal_type': _weighted(rng, MEAL_WEIGHTS),
+        'electricity_kwh': rng.lognormvariate(5.6, 0.5),  # median ~270 kWh
+        'waste_kg': rng.lognormvariate(2.9, 0.5),
+        'waste_type': _weighted(rng, WASTE_WEIGHTS),
+    }
+
+
+def _footprint(rng, profile):
+    return {
+        'car_travel_km': round(profile['car_km'] * rng.uniform(0.6, 1.4), 1),
+        'fuel_type': profile['fuel_type'],
+        'flights_hours': round(rng.uniform(1, 10), 1) if profile['flyer'] and rng.random() < 0.2 else 0,
+        'public_transport_km': round(profile['public_km'] * rng.uniform(0.5, 1.5), 1),
+        'meals_per_day': profile['meals_per_day'],
+        'meal_type': profile['meal_type'] if rng.random() < 0.8 else _weighted(rng, MEAL_WEIGHTS),
+        'electricity_kwh': round(profile['electricity_kwh'] * rng.uniform(0.8, 1.2), 1),
+        'waste_kg': round(profile['waste_kg'] * rng.uniform(0.7, 1.3), 1),
+        'waste_type': profile['waste_type'],
+    }
+
+
+def _entry_times(rng, count, first_day, days, end):
+    """count timestamps on distinct-ish days, at most DAILY_LIMIT per day."""
+    count = min(count, days * DAILY_LIMIT)
+    per_day = {}
+    for day in rng.sample(range(days), min(days, count)):
+        per_day[day] = 1
+    remaining = count - len(per_day)
+    open_days = [day for day in per_day]
+    while remaining > 0 and open_days:
+        day = rng.choice(open_days)
+        per_day[day] += 1
+        remaining -= 1
+        if per_day[day] == DAILY_LIMIT:
+            open_days.remove(day)
+
+    times = []
+    for day, entries in per_day.items():
+        midnight = first_day + timedelta(days=day)
+        for _ in range(entries):
+            created_at = midnight + timedelta(seconds=rng.uniform(7 * 3600, 23 * 3600))
+            times.append(min(created_at, end - timedelta(seconds=1)))
+    return times
+
+
+def ensure_challenge_types(count, rng):
+    """Make sure at least ``count`` active challenge types exist; returns them."""
+    if not ChallengeType.objects.exists():
+        call_command('create_challenges', stdout=StringIO())
+
+    existing = ChallengeType.objects.filter(is_active=True).count()
+    categories = [key for key, _ in ChallengeType.CATEGORY_CHOICES]
+    extra = []
+    for i in range(existing, count):
+        duration_days = rng.choice(list(DURATION_TYPES))
+        extra.append(ChallengeType(
+            title=f'Synthetic challenge {i + 1}',
+            description='Generated for benchmarking.',
+            category=rng.choice(categories),
+            duration_type=DURATION_TYPES[duration_days],
+            duration_days=duration_days,
+            carbon_impact=round(rng.uniform(0.5, 15), 2),
+            difficulty_level=rng.randint(1, 3),
+        ))
+    ChallengeType.objects.bulk_create(extra)
+    return list(ChallengeType.objects.filter(is_active=True).order_by('id'))
+
+
+def create_users(count, rng, start, end):
+    """Create ``count`` users who signed up between start and end; returns their ids."""
+    offset = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+    password = make_password(PASSWORD)  # hashing once keeps this fast
+    span = (end - start).total_seconds()
+    ids = []
+    for batch_start in range(0, count, BATCH_SIZE):
+        users = []
+        for i in range(batch_start, min(batch_start + BATCH_SIZE, count)):
+            # Sign-ups skew towards the start of the window
+            joined = start + timedelta(seconds=span * rng.random() ** 2)
+            username = f'{USERNAME_PREFIX}{offset + i}'
+            users.append(User(
+                username=username, email=f'{username}@example.com', password=password, date_joined=joined,
+            ))
+        with transaction.atomic():
+            User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        ids.extend(User.objects.filter(username__in=[u.username for u in users]).order_by('id').values_list('id', flat=True))
+    return ids
+
+
+class _Writer:
+    """Buffers model instances and bulk-inserts them per model in batches."""
+
+    def __init__(self):
+        self.pending = {}
+        self.counts = {}
+
+    def add(self, obj):
+        rows = self.pending.setdefault(type(obj), [])
+        rows.append(obj)
+        if len(rows) >= BATCH_SIZE:
+            self.flush(type(obj))
+
+    def flush(self, model=None):
+        for current in [model] if model else list(self.pending):
+            rows = self.pending.pop(current, [])
+            if not rows:
+                continue
+            if current is CarbonFootprint:
+                fields = [
+                    {name: getattr(row, name) for name in (
+                        'car_travel_km', 'fuel_type', 'flights_hours', 'public_transport_km',
+                        'meals_per_day', 'meal_type', 'electricity_kwh', 'waste_kg', 'waste_type')}
+                    for row in rows
+                ]
+                for row, total in zip(rows, batch_emissions(fields)):
+                    row.total_emission = total
+            with transaction.atomic():
+                current.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+            self.counts[current.__name__] = self.counts.get(current.__name__, 0) + len(rows)
+
+
+def _participation(rng, user_id, challenge_type, start_date, adherence, end):
+    """An unsaved UserChallenge plus its (date, completed) daily log up to end."""
+    duration = challenge_type.duration_days
+    end_date = start_date + timedelta(days=duration) if duration else None
+    today = end.date()
+    last_day = min(today, end_date.date()) if end_date else today
+
+    days_logged = []
+    day = start_date.date()
+    while day <= last_day:
+        days_logged.append((day, rng.random() < adherence))
+        day += timedelta(days=1)
+
+    # Same rules as challenges.views.calculate_completion_rate / update_challenge_progress
+    if duration:
+        completed = sum(1 for _, done in days_logged if done)
+        rate = min(100, int(completed / duration * 100))
+    else:
+        since = today - timedelta(days=30)
+        completed = sum(1 for day, done in days_logged if done and day >= since)
+        rate = min(100, int(completed / 30 * 100))
+    expired = end_date is not None and end > end_date
+    status = 'active'
+    if rate >= 100 or (expired and rate >= 80):
+        status = 'completed'
+    elif expired and rate < 50:
+        status = 'failed'
+
+    user_challenge = UserChallenge(
+        user_id=user_id, challenge_type=challenge_type, start_date=start_date, end_date=end_date,
+        progress_percentage=rate, status=status,
+    )
+    return user_challenge, days_logged
+
+
+def generate_chunk(user_ids, challenge_types, seed, chunk_index, mean_footprints, start, end):
+    """Footprints, challenges and progress for one chunk of users; returns row counts."""
+    rng = random.Random(f'{seed}-{chunk_index}')
+    writer = _Writer()
+    joined_dates = dict(User.objects.filter(id__in=user_ids).values_list('id', 'date_joined'))
+    participations = []
+
+    for user_id in user_ids:
+        joined = max(joined_dates[user_id], start)
+        first_day = joined.replace(hour=0, minute=0, second=0, microsecond=0)
+        days = max(1, (end - first_day).days)
+
+        # Heavy-tailed activity: median user logs ~mean/2, a few log many times more
+        entries = max(1, int(rng.paretovariate(1.5) * mean_footprints / 3))
+        profile = _profile(rng)
+        for created_at in _entry_times(rng, entries, first_day, days, end):
+            writer.add(CarbonFootprint(user_id=user_id, created_at=created_at, **_footprint(rng, profile)))
+
+        adherence = rng.betavariate(4, 2)  # mostly diligent, some drop-outs
+        joined_count = min(_poisson(rng, 1.5), len(challenge_types))
+        for challenge_type in rng.sample(challenge_types, joined_count):
+            start_date = joined + timedelta(seconds=rng.uniform(0, (end - joined).total_seconds()))
+            user_challenge, days_logged = _participation(rng, user_id, challenge_type, start_date, adherence, end)
+            participations.append((user_challenge, days_logged))
+
+    # Progress rows need the challenges' primary keys, so those go in first
+    with transaction.atomic():
+        UserChallenge.objects.bulk_create([uc for uc, _ in participations], batch_size=BATCH_SIZE)
+    writer.counts['UserChallenge'] = len(participations)
+    for user_challenge, days_logged in participations:
+        for day, done in days_logged:
+            writer.add(ChallengeProgress(
+                user_challenge=user_challenge, date=day, completed=done,
+                carbon_saved=savings.saving(user_challenge.challenge_type, done),
+            ))
+
+    writer.flush()
+    # bulk_create skips the running sums, so the chunk's are built at the end
+    savings.rebuild(user_ids)
+    return writer.counts
+
+
+def _init_worker():
+    import django
+    django.setup()
+    # Never share the parent's database connections across processes
+    connections.close_all()
+
+
+def _run_chunk(args):
+    return generate_chunk(*args)
+
+
+def generate(scale=1.0, seed=0, users=None, footprints=20, challenges=8, days=365, workers=1, end=None, log=None):
+    """
+    Create a synthetic data set and return a report dict.
+
+    ``users`` overrides ``scale`` (scale 1.0 = 1,000 users); ``footprints`` is
+    the mean number of footprints per user; ``end`` (default: now) is the
+    newest possible timestamp.
+    """
+    started = time.monotonic()
+    rng = random.Random(seed)
+    end = end or timezone.now()
+    window_start = end - timedelta(days=days)
+    user_count = users if users is not None else max(1, int(USERS_PER_SCALE * scale))
+
+    challenge_types = ensure_challenge_types(challenges, rng)
+    user_ids = create_users(user_count, rng, window_start, end)
+    if log:
+        log(f'Created {len(user_ids)} users and {len(challenge_types)} challenge types')
+
+    tasks = [
+        (user_ids[i:i + CHUNK_USERS], challenge_types, seed, n, footprints, window_start, end)
+        for n, i in enumerate(range(0, len(user_ids), CHUNK_USERS))
+    ]
+
+    counts = {'User': len(user_ids)}
+    if connection.vendor == 'sqlite':
+        workers = 1  # SQLite allows a single writer (and test databases live in memory)
+
+    def collect(chunk_counts):
+        for name, value in chunk_counts.items():
+            counts[name] = counts.get(name, 0) + value
+        if log:
+            rows = sum(counts.values())
+            log(f'  {rows} rows ({rows / (time.monotonic() - started):.0f} rows/sec)')
+
+    if workers > 1:
+        connections.close_all()
+        with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+            for chunk_counts in pool.imap_unordered(_run_chunk, tasks):
+                collect(chunk_counts)
+    else:
+        for task in tasks:
+            collect(generate_chunk(*task))
+
+    elapsed = time.monotonic() - started
+    rows = sum(counts.values())
+    return {
+        'counts': counts,
+        'rows': rows,
+        'elapsed': elapsed,
+        'rows_per_sec': rows / elapsed if elapsed else 0.0,
+        'user_ids': user_ids,
+    }
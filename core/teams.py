@@ -0,0 +1,253 @@
+"""
+Team and organization totals, rolled up from their members as data is written.
+
+A team's figures are the sums over its current members: Team holds the
+all-time total, entry count and member count, and TeamDailyTotal the total
+per day. An Organization holds the sums of its teams. A team leaderboard
+reads the organization's teams and, for a shorter period, their
+TeamDailyTotal rows since it started; the cost depends on the number of
+teams and days, not on how many members they have.
+
+Writers move the sums forward inside their own transaction:
+
+* record_days() from stats.record_footprints(), with the per-user, per-day
+  totals of the new footprints it has already computed. The teams of those
+  users get ``UPDATE ... SET total = total + x`` statements, ordered by id.
+* join() and leave() when a membership starts or ends. They add or take off
+  the user's whole history: UserStats for all time, and one grouped query
+  over the user's live footprints for the days. move() takes the history
+  off the old team and adds it to the new one on the same Membership row,
+  which keeps its joined_at.
+* delete_users() for users being deleted, whose memberships go with them in
+  the cascade, without a leave().
+* rebuild() after edits and deletes, which can't be applied as a delta. It
+  recomputes the given teams, and their organizations, from scratch.
+
+Days are local calendar days (TruncDate), so the weekly period covers whole
+days. Archived footprints count towards all time only; archive_footprints
+keeps months the shorter periods never reach. ``python manage.py
+rebuild_team_totals`` recomputes every team.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from carbon import routers
+from . import stats
+from .models import CarbonFootprint, Membership, Organization, Team, TeamDailyTotal, UserStats
+
+
+def _user_days(user_ids):
+    """The users' live footprints summed per user and local day."""
+    return (
+        CarbonFootprint.objects.filter(user_id__in=user_ids)
+        .annotate(day=TruncDate('created_at'))
+        .order_by().values('user_id', 'day')
+        .annotate(total=Sum('total_emission'), entries=Count('id'))
+    )
+
+
+def _apply(days, totals):
+    """
+    Add deltas to the rollups.
+
+    days is {(team id, day): [total, entries]}, totals {team id: [total,
+    entries, members]}. Rows are updated in id order, so concurrent writers
+    take their locks in the same order.
+    """
+    if days:
+        # Create missing day rows at zero, then add to every row alike
+        TeamDailyTotal.objects.bulk_create(
+            [TeamDailyTotal(team_id=team_id, day=day) for team_id, day in days], ignore_conflicts=True,
+        )
+        for (team_id, day), (total, entries) in sorted(days.items()):
+            TeamDailyTotal.objects.filter(team_id=team_id, day=day).update(
+                total_emission=F('total_emission') + total, entries_count=F('entries_count') + entries,
+            )
+
+    per_organization = defaultdict(lambda: [0, 0, 0])
+    organizations = dict(Team.objects.filter(pk__in=totals).values_list('pk', 'organization_id'))
+    for team_id, (total, entries, members) in sorted(totals.items()):
+        Team.objects.filter(pk=team_id).update(
+            total_emission=F('total_emission') + total,
+            entries_count=F('entries_count') + entries,
+            member_count=F('member_count') + members,
+        )
+        organization = per_organization[organizations[team_id]]
+        organization[0] += total
+        organization[1] += entries
+        organization[2] += members
+    for organization_id, (total, entries, members) in sorted(per_organization.items()):
+        Organization.objects.filter(pk=organization_id).update(
+            total_emission=F('total_emission') + total,
+            entries_count=F('entries_count') + entries,
+            member_count=F('member_count') + members,
+        )
+
+
+def record_days(rows):
+    """
+    Add new footprints to their users' teams.
+
+    rows is {user id: [{'day', 'total', 'entries'}, ...]}, as built by
+    stats.record_footprints() in the transaction that saved them.
+    """
+    teams = defaultdict(list)
+    for user_id, team_id in Membership.objects.filter(user_id__in=rows).values_list('user_id', 'team_id'):
+        teams[user_id].append(team_id)
+    if not teams:
+        return
+
+    days, totals = defaultdict(lambda: [0, 0]), defaultdict(lambda: [0, 0, 0])
+    for user_id, team_ids in teams.items():
+        for row in rows[user_id]:
+            for team_id in team_ids:
+                days[team_id, row['day']][0] += row['total'] or 0
+                days[team_id, row['day']][1] += row['entries']
+                totals[team_id][0] += row['total'] or 0
+                totals[team_id][1] += row['entries']
+    _apply(days, totals)
+
+
+def _member_deltas(membership, sign):
+    """What the membership's user adds to its team (sign=1) or takes off it (sign=-1)."""
+    user_stats = stats.get(membership.user_id)
+    days = {
+        (membership.team_id, row['day']): [sign * (row['total'] or 0), sign * row['entries']]
+        for row in _user_days([membership.user_id])
+    }
+    totals = {membership.team_id: [
+        sign * user_stats.total_emission, sign * user_stats.entries_count, sign,
+    ]}
+    return days, totals
+
+
+def join(user, team):
+    """Add user to team and their history to its totals; returns the Membership."""
+    with transaction.atomic(), routers.read_from_replica(False):
+        membership = Membership.objects.create(user=user, team=team)
+        _apply(*_member_deltas(membership, 1))
+    return membership
+
+
+def leave(membership):
+    """End a membership and take the user's history off the team's totals."""
+    with transaction.atomic(), routers.read_from_replica(False):
+        _apply(*_member_deltas(membership, -1))
+        membership.delete()
+        TeamDailyTotal.objects.filter(team_id=membership.team_id, entries_count__lte=0).delete()
+
+
+def move(membership):
+    """Save a membership whose user or team was changed, moving the history from the old team to the new."""
+    with transaction.atomic(), routers.read_from_replica(False):
+        old = Membership.objects.get(pk=membership.pk)
+        _apply(*_member_deltas(old, -1))
+        membership.save()
+        _apply(*_member_deltas(membership, 1))
+        TeamDailyTotal.objects.filter(team_id=old.team_id, entries_count__lte=0).delete()
+    return membership
+
+
+def delete_users(queryset):
+    """Delete users and take them off their teams' totals."""
+    with transaction.atomic(), routers.read_from_replica(False):
+        team_ids = set(Membership.objects.filter(user__in=queryset).values_list('team_id', flat=True))
+        # The cascade deletes the memberships without leave(), so their teams are recomputed
+        queryset.delete()
+        rebuild(team_ids)
+
+
+def rebuild(team_ids):
+    """Recompute the teams' rollups, and their organizations' sums, from scratch."""
+    team_ids = set(team_ids)
+    if not team_ids:
+        return
+    with transaction.atomic(), routers.read_from_replica(False):
+        teams = {team.pk: team for team in Team.objects.select_for_update().filter(pk__in=team_ids).order_by('pk')}
+        members = defaultdict(list)
+        for team_id, user_id in Membership.objects.filter(team_id__in=teams).values_list('team_id', 'user_id'):
+            members[team_id].append(user_id)
+        stats.ensure(user_id for user_ids in members.values() for user_id in user_ids)
+
+        for team in teams.values():
+            team.member_count = len(members[team.pk])
+            team.total_emission, team.entries_count = 0, 0
+        lifetime = UserStats.objects.filter(user__memberships__team_id__in=teams).order_by().values(
+            'user__memberships__team_id',
+        ).annotate(total=Sum('total_emission'), entries=Sum('entries_count'))
+        for row in lifetime:
+            team = teams[row['user__memberships__team_id']]
+            team.total_emission, team.entries_count = row['total'] or 0, row['entries'] or 0
+        Team.objects.bulk_update(teams.values(), ['member_count', 'total_emission', 'entries_count'])
+
+        TeamDailyTotal.objects.filter(team_id__in=teams).delete()
+        days = (
+            CarbonFootprint.objects.filter(user__memberships__team_id__in=teams)
+            .annotate(day=TruncDate('created_at'))
+            .order_by().values('user__memberships__team_id', 'day')
+            .annotate(total=Sum('total_emission'), entries=Count('id'))
+        )
+        TeamDailyTotal.objects.bulk_create([
+            TeamDailyTotal(
+                team_id=row['user__memberships__team_id'], day=row['day'],
+                total_emission=row['total'] or 0, entries_count=row['entries'],
+            )
+            for row in days
+        ], batch_size=stats.BATCH_SIZE)
+
+        organization_ids = {team.organization_id for team in teams.values()}
+        sums = {
+            row['organization_id']: row
+            for row in Team.objects.filter(organization_id__in=organization_ids).order_by().values('organization_id')
+            .annotate(total=Sum('total_emission'), entries=Sum('entries_count'), members=Sum('member_count'))
+        }
+        for organization_id in organization_ids:
+            row = sums.get(organization_id, {})
+            Organization.objects.filter(pk=organization_id).update(
+                total_emission=row.get('total') or 0,
+                entries_count=row.get('entries') or 0,
+                member_count=row.get('members') or 0,
+            )
+
+
+def rebuild_for_users(user_ids):
+    """rebuild() the teams the users belong to."""
+    rebuild(Membership.objects.filter(user_id__in=set(user_ids)).values_list('team_id', flat=True))
+
+
+def leaderboard(organization, start=None):
+    """
+    The organization's teams ranked by kg CO₂ per member, lowest first.
+
+    start is the first day of the period, or None for all time. Teams
+    without members or without entries in the period are left out. Returns
+    a list of dicts with rank, the team, its totals and average.
+    """
+    teams = list(organization.teams.filter(member_count__gt=0))
+    if start is None:
+        totals = {team.pk: (team.total_emission, team.entries_count) for team in teams}
+    else:
+        totals = {
+            row['team_id']: (row['total'], row['entries'])
+            for row in TeamDailyTotal.objects.filter(team__in=teams, day__gte=start).order_by().values('team_id')
+            .annotate(total=Sum('total_emission'), entries=Sum('entries_count'))
+        }
+
+    rows = []
+    for team in teams:
+        total, entries = totals.get(team.pk, (0, 0))
+        if entries:
+            rows.append({
+                'team': team,
+                'total_emission': round(total, 2),
+                'entries_count': entries,
+                'member_count': team.member_count,
+                'average': round(total / team.member_count, 2),
+            })
+    rows.sort(key=lambda row: (row['average'], row['team'].name))
+    for rank, row in enumerate(rows, 1):
+        row['rank'] = rank
+    return rows
@@ -0,0 +1,43 @@
+from functools import lru_cache
+
+from django import template
+from django.forms.utils import flatatt
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from carbon import images
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def _srcsets(name):
+    """{format: srcset}, plus the width and height of the smallest copy."""
+    variants = images.variants(name)
+    srcsets = {}
+    for path, width, _, image_format in variants:
+        srcsets.setdefault(image_format, []).append(f'{static(path)} {width}w')
+    _, width, height, _ = variants[0]
+    return {image_format: ', '.join(entries) for image_format, entries in srcsets.items()}, width, height
+
+
+@register.simple_tag
+def responsive_image(name, alt='', sizes='100vw', **attrs):
+    """
+    <picture> with WebP and PNG srcsets for an image in carbon.images.RESPONSIVE_IMAGES.
+
+    ``sizes`` tells the browser how wide the image is shown, e.g.
+    "(min-width: 640px) 40px, 32px". Other keyword arguments (class, loading)
+    go on the <img>. Images without copies get a plain <img>.
+    """
+    if name not in images.RESPONSIVE_IMAGES:
+        return format_html('<img src="{}" alt="{}"{}>', static(name), alt, flatatt(attrs))
+    srcsets, width, height = _srcsets(name)
+    # width/height reserve the space before the image loads; CSS sets the shown size
+    attrs = {'width': width, 'height': height, 'decoding': 'async', **attrs}
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}"{}></picture>',
+        srcsets['WEBP'], sizes,
+        static(images.variant_name(name, width, 'png')), srcsets['PNG'], sizes, alt, flatatt(attrs),
+    )
@@ -0,0 +1,35 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from carbon import vendor
+
+register = template.Library()
+
+
+@register.simple_tag
+def vendor_script(name):
+    """Deferred <script> for a file in carbon.vendor.FILES: the local copy, else its CDN URL."""
+    src = static(name) if vendor.available(name) else vendor.FILES[name]
+    return format_html('<script src="{}" defer></script>', src)
+
+
+@register.simple_tag
+def font_faces():
+    """Preload and @font-face rules for the fetched Inter files, else the Google Fonts stylesheet."""
+    weights = [(weight, static(name)) for weight, name in vendor.FONT_WEIGHTS.items() if vendor.available(name)]
+    if not weights:
+        # A print stylesheet doesn't block rendering; it switches to all media once loaded
+        return format_html(
+            '<link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>'
+            '<link rel="stylesheet" href="{}" media="print" onload="this.media=\'all\'">',
+            vendor.FONT_STYLESHEET,
+        )
+    preload = format_html(
+        '<link rel="preload" href="{}" as="font" type="font/woff2" crossorigin>', weights[0][1],
+    )
+    rules = format_html_join(
+        '', "@font-face{{font-family:'Inter';font-style:normal;font-weight:{};font-display:swap;"
+        "src:url({}) format('woff2')}}", weights,
+    )
+    return preload + format_html('<style>{}</style>', rules)
@@ -0,0 +1,1267 @@
+import asyncio
+import gzip
+import json
+import os
+import re
+import statistics
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone as datetime_timezone
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import QuerySet, Sum
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from carbon import css, events, instrumentation, js, metrics, parallel, queryguard, ratelimit, routers, storage, vendor
+from carbon.middleware import StaticFilesMiddleware
+from challenges import savings
+from challenges.models import ChallengeProgress, ChallengeType, UserChallenge
+from . import benchmark, distribution, live, partitions, stats, teams, timeseries, urls as core_urls
+from .admin import CarbonFootprintAdmin
+from .models import (
+    DAILY_CALCULATIONS, CarbonFootprint, FootprintMonthlySummary, Membership, Organization, Team, TeamDailyTotal, UserStats,
+)
+
+REPLICA = settings.REPLICA_DATABASE_ALIAS
+
+
+class ReplicaRouterTests(TestCase):
+    def test_reads_stay_on_primary_without_replica_request(self):
+        router = routers.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(CarbonFootprint))
+        self.assertEqual(router.db_for_write(CarbonFootprint), 'default')
+
+    def test_only_analytics_apps_are_routed(self):
+        router = routers.ReplicaRouter()
+        with routers.read_from_replica():
+            self.assertIsNone(router.db_for_read(User))
+            self.assertEqual(router.db_for_read(CarbonFootprint), routers.replica_alias())
+
+
+@skipUnless(REPLICA in settings.DATABASES, 'set DJANGO_REPLICA_NAME to run the replica tests')
+class ReplicaRoutingTests(TestCase):
+    """Runs against two independent databases, so 'replication' never happens."""
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()  # rate-limit counters outlive the rolled-back rows
+        self.user = User.objects.create_user('alice', password='testpass123')
+        User.objects.using(REPLICA).create(id=self.user.id, username='alice')
+        self.client.force_login(self.user)
+
+    def save_on_replica(self, footprint):
+        # With real replication the footprint's UserStats row would follow it
+        footprint.save(using=REPLICA)
+        UserStats(user_id=self.user.id, total_emission=footprint.total_emission, entries_count=1).save(using=REPLICA)
+
+    def test_leaderboard_reads_from_replica(self):
+        self.save_on_replica(CarbonFootprint(user_id=self.user.id, car_travel_km=10))
+        response = self.client.get(reverse('leaderboard'), {'period': 'all'})
+        self.assertEqual(response.context['total_users'], 1)
+
+    def test_reads_pinned_to_primary_after_write(self):
+        response = self.client.get(reverse('dashboard'), {'period': 'all'})
+        self.assertEqual(response.context['total_entries'], 0)
+
+        response = self.client.post(reverse('track'), {
+            'car_travel_km': 10, 'fuel_type': 'petrol', 'flights_hours': 0,
+            'public_transport_km': 0, 'meals_per_day': 3, 'meal_type': 'medium',
+            'electricity_kwh': 0, 'waste_kg': 0, 'waste_type': 'medium',
+        })
+        self.assertIn('replica_pin', response.cookies)
+
+        response = self.client.get(reverse('dashboard'), {'period': 'all'})
+        self.assertEqual(response.context['total_entries'], 1)
+
+    def test_async_views_read_from_replica_until_a_write(self):
+        self.async_client.force_login(self.user)
+        self.save_on_replica(CarbonFootprint(user_id=self.user.id, car_travel_km=10))
+        with benchmark.deployment(asgi=True):
+            get = async_to_sync(self.async_client.get)
+            self.assertEqual(get(reverse('leaderboard'), {'period': 'all'}).context['total_users'], 1)
+
+            response = async_to_sync(self.async_client.post)(reverse('track'), TRACK_FORM)
+            self.assertIn('replica_pin', response.cookies)
+            # Pinned to the primary, the client sees the footprint it just saved
+            self.assertEqual(get(reverse('dashboard'), {'period': 'all'}).context['total_entries'], 1)
+
+
+# Keep every read on the primary even when a replica alias is configured
+primary_only = override_settings(REPLICA_READ_VIEWS=[])
+
+
+@primary_only
+class ArchiveFootprintsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='testpass123')
+        self.client.force_login(self.user)
+        for km in (10, 20, 30):
+            CarbonFootprint.objects.create(user=self.user, car_travel_km=km, meal_type='heavy', waste_kg=5)
+        # Age two of the entries past the retention window
+        old = timezone.now() - timedelta(days=400)
+        CarbonFootprint.objects.filter(car_travel_km__lt=30).update(created_at=old)
+
+    def test_all_time_views_unchanged_by_compaction(self):
+        before_dashboard = self.client.get(reverse('dashboard'), {'period': 'all'}).context
+        before_ranked = self.client.get(reverse('leaderboard'), {'period': 'all'}).context['ranked']
+        before_chart = self.client.get(reverse('chart_data'), {'bucket': 'month'}).json()
+
+        with tempfile.TemporaryDirectory() as export_dir, self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_footprints', export_dir=export_dir, stdout=StringIO())
+            self.assertEqual(len(os.listdir(export_dir)), 1)
+
+        self.assertEqual(CarbonFootprint.objects.count(), 1)
+        self.assertEqual(FootprintMonthlySummary.objects.get().entries_count, 2)
+
+        after_dashboard = self.client.get(reverse('dashboard'), {'period': 'all'}).context
+        after_ranked = self.client.get(reverse('leaderboard'), {'period': 'all'}).context['ranked']
+        self.assertEqual(after_dashboard['total_entries'], before_dashboard['total_entries'])
+        for category, value in before_dashboard['breakdown'].items():
+            self.assertAlmostEqual(after_dashboard['breakdown'][category], value)
+        self.assertEqual(after_ranked, before_ranked)
+        # The chart's months now come from the summary, under a new cache version
+        after_chart = self.client.get(reverse('chart_data'), {'bucket': 'month'}).json()
+        self.assertEqual(after_chart['series'], before_chart['series'])
+
+
+class PartitionTests(TestCase):
+    def test_month_helpers(self):
+        utc = datetime_timezone.utc
+        december = datetime(2024, 12, 1, tzinfo=utc)
+        self.assertEqual(partitions.add_months(december, 1), datetime(2025, 1, 1, tzinfo=utc))
+        self.assertEqual(partitions.add_months(december, -12), datetime(2023, 12, 1, tzinfo=utc))
+        self.assertEqual(partitions.add_months(datetime(2025, 3, 1, tzinfo=utc), -3), december)
+        self.assertEqual(partitions.month_start(datetime(2025, 2, 28, 23, 59, tzinfo=utc)), datetime(2025, 2, 1, tzinfo=utc))
+        self.assertEqual(partitions.partition_name(datetime(2025, 2, 1, tzinfo=utc)), 'core_carbonfootprint_p2025_02')
+
+    @skipUnless(connection.vendor != 'postgresql', 'checks the error on other databases')
+    def test_command_needs_postgresql(self):
+        with self.assertRaisesMessage(CommandError, 'only available on PostgreSQL'):
+            call_command('manage_partitions', stdout=StringIO())
+
+    # The rest needs the partitioned table of migration 0004: run with DJANGO_DB_ENGINE=postgresql
+
+    @skipUnless(connection.vendor == 'postgresql', 'partitioning is PostgreSQL-only')
+    def test_migration_partitions_by_month(self):
+        self.assertTrue(partitions.is_partitioned(connection))
+        this_month = partitions.month_start(timezone.now())
+        self.assertIn(this_month, partitions.list_partitions(connection))
+        # Inserts through the ORM land in the month's partition
+        user = User.objects.create_user('alice')
+        footprint = CarbonFootprint.objects.create(user=user, car_travel_km=10)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM {partitions.partition_name(this_month)}')
+            self.assertEqual(cursor.fetchall(), [(footprint.pk,)])
+
+    def keys(self):
+        """(primary key columns, tables referenced by foreign keys, the id column's sequence)."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT a.attname FROM pg_index i JOIN pg_attribute a "
+                "ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey) "
+                "WHERE i.indrelid = %s::regclass AND i.indisprimary ORDER BY a.attname",
+                [partitions.TABLE],
+            )
+            primary_key = [row[0] for row in cursor.fetchall()]
+            cursor.execute(
+                "SELECT confrelid::regclass::text FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+                [partitions.TABLE],
+            )
+            references = [row[0] for row in cursor.fetchall()]
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [partitions.TABLE])
+            return primary_key, references, cursor.fetchone()[0]
+
+    @skipUnless(connection.vendor == 'postgresql', 'partitioning is PostgreSQL-only')
+    def test_migration_recreates_the_keys_both_ways(self):
+        sequence = f'public.{partitions.SEQUENCE}'
+        self.assertEqual(self.keys(), (['created_at', 'id'], ['auth_user'], sequence))
+        user = User.objects.create_user('alice')
+        kept = CarbonFootprint.objects.create(user=user, car_travel_km=10)
+
+        # The reverse of migration 0004, then the forward again; DDL is rolled back with the test
+        partitions.convert_to_plain(connection)
+        self.assertFalse(partitions.is_partitioned(connection))
+        self.assertEqual(self.keys(), (['id'], ['auth_user'], sequence))
+        partitions.convert_to_partitioned(connection)
+        self.assertTrue(partitions.is_partitioned(connection))
+        self.assertEqual(self.keys(), (['created_at', 'id'], ['auth_user'], sequence))
+
+        # The rows survive, and new ids carry on from the sequence
+        self.assertEqual(list(CarbonFootprint.objects.values_list('id', flat=True)), [kept.pk])
+        self.assertGreater(CarbonFootprint.objects.create(user=user, car_travel_km=5).pk, kept.pk)
+
+    @skipUnless(connection.vendor == 'postgresql', 'partitioning is PostgreSQL-only')
+    def test_retired_partitions_are_compacted_before_dropping(self):
+        user = User.objects.create_user('alice')
+        old_month = partitions.add_months(partitions.month_start(timezone.now()), -6)
+        if old_month not in partitions.list_partitions(connection):
+            with connection.cursor() as cursor:
+                partitions.create_partition(cursor, old_month)
+        CarbonFootprint.objects.create(user=user, car_travel_km=10, created_at=old_month + timedelta(days=10))
+        stats.rebuild([user.id])
+        before = stats.get(user.id)
+
+        with tempfile.TemporaryDirectory() as export_dir:
+            call_command('manage_partitions', retain_months=3, archive_dir=export_dir, stdout=StringIO())
+            self.assertEqual(len(os.listdir(export_dir)), 1)
+
+        self.assertNotIn(old_month, partitions.list_partitions(connection))
+        self.assertEqual(FootprintMonthlySummary.objects.get(user=user).entries_count, 1)
+        stats.rebuild([user.id])
+        after = stats.get(user.id)
+        self.assertEqual((after.entries_count, after.total_emission), (before.entries_count, before.total_emission))
+
+
+@primary_only
+class RequestTimingTests(TestCase):
+    def setUp(self):
+        instrumentation.window.clear()
+        self.user = User.objects.create_user('alice', password='testpass123')
+        CarbonFootprint.objects.create(user=self.user, car_travel_km=10)
+
+    @override_settings(INSTRUMENTATION_SLOW_REQUEST_MS=0)
+    def test_server_timing_only_for_staff(self):
+        self.client.force_login(self.user)
+        with self.assertLogs('carbon.requests', 'WARNING') as logs, self.settings(DEBUG=True):
+            response = self.client.get(reverse('dashboard'))
+        self.assertNotIn('Server-Timing', response)
+        with self.assertLogs('carbon.requests', 'WARNING'), self.settings(SERVER_TIMING_PUBLIC=True):
+            self.assertIn('Server-Timing', self.client.get(reverse('dashboard')))
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['url_name'], 'dashboard')
+        self.assertGreater(line['queries'], 0)
+        self.assertIn('template_ms', line)
+        self.assertTrue(any(q['origin'].startswith('core.views:dashboard:') for q in line['slow_queries']))
+
+        self.user.is_staff = True
+        self.user.save()
+        with self.assertLogs('carbon.requests', 'WARNING'):
+            response = self.client.get(reverse('dashboard'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", template;dur=')
+
+    def test_summary_page_is_staff_only(self):
+        self.client.force_login(self.user)
+        with self.assertLogs('carbon.requests', 'INFO'):
+            self.client.get(reverse('leaderboard'))
+        self.assertEqual(self.client.get(reverse('performance_summary')).status_code, 302)
+
+        self.user.is_staff = True
+        self.user.save()
+        rows = self.client.get(reverse('performance_summary'), {'format': 'json'}).json()['results']
+        self.assertIn('leaderboard', [row['url_name'] for row in rows])
+
+
+@primary_only
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()  # rate-limit counters outlive the rolled-back rows
+        for metric in metrics.REGISTRY.values():
+            metric.clear()
+        self.user = User.objects.create_user('alice', password='testpass123')
+        self.client.force_login(self.user)
+
+    def test_track_saves_and_rejections_are_counted(self):
+        form = {
+            'car_travel_km': 10, 'fuel_type': 'petrol', 'flights_hours': 0, 'public_transport_km': 0,
+            'meals_per_day': 3, 'meal_type': 'medium', 'electricity_kwh': 100, 'waste_kg': 5, 'waste_type': 'low',
+        }
+        for _ in range(4):
+            self.client.post(reverse('track'), form)
+        self.client.get(reverse('dashboard'), {'period': 'weekly'})
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('carbon_footprint_saves_total{source="track"} 3', body)
+        self.assertIn('carbon_daily_limit_rejections_total 1', body)
+        self.assertIn('carbon_view_latency_seconds_count{view="dashboard",period="weekly"} 1', body)
+        self.assertIn('carbon_view_latency_seconds_bucket{view="dashboard",period="weekly",le="+Inf"} 1', body)
+
+    def test_private_by_default(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_token_lets_scrapers_in(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_snapshots_from_other_workers_are_summed(self):
+        with tempfile.TemporaryDirectory() as metrics_dir, override_settings(METRICS_DIR=metrics_dir):
+            metrics.CHALLENGE_JOINS.inc(category='food')
+            with open(os.path.join(metrics_dir, 'metrics_999999.json'), 'w') as fh:
+                json.dump({'carbon_challenge_joins_total': {'["food"]': 2}}, fh)
+            self.assertIn('carbon_challenge_joins_total{category="food"} 3', metrics.render())
+
+    def test_snapshots_are_written_off_the_request_thread(self):
+        written, threads = threading.Event(), []
+
+        def flush():
+            threads.append(threading.get_ident())
+            written.set()
+
+        with tempfile.TemporaryDirectory() as metrics_dir, \
+                override_settings(METRICS_DIR=metrics_dir, METRICS_FLUSH_SECONDS=0.01), \
+                mock.patch.object(metrics, '_flusher_pid', None), mock.patch.object(metrics, 'flush', flush):
+            metrics.CHALLENGE_JOINS.inc(category='food')
+            self.assertTrue(written.wait(5))
+        self.assertNotIn(threading.get_ident(), threads)
+
+
+@primary_only
+class QueryGuardTests(TestCase):
+    def test_parameter_lists_share_a_shape(self):
+        self.assertEqual(
+            queryguard.shape('SELECT 1 FROM t WHERE id IN (%s, %s, %s)'),
+            queryguard.shape('SELECT 1 FROM t WHERE id IN (%s)'),
+        )
+
+    def test_repeated_queries_are_reported_with_their_origin(self):
+        user = User.objects.create_user('alice')
+        with instrumentation.collect(guard=True) as stats, connection.execute_wrapper(instrumentation.record_queries):
+            for _ in range(3):
+                list(CarbonFootprint.objects.filter(user=user))
+        (finding,) = queryguard.findings(stats)
+        self.assertEqual((finding['kind'], finding['count']), ('n+1', 3))
+
+    @override_settings(QUERY_GUARD='warn', QUERY_GUARD_REPEAT_THRESHOLD=1)
+    def test_warn_mode_warns_instead_of_raising(self):
+        user = User.objects.create_user('alice', password='testpass123')
+        self.client.force_login(user)
+        with self.assertWarns(queryguard.QueryGuardWarning):
+            self.client.get(reverse('leaderboard'))
+
+
+TRACK_FORM = {
+    'car_travel_km': 10, 'fuel_type': 'petrol', 'flights_hours': 0, 'public_transport_km': 0,
+    'meals_per_day': 3, 'meal_type': 'medium', 'electricity_kwh': 100, 'waste_kg': 5, 'waste_type': 'low',
+}
+
+
+def create_view_data():
+    """Footprints for several users and a few joined challenges with progress; returns the viewing user."""
+    user = User.objects.create_user('alice', password='testpass123', is_staff=True)
+    now = timezone.now()
+    for i, name in enumerate(['bob', 'carol', 'dave', 'erin']):
+        other = User.objects.create_user(name)
+        CarbonFootprint.objects.bulk_create(
+            CarbonFootprint(user=other, car_travel_km=i * 10, total_emission=i * 10, created_at=now - timedelta(days=day))
+            for day in range(3)
+        )
+    for day in range(1, 6):
+        CarbonFootprint.objects.create(user=user, car_travel_km=day * 5, created_at=now - timedelta(days=day * 10))
+    challenge_types = [
+        ChallengeType.objects.create(
+            title=f'Challenge {i}', description='', category='food', duration_type='weekly',
+            duration_days=7, carbon_impact=1, difficulty_level=1,
+        )
+        for i in range(4)
+    ]
+    for challenge_type in challenge_types:
+        user_challenge = UserChallenge.objects.create(user=user, challenge_type=challenge_type)
+        for day in range(3):
+            ChallengeProgress.objects.create(
+                user_challenge=user_challenge, date=now.date() - timedelta(days=day), completed=True, carbon_saved=1,
+            )
+    # bulk_create and create() skip the running sums, like the synthetic data generator
+    savings.rebuild(User.objects.values_list('id', flat=True))
+    return user
+
+
+@primary_only
+@override_settings(GEMINI_API_KEY=None)
+class CoreViewQueryTests(TestCase):
+    """Every view in core.urls, with enough data to expose per-row queries (the test runner raises on them)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_view_data()
+
+    def setUp(self):
+        cache.clear()  # rate-limit counters outlive the rolled-back rows
+        self.client.force_login(self.user)
+
+    def test_every_core_url_is_covered(self):
+        tested = {name.removeprefix('test_') for name in dir(self) if name.startswith('test_')}
+        self.assertLessEqual({pattern.name for pattern in core_urls.urlpatterns}, tested)
+
+    def test_landing(self):
+        self.assertEqual(self.client.get(reverse('landing')).status_code, 200)
+
+    def test_register(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('register')).status_code, 200)
+        response = self.client.post(reverse('register'), {
+            'username': 'frank', 'email': 'frank@example.com',
+            'password1': 'a-long-passphrase-1', 'password2': 'a-long-passphrase-1',
+        })
+        self.assertEqual(response.status_code, 302)
+
+    def test_track(self):
+        self.assertEqual(self.client.get(reverse('track')).status_code, 200)
+        self.assertEqual(self.client.post(reverse('track'), TRACK_FORM).status_code, 302)
+
+    def test_dashboard(self):
+        for period in ('daily', 'weekly', 'monthly', 'all'):
+            self.assertEqual(self.client.get(reverse('dashboard'), {'period': period}).status_code, 200)
+
+    def test_leaderboard(self):
+        for period in ('daily', 'weekly', 'monthly', 'all'):
+            self.assertEqual(self.client.get(reverse('leaderboard'), {'period': period}).status_code, 200)
+
+    def test_leaderboard_stats(self):
+        for period in ('daily', 'weekly', 'monthly', 'all'):
+            data = self.client.get(reverse('leaderboard_stats'), {'period': period}).json()
+            self.assertEqual(sum(bucket['count'] for bucket in data['histogram']), data['count'])
+        self.assertEqual(data['count'], 5)
+        self.assertIsNotNone(data['you'])
+
+    @override_settings(EVENTS_STREAM_SECONDS=5, EVENTS_KEEPALIVE_SECONDS=5)
+    def test_event_stream(self):
+        # A WSGI worker would be held for the whole stream
+        self.assertEqual(self.client.get(reverse('event_stream')).status_code, 501)
+        self.async_client.force_login(self.user)
+
+        async def read():
+            response = await self.async_client.get(
+                reverse('event_stream'), {'channels': 'leaderboard'}, headers={'accept-encoding': 'gzip'},
+            )
+            chunks = aiter(response.streaming_content)
+            first = await anext(chunks)
+            events.broker.broadcast(live.LEADERBOARD, {'type': 'rank', 'user_id': self.user.id})
+            events.broker.broadcast(live.user_channel(self.user.id), {'type': 'progress'})
+            second = await anext(chunks)
+            await chunks.aclose()
+            return response, first, second
+
+        response, first, second = async_to_sync(read)()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(first, b'retry: 3000\n\n')
+        self.assertEqual(second, f'event: rank\ndata: {{"type": "rank", "user_id": {self.user.id}}}\n\n'.encode())
+        self.assertEqual(events.broker.subscriber_count(), 0)
+        self.assertEqual(async_to_sync(self.async_client.get)(reverse('event_stream'), {'channels': 'x'}).status_code, 400)
+
+    def test_team_leaderboard(self):
+        self.assertEqual(self.client.get(reverse('team_leaderboard')).status_code, 200)
+        organization = Organization.objects.create(name='Acme', slug='acme')
+        for name, usernames in [('Red', ['alice', 'bob']), ('Blue', ['carol', 'dave', 'erin'])]:
+            team = Team.objects.create(organization=organization, name=name, slug=name.lower())
+            for username in usernames:
+                teams.join(User.objects.get(username=username), team)
+        for period in ('daily', 'weekly', 'monthly', 'all'):
+            response = self.client.get(reverse('team_leaderboard'), {'period': period})
+            self.assertEqual(len(response.context['ranked']), 2)
+        self.assertEqual(self.client.get(reverse('team_leaderboard'), {'org': 'other'}).status_code, 404)
+
+    def test_tips_api(self):
+        payload = json.dumps({'result': 120, 'emission_breakdown': {'total': 120, 'food': 80}})
+        response = self.client.post(reverse('tips_api'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_ai_tips_api(self):
+        response = self.client.post(reverse('ai_tips_api'), json.dumps(TRACK_FORM), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_chart_data(self):
+        response = self.client.get(reverse('chart_data'), {'bucket': 'day'})
+        self.assertEqual(response.json()['buckets'], 5)
+        self.assertEqual(self.client.get(reverse('chart_data'), {'bucket': 'hour'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('chart_data'), {'start': 'yesterday'}).status_code, 400)
+
+    def test_export_footprints(self):
+        response = self.client.get(reverse('export_footprints'), {'all': '1'})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 18)
+
+    def test_import_footprints(self):
+        rows = '\n'.join(json.dumps(TRACK_FORM) for _ in range(5))
+        upload = SimpleUploadedFile('rows.jsonl', rows.encode())
+        response = self.client.post(reverse('import_footprints'), {'file': upload})
+        self.assertEqual(response.json()['created'], 5)
+
+
+@primary_only
+class ChartDataTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='testpass123')
+        self.client.force_login(self.user)
+        now = timezone.now()
+        CarbonFootprint.objects.bulk_create(
+            CarbonFootprint(user=self.user, car_travel_km=day, total_emission=day, created_at=now - timedelta(days=day))
+            for day in range(200)
+        )
+
+    def test_lttb_keeps_the_ends_and_the_peaks(self):
+        ys = [0] * 100
+        ys[37] = 50
+        keep = timeseries.lttb(list(range(100)), ys, 10)
+        self.assertEqual(len(keep), 10)
+        self.assertEqual((keep[0], keep[-1]), (0, 99))
+        self.assertIn(37, keep)
+        self.assertEqual(timeseries.lttb([1, 2], [1, 2], 10), [0, 1])
+
+    def test_buckets_and_downsampling(self):
+        days = timeseries.series(self.user.id, bucket='day', points=1000)
+        self.assertEqual((days['buckets'], days['downsampled']), (200, False))
+        self.assertAlmostEqual(sum(days['series']['total']), sum(range(200)))
+
+        downsampled = timeseries.series(self.user.id, bucket='day', points=50)
+        self.assertEqual((len(downsampled['labels']), downsampled['downsampled']), (50, True))
+        self.assertEqual(downsampled['labels'][-1], days['labels'][-1])
+
+        # 200 days is too many for day buckets and few enough for weeks
+        weeks = timeseries.series(self.user.id)
+        self.assertEqual(weeks['bucket'], 'week')
+        self.assertAlmostEqual(sum(weeks['series']['total']), sum(range(200)))
+        self.assertEqual(sum(weeks['series']['entries']), 200)
+
+    def test_months_include_archived_summaries(self):
+        FootprintMonthlySummary.objects.create(
+            user=self.user, month=timezone.localdate().replace(year=2020, day=1), total_emission=50,
+            entries_count=2, first_created_at=timezone.now(), last_created_at=timezone.now(),
+        )
+        month = timezone.localdate().replace(year=2020, day=1).isoformat()
+        months = timeseries.series(self.user.id, bucket='month')
+        self.assertEqual(months['labels'][0], month)
+        self.assertEqual(months['series']['total'][0], 50)
+        self.assertEqual(sum(months['series']['entries']), 202)
+        self.assertEqual(timeseries.series(self.user.id, bucket='day')['archived_through'], month)
+
+    def test_cached_until_the_user_tracks_again(self):
+        url = reverse('chart_data')
+        first = self.client.get(url, {'bucket': 'day', 'points': 1000}).json()
+        CarbonFootprint.objects.create(user=self.user, car_travel_km=5)
+        self.assertEqual(self.client.get(url, {'bucket': 'day', 'points': 1000}).json(), first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('track'), TRACK_FORM)
+        fresh = self.client.get(url, {'bucket': 'day', 'points': 1000}).json()
+        self.assertEqual(sum(fresh['series']['entries']), 202)
+
+
+@primary_only
+class UserStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='testpass123')
+        self.client.force_login(self.user)
+
+    def assertMatchesRebuild(self):
+        """The incrementally kept row equals one rebuilt from scratch."""
+        kept = UserStats.objects.get(user=self.user)
+        rebuilt = stats.rebuild([self.user.id])[self.user.id]
+        for field in stats.FIELDS[:-1]:
+            self.assertAlmostEqual(getattr(kept, field), getattr(rebuilt, field), msg=field)
+        return kept
+
+    def test_streak(self):
+        today = timezone.localdate()
+        days = [today - timedelta(days=n) for n in (0, 1, 2, 4, 5)]
+        self.assertEqual(stats.streak(days), (3, today))
+        self.assertEqual(stats.streak([]), (0, None))
+
+    def test_tracking_and_imports_keep_stats_current(self):
+        self.client.post(reverse('track'), TRACK_FORM)
+        kept = self.assertMatchesRebuild()
+        self.assertEqual((kept.entries_count, kept.current_streak), (1, 1))
+
+        # Backdated days right before the streak join it, through a recompute
+        now = timezone.now()
+        rows = [
+            {**TRACK_FORM, 'created_at': (now - timedelta(days=days)).isoformat()}
+            for days in (1, 3, 2, 30)
+        ]
+        upload = SimpleUploadedFile('rows.jsonl', '\n'.join(json.dumps(row) for row in rows).encode())
+        self.client.post(reverse('import_footprints'), {'file': upload})
+        kept = self.assertMatchesRebuild()
+        self.assertEqual((kept.entries_count, kept.current_streak), (5, 4))
+
+    def test_imports_count_today_against_the_daily_limit(self):
+        self.client.post(reverse('track'), TRACK_FORM)
+        rows = [TRACK_FORM] * 7 + [{**TRACK_FORM, 'created_at': (timezone.now() - timedelta(days=2)).isoformat()}]
+        upload = SimpleUploadedFile('rows.jsonl', '\n'.join(json.dumps(row) for row in rows).encode())
+        report = self.client.post(reverse('import_footprints'), {'file': upload}).json()
+        # One was tracked today, so limit - 1 more fit; the backdated row isn't capped
+        limit = DAILY_CALCULATIONS.rate.limit
+        self.assertEqual((report['created'], report['invalid']), (limit, 8 - limit))
+        self.assertIn('Daily calculation limit reached', report['errors'][0]['errors']['created_at'][0])
+        response = self.client.post(reverse('track'), TRACK_FORM, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 429)
+
+    def test_admin_deletes_rebuild_stats(self):
+        self.client.post(reverse('track'), TRACK_FORM)
+        footprint = CarbonFootprint.objects.get()
+        admin = CarbonFootprintAdmin(CarbonFootprint, None)
+        admin.delete_queryset(None, CarbonFootprint.objects.filter(pk=footprint.pk))
+        kept = self.assertMatchesRebuild()
+        self.assertEqual((kept.entries_count, kept.total_emission, kept.current_streak), (0, 0, 0))
+
+    def test_reads_build_missing_rows(self):
+        CarbonFootprint.objects.create(user=self.user, car_travel_km=10)
+        response = self.client.get(reverse('dashboard'), {'period': 'all'})
+        self.assertEqual(response.context['total_entries'], 1)
+        self.assertEqual(UserStats.objects.get(user=self.user).entries_count, 1)
+
+    def test_rebuild_command(self):
+        CarbonFootprint.objects.create(user=self.user, car_travel_km=10)
+        out = StringIO()
+        call_command('rebuild_user_stats', stdout=out)
+        self.assertIn('Rebuilt stats for 1 users', out.getvalue())
+        self.assertEqual(UserStats.objects.get(user=self.user).entries_count, 1)
+
+
+@primary_only
+class LiveEventTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='testpass123')
+        self.client.force_login(self.user)
+        for name, total in [('bob', 5), ('carol', 500)]:
+            UserStats.objects.create(user=User.objects.create_user(name), total_emission=total, entries_count=1)
+
+    def track(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('track'), TRACK_FORM)
+
+    def listen(self, write, count=1):
+        async def listen():
+            with events.subscribe({live.LEADERBOARD}) as subscription:
+                await sync_to_async(write)()
+                return [(await asyncio.wait_for(subscription.get(), 1))[1] for _ in range(count)]
+        return async_to_sync(listen)()
+
+    def test_tracking_publishes_rank_changes(self):
+        # Nobody listens: nothing is computed
+        with mock.patch.object(live, 'UserStats') as user_stats:
+            self.track()
+        user_stats.objects.filter.assert_not_called()
+
+        [first] = self.listen(self.track)
+        self.assertEqual((first['type'], first['username']), ('rank', 'alice'))
+        total = UserStats.objects.get(user=self.user).total_emission
+        self.assertEqual(first['total'], round(total, 2))
+        self.assertEqual((first['previous_rank'], first['rank']), (2, 2 if total < 500 else 3))
+
+    def test_ties_rank_by_username_like_the_leaderboard(self):
+        self.track()
+        total = UserStats.objects.get(user=self.user).total_emission
+        for name in ('aaron', 'zoe'):
+            UserStats.objects.create(user=User.objects.create_user(name), total_emission=total, entries_count=1)
+
+        def ranks():
+            ranked = self.client.get(reverse('leaderboard'), {'period': 'all'}).context['ranked']
+            return {row['username']: row['rank'] for row in ranked}
+
+        # Tied with aaron and zoe, alice is shown between them
+        before = ranks()
+        self.assertEqual(before['aaron'] + 1, before['alice'])
+        [event] = self.listen(self.track)
+        self.assertEqual((event['previous_rank'], event['rank']), (before['alice'], ranks()['alice']))
+
+    def test_ranks_are_counted_after_the_commit(self):
+        with mock.patch.object(events, 'has_listeners', return_value=True), \
+                mock.patch.object(live, 'UserStats') as user_stats, \
+                self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse('track'), TRACK_FORM)
+            # Not on the write path: nothing is read until the commit
+            user_stats.objects.filter.assert_not_called()
+        self.assertTrue(callbacks)
+
+    def test_slow_subscribers_are_told_to_reset(self):
+        def flood():
+            for i in range(5):
+                events.broker.broadcast(live.LEADERBOARD, {'type': 'rank', 'user_id': i})
+
+        with override_settings(EVENTS_QUEUE_SIZE=2):
+            received = self.listen(flood, count=3)
+        self.assertEqual([event['type'] for event in received], ['rank', 'rank', 'reset'])
+
+
+@primary_only
+class DistributionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.totals = [3.0, 1.0, 4.0, 1.0, 5.0, 9.0, 2.0, 6.0, 5.0, 3.0, 5.0]
+        for i, total in enumerate(self.totals):
+            user = User.objects.create_user(f'user{i}')
+            UserStats.objects.create(user=user, total_emission=total, entries_count=1)
+        self.per_user = stats.user_totals()
+
+    def test_summary_matches_percentile_cont(self):
+        summary = distribution.summary(self.per_user, buckets=4)
+        # percentile_cont interpolates like the 'inclusive' method
+        p10, *_, p90 = statistics.quantiles(self.totals, n=10, method='inclusive')
+        self.assertEqual((summary['p10'], summary['median'], summary['p90']), (round(p10, 2), 4.0, round(p90, 2)))
+        self.assertEqual((summary['count'], summary['sum'], summary['min'], summary['max']), (11, 44, 1, 9))
+        self.assertEqual([bucket['count'] for bucket in summary['histogram']], [3, 3, 4, 1])
+        self.assertEqual(summary['histogram'][-1]['end'], 9)
+
+    def test_user_standing_and_cache(self):
+        user = User.objects.get(username='user2')  # 4.0: five users below, five above
+        self.assertEqual(distribution.user_standing(self.per_user, user.id), {'total': 4.0, 'percentile': 50.0})
+        self.assertIsNone(distribution.user_standing(self.per_user, User.objects.create_user('new').id))
+
+        cached = distribution.cached_summary('all', self.per_user)
+        UserStats.objects.filter(user=user).update(total_emission=100)
+        self.assertEqual(distribution.cached_summary('all', self.per_user), cached)
+        self.assertEqual(distribution.summary(self.per_user)['max'], 100)
+
+    def test_empty_period(self):
+        future = CarbonFootprint.objects.filter(created_at__gte=timezone.now() + timedelta(days=1))
+        summary = distribution.summary(future.values('user_id').annotate(total=Sum('total_emission')))
+        self.assertEqual((summary['count'], summary['median'], summary['histogram']), (0, None, []))
+
+
+@primary_only
+class TeamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='testpass123')
+        self.client.force_login(self.user)
+        self.organization = Organization.objects.create(name='Acme', slug='acme')
+        self.red = Team.objects.create(organization=self.organization, name='Red', slug='red')
+        self.blue = Team.objects.create(organization=self.organization, name='Blue', slug='blue')
+
+    def rollups(self):
+        days = list(TeamDailyTotal.objects.order_by('team', 'day').values_list('team', 'day', 'total_emission', 'entries_count'))
+        team_rows = list(Team.objects.order_by('pk').values_list('member_count', 'total_emission', 'entries_count'))
+        organization = Organization.objects.values_list('member_count', 'total_emission', 'entries_count').get()
+        return days, team_rows, organization
+
+    def assertMatchesRebuild(self):
+        kept = self.rollups()
+        teams.rebuild([self.red.pk, self.blue.pk])
+        self.assertEqual(kept, self.rollups())
+        return kept
+
+    def test_join_track_and_leave_keep_rollups(self):
+        CarbonFootprint.objects.create(user=self.user, car_travel_km=10, created_at=timezone.now() - timedelta(days=40))
+        membership = teams.join(self.user, self.red)
+        bob = User.objects.create_user('bob')
+        teams.join(bob, self.blue)
+        days, team_rows, organization = self.assertMatchesRebuild()
+        self.assertEqual(len(days), 1)
+        self.assertEqual(organization[:1], (2,))
+
+        self.client.post(reverse('track'), TRACK_FORM)
+        days, team_rows, organization = self.assertMatchesRebuild()
+        self.assertEqual([row[3] for row in days], [1, 1])
+        self.assertEqual(team_rows[0][2], 2)
+
+        teams.leave(membership)
+        days, team_rows, organization = self.assertMatchesRebuild()
+        self.assertEqual(team_rows[0], (0, 0, 0))
+        self.assertEqual(organization, (1, 0, 0))
+
+    def test_leaderboard_ranks_by_average_per_member(self):
+        now = timezone.now()
+        for name, team, emissions in [('alice', self.red, [10]), ('bob', self.red, [6]), ('carol', self.blue, [9])]:
+            user = User.objects.get(username=name) if name == 'alice' else User.objects.create_user(name)
+            CarbonFootprint.objects.bulk_create(
+                CarbonFootprint(user=user, total_emission=emission, created_at=now - timedelta(days=20))
+                for emission in emissions
+            )
+            teams.join(user, team)
+        ranked = teams.leaderboard(self.organization)
+        self.assertEqual([(row['team'], row['average']) for row in ranked], [(self.red, 8), (self.blue, 9)])
+        # Nothing in the last day
+        self.assertEqual(teams.leaderboard(self.organization, timezone.localdate()), [])
+
+    def test_rebuild_command(self):
+        teams.join(self.user, self.red)
+        CarbonFootprint.objects.create(user=self.user, car_travel_km=10)
+        out = StringIO()
+        call_command('rebuild_team_totals', '--organization', 'acme', stdout=out)
+        self.assertIn('Rebuilt totals of 2 teams', out.getvalue())
+        # Days come from the footprints; all time from UserStats, which wasn't told
+        self.assertEqual(TeamDailyTotal.objects.get(team=self.red).entries_count, 1)
+        self.assertEqual(Team.objects.get(pk=self.red.pk).entries_count, 0)
+
+    def test_admin_refuses_a_second_team_in_the_organization(self):
+        teams.join(self.user, self.red)
+        admin_user = User.objects.create_superuser('root', password='testpass123')
+        self.client.force_login(admin_user)
+        response = self.client.post(reverse('admin:core_membership_add'), {'user': self.user.pk, 'team': self.blue.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('already in a team of Acme', response.context['adminform'].form.errors['team'][0])
+        self.assertEqual(Membership.objects.get().team, self.red)
+
+    def test_admin_moves_a_membership_in_place(self):
+        CarbonFootprint.objects.create(user=self.user, car_travel_km=10)
+        membership = teams.join(self.user, self.red)
+        self.client.force_login(User.objects.create_superuser('root', password='testpass123'))
+        self.client.post(
+            reverse('admin:core_membership_change', args=[membership.pk]), {'user': self.user.pk, 'team': self.blue.pk},
+        )
+        moved = Membership.objects.get()
+        self.assertEqual((moved.pk, moved.team, moved.joined_at), (membership.pk, self.blue, membership.joined_at))
+        days, team_rows, organization = self.assertMatchesRebuild()
+        self.assertEqual([row[0] for row in days], [self.blue.pk])
+        self.assertEqual([row[0] for row in team_rows], [0, 1])
+
+    def test_deleting_a_user_in_the_admin_leaves_their_team(self):
+        CarbonFootprint.objects.create(user=self.user, car_travel_km=10)
+        teams.join(self.user, self.red)
+        teams.join(User.objects.create_user('bob'), self.red)
+        self.client.force_login(User.objects.create_superuser('root', password='testpass123'))
+        self.client.post(reverse('admin:auth_user_delete', args=[self.user.pk]), {'post': 'yes'})
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        days, team_rows, organization = self.assertMatchesRebuild()
+        self.assertEqual((days, organization), ([], (1, 0, 0)))
+
+
+@primary_only
+class AsyncViewTests(TestCase):
+    """The async read views (served under ASGI) against their sync counterparts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_view_data()
+        FootprintMonthlySummary.objects.create(
+            user=cls.user, month=timezone.now().date().replace(year=2020, day=1), total_emission=50,
+            entries_count=2, first_created_at=timezone.now(), last_created_at=timezone.now(),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+        instrumentation.window.clear()
+
+    def get_both(self, url_name, params=None):
+        with benchmark.deployment(asgi=False):
+            sync_response = self.client.get(reverse(url_name), params)
+        with benchmark.deployment(asgi=True):
+            async_response = async_to_sync(self.async_client.get)(reverse(url_name), params)
+            self.assertTrue(iscoroutinefunction(async_response.resolver_match.func))
+        return sync_response, async_response
+
+    def assertSameContext(self, url_name, keys, params=None):
+        sync_response, async_response = self.get_both(url_name, params)
+        self.assertEqual(async_response.status_code, 200)
+        for key in keys:
+            # index passes querysets; the async views have to evaluate them first
+            expected = sync_response.context[key]
+            self.assertEqual(async_response.context[key], list(expected) if isinstance(expected, QuerySet) else expected, key)
+
+    def test_dashboard(self):
+        keys = ['breakdown', 'all_footprints', 'period_label', 'avg_daily', 'total_entries',
+                'last_updated', 'active_challenges', 'recent_progress', 'total_carbon_saved']
+        for period in ('daily', 'weekly', 'monthly', 'all'):
+            self.assertSameContext('dashboard', keys, {'period': period})
+
+    def test_leaderboard(self):
+        keys = ['ranked', 'period_label', 'total_users', 'total_emissions', 'avg_emission']
+        for period in ('daily', 'weekly', 'monthly', 'all'):
+            self.assertSameContext('leaderboard', keys, {'period': period})
+
+    def test_challenges_index(self):
+        self.assertSameContext('challenges:index', ['challenges', 'user_challenges'])
+
+    def test_async_requests_are_instrumented(self):
+        self.get_both('dashboard', {'period': 'all'})
+        row = next(row for row in instrumentation.window.summary() if row['url_name'] == 'dashboard')
+        self.assertEqual(row['requests'], 2)
+        self.assertGreater(row['queries_avg'], 0)
+
+
+@primary_only
+class ParallelReadsTests(TransactionTestCase):
+    """Outside a transaction the dashboard's reads run on the pool threads."""
+
+    def setUp(self):
+        self.user = create_view_data()
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+        self.addCleanup(parallel.shutdown)
+
+    def test_serial_inside_a_transaction(self):
+        with transaction.atomic():
+            threads = parallel.run_reads([threading.get_ident, threading.get_ident])
+        self.assertEqual(threads, [threading.get_ident()] * 2)
+
+    def test_results_in_call_order(self):
+        calls = [CarbonFootprint.objects.filter(user=self.user).count, threading.get_ident, lambda: 'last']
+        count, thread, last = parallel.run_reads(calls)
+        self.assertEqual((count, last), (5, 'last'))
+        self.assertNotEqual(thread, threading.get_ident())
+
+    def test_dashboard_matches_serial_path(self):
+        keys = ['breakdown', 'all_footprints', 'avg_daily', 'total_entries',
+                'last_updated', 'active_challenges', 'recent_progress', 'total_carbon_saved']
+        for period in ('daily', 'weekly', 'monthly', 'all'):
+            with self.settings(PARALLEL_READ_WORKERS=0):
+                serial = self.client.get(reverse('dashboard'), {'period': period})
+            concurrent = self.client.get(reverse('dashboard'), {'period': period})
+            with benchmark.deployment(asgi=True):
+                concurrent_async = async_to_sync(self.async_client.get)(reverse('dashboard'), {'period': period})
+            for key in keys:
+                self.assertEqual(concurrent.context[key], serial.context[key], key)
+                self.assertEqual(concurrent_async.context[key], serial.context[key], key)
+
+    def test_pool_threads_close_old_connections(self):
+        # What request_started/finished do, around every call; with CONN_MAX_AGE=0
+        # that closes the connection (SQLite's in-memory test database ignores it)
+        closed_on = []
+        with mock.patch.object(parallel, 'close_old_connections', lambda: closed_on.append(threading.get_ident())):
+            threads = parallel.run_reads([threading.get_ident, threading.get_ident])
+        self.assertEqual(sorted(closed_on), sorted(threads * 2))
+        self.assertNotIn(threading.get_ident(), closed_on)
+
+    def test_shutdown_closes_the_pool_threads_connections(self):
+        parallel.run_reads([CarbonFootprint.objects.count, CarbonFootprint.objects.count])
+        pool = parallel._pool
+        closed = []
+        # Closing is a no-op on SQLite's in-memory test database, so record the calls
+        with mock.patch.object(type(pool.connections[0]), 'close', autospec=True, side_effect=closed.append):
+            parallel.shutdown()
+        self.assertTrue(pool.connections)
+        self.assertEqual(closed, pool.connections)
+        # The next reads start a new pool
+        self.assertEqual(parallel.run_reads([lambda: 1, lambda: 2]), [1, 2])
+        self.assertIsNot(parallel._pool, pool)
+
+    def test_missing_stats_are_built_on_the_request_thread(self):
+        UserStats.objects.all().delete()
+        rebuild = stats.rebuild
+        threads = []
+
+        def recording_rebuild(user_ids):
+            threads.append(threading.get_ident())
+            return rebuild(user_ids)
+
+        with mock.patch.object(stats, 'rebuild', recording_rebuild):
+            response = self.client.get(reverse('dashboard'), {'period': 'all'})
+        self.assertEqual(threads, [threading.get_ident()])
+        self.assertEqual(response.context['total_entries'], 5)
+
+    def test_pool_queries_are_instrumented(self):
+        instrumentation.window.clear()
+        with self.settings(PARALLEL_READ_WORKERS=0):
+            self.client.get(reverse('dashboard'))
+        self.client.get(reverse('dashboard'))
+        row = next(row for row in instrumentation.window.summary() if row['url_name'] == 'dashboard')
+        self.assertEqual(row['requests'], 2)
+        self.assertEqual(row['queries_avg'], row['queries_max'])
+
+
+@primary_only
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for metric in metrics.REGISTRY.values():
+            metric.clear()
+        self.user = User.objects.create_user('alice', password='testpass123')
+        self.client.force_login(self.user)
+
+    def test_parse_rate(self):
+        self.assertEqual(ratelimit.parse_rate('10/m'), (10, 60))
+        self.assertEqual(ratelimit.parse_rate('100/15m'), (100, 900))
+        with self.assertRaises(ValueError):
+            ratelimit.parse_rate('10 per minute')
+
+    def test_sliding_window_weighs_the_previous_window(self):
+        limit = ratelimit.Limit('test', '3/m')
+        start = 6000.0  # a window boundary
+        self.assertEqual([limit.hit('k', start + i).allowed for i in range(4)], [True, True, True, False])
+        # Next window, once the three previous hits weigh 2 or less (a third in)
+        self.assertEqual(limit.hit('k', start + 3).retry_after, 57 + 20)
+
+        # Halfway through the next window the previous three still weigh 1.5
+        self.assertTrue(limit.hit('k', start + 90).allowed)
+        refused = limit.hit('k', start + 90)
+        self.assertFalse(refused.allowed)
+        # 1 + 3 * (1 - x) <= 2 once x >= 2/3 of the window, i.e. 10 seconds on
+        self.assertEqual(refused.retry_after, 10)
+        self.assertTrue(limit.hit('k', start + 100).allowed)
+
+    @override_settings(RATE_LIMITS={'tips_api': '2/m'})
+    def test_decorated_view_answers_429_with_retry_after(self):
+        payload = json.dumps({'result': 120, 'emission_breakdown': {'total': 120}})
+        post = lambda: self.client.post(reverse('tips_api'), payload, content_type='application/json')
+        self.assertEqual([post().status_code, post().status_code], [200, 200])
+        response = post()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertIn('carbon_rate_limited_total{limit="tips_api"} 1', metrics.render())
+
+        with self.settings(RATE_LIMIT_ENABLED=False):
+            self.assertEqual(post().status_code, 200)
+
+    def test_daily_cap_is_seeded_from_todays_footprints(self):
+        for _ in range(CarbonFootprint.DAILY_LIMIT):
+            CarbonFootprint.objects.create(user=self.user, car_travel_km=10)
+        self.assertFalse(CarbonFootprint.can_calculate_today(self.user))
+
+        response = self.client.post(reverse('track'), TRACK_FORM, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(response.json()['limit_reached'])
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(CarbonFootprint.objects.count(), CarbonFootprint.DAILY_LIMIT)
+
+    def test_daily_cap_counts_saves_from_other_processes(self):
+        # This process's local cache has counted nothing today...
+        self.assertEqual(DAILY_CALCULATIONS.usage(self.user.pk), 0)
+        # ...while other workers saved the whole allowance
+        for _ in range(CarbonFootprint.DAILY_LIMIT):
+            CarbonFootprint.objects.create(user=self.user, car_travel_km=10)
+        response = self.client.post(reverse('track'), TRACK_FORM, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(CarbonFootprint.objects.count(), CarbonFootprint.DAILY_LIMIT)
+
+    def test_failed_saves_do_not_count(self):
+        with mock.patch.object(stats, 'record_footprints', side_effect=RuntimeError('database went away')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse('track'), TRACK_FORM)
+        self.assertEqual(DAILY_CALCULATIONS.usage(self.user.pk), 0)
+        self.assertFalse(CarbonFootprint.objects.exists())
+
+    def test_invalid_submissions_do_not_count(self):
+        for _ in range(CarbonFootprint.DAILY_LIMIT + 1):
+            self.client.post(reverse('track'), {**TRACK_FORM, 'car_travel_km': 'lots'})
+        self.assertEqual(CarbonFootprint.get_remaining_calculations(self.user), CarbonFootprint.DAILY_LIMIT)
+        for _ in range(CarbonFootprint.DAILY_LIMIT):
+            self.assertEqual(self.client.post(reverse('track'), TRACK_FORM).status_code, 302)
+        self.assertEqual(CarbonFootprint.get_remaining_calculations(self.user), 0)
+
+
+@primary_only
+class CarbonFootprintAdminTests(TestCase):
+    def test_cursor_pages_through_equal_timestamps(self):
+        admin = User.objects.create_superuser('admin', password='testpass123')
+        user = User.objects.create_user('alice', password='testpass123')
+        created = timezone.now()
+        for i in range(5):
+            CarbonFootprint.objects.create(user=user, car_travel_km=i, created_at=created - timedelta(hours=i // 2))
+        self.client.force_login(admin)
+
+        seen, params = [], {}
+        with mock.patch.object(CarbonFootprintAdmin, 'list_per_page', 2):
+            while True:
+                cl = self.client.get(reverse('admin:core_carbonfootprint_changelist'), params).context['cl']
+                seen += [footprint.id for footprint in cl.result_list]
+                if not cl.next_cursor:
+                    break
+                params = {'cursor': cl.next_cursor}
+        expected = CarbonFootprint.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        self.assertEqual(seen, list(expected))
+
+
+    def test_recalculate_emissions_action(self):
+        admin = User.objects.create_superuser('admin', password='testpass123')
+        user = User.objects.create_user('alice', password='testpass123')
+        for i in range(5):
+            CarbonFootprint.objects.create(
+                user=user, car_travel_km=12.345 * i, fuel_type=['petrol', 'diesel', 'electric'][i % 3],
+                flights_hours=i, meals_per_day=i, meal_type='low', electricity_kwh=3.3 * i, waste_kg=i,
+            )
+        CarbonFootprint.objects.update(total_emission=0)
+        self.client.force_login(admin)
+        with self.settings(BULK_BATCH_SIZE=2):
+            response = self.client.post(reverse('admin:core_carbonfootprint_changelist'), {
+                'action': 'recalculate_emissions',
+                '_selected_action': list(CarbonFootprint.objects.values_list('pk', flat=True)),
+            }, follow=True)
+        self.assertContains(response, 'Recalculated emissions: 5 rows in 3 batches')
+        for footprint in CarbonFootprint.objects.all():
+            self.assertAlmostEqual(footprint.total_emission, footprint.calculate_emission(), places=2)
+
+
+class StaticAssetTests(TestCase):
+    def test_utilities_css_is_up_to_date(self):
+        # Fails after a template change until `python manage.py build_css` is rerun
+        call_command('build_css', check=True, stdout=StringIO())
+
+    def test_build_css_fails_on_unknown_utilities(self):
+        with tempfile.TemporaryDirectory() as directory:
+            template = os.path.join(directory, 'page.html')
+            with open(template, 'w') as f:
+                f.write('<div class="rounded-t rounded-pill text-md">')
+            self.assertEqual(css.utilities([Path(template)])[1], {'text-md'})
+            with mock.patch.object(css, 'template_sources', return_value=[Path(template)]):
+                with self.assertRaisesMessage(CommandError, 'No rule for these class names: text-md'):
+                    call_command('build_css', check=True, stdout=StringIO())
+
+    # Markup labels in dashboard.html that no stylesheet or script targets
+    UNSTYLED = {'challenge-mini-card', 'last-updated', 'main-card', 'section-header', 'welcome-section'}
+
+    @primary_only
+    def test_rendered_pages_only_use_classes_with_rules(self):
+        # The source scan in build_css only fails on names that look like
+        # utilities; this checks every class the rendered pages carry
+        user = create_view_data()
+        organization = Organization.objects.create(name='Acme', slug='acme')
+        teams.join(user, Team.objects.create(organization=organization, name='Red', slug='red'))
+        pages = [(self.client_class(), reverse(name), {}) for name in ('landing', 'register', 'login')]
+        self.client.force_login(user)
+        for url_name in ('track', 'dashboard', 'leaderboard', 'team_leaderboard', 'challenges:index', 'challenges:my_challenges'):
+            pages += [(self.client, reverse(url_name), {'period': period}) for period in ('daily', 'all')]
+
+        used, defined = {}, set()
+        for client, url, params in pages:
+            html = client.get(url, params).content.decode()
+            self.assertTrue(html, url)
+            # Classes our own stylesheets and the page's <style> blocks define
+            sheets = re.findall(r'<style[^>]*>(.*?)</style>', html, re.S)
+            sheets += [
+                Path(finders.find(href.removeprefix('/static/'))).read_text(encoding='utf-8')
+                for kind, href, _ in benchmark.page_resources(html)
+                if kind == 'css' and href.startswith('/static/') and href != '/static/css/utilities.css'
+            ]
+            defined.update(name for sheet in sheets for name in re.findall(r'\.(-?[_a-zA-Z][\w-]*)', sheet))
+            for value in re.findall(r'class="([^"]*)"', html):
+                for name in value.split():
+                    used.setdefault(name, url)
+        unknown = {
+            name: url for name, url in used.items()
+            if css.rule(name) is None and name not in defined | self.UNSTYLED | css.NOT_UTILITIES
+        }
+        self.assertGreater(len(used), 100)
+        self.assertEqual(unknown, {})
+
+    def test_pages_use_the_built_css(self):
+        response = self.client.get(reverse('landing'))
+        self.assertContains(response, '/static/css/utilities.css')
+        self.assertNotContains(response, 'cdn.tailwindcss.com')
+
+    def test_built_assets_are_up_to_date(self):
+        # Fails after changing a script source until `python manage.py build_assets` is rerun
+        call_command('build_assets', check=True, stdout=StringIO(), stderr=StringIO())
+
+    def test_layout_loads_bundles_and_responsive_logo(self):
+        html = self.client.get(reverse('login')).content.decode()
+        self.assertIn('<script src="/static/js/site.min.js" defer></script>', html)
+        self.assertIn('type="image/webp" srcset="/static/images/responsive/logo-32.webp 32w', html)
+        self.assertIn('height="32" width="32"', html)
+        self.assertNotIn('images/logo.png', html)
+        # Only our own stylesheets block rendering
+        blocking = [url for _, url, blocked in benchmark.page_resources(html) if blocked]
+        self.assertEqual(blocking, ['/static/layout.css', '/static/css/utilities.css'])
+
+    @primary_only
+    def test_vendor_files_are_self_hosted(self):
+        user = User.objects.create_user('alice', password='testpass123')
+        CarbonFootprint.objects.create(user=user, car_travel_km=10)
+        self.client.force_login(user)
+        with mock.patch.object(vendor, 'available', return_value=True):
+            for url_name in ('landing', 'dashboard'):
+                html = self.client.get(reverse(url_name)).content.decode()
+                # The landing page's video is a lazy YouTube frame, which can't be self-hosted
+                urls = [url for kind, url, _ in benchmark.page_resources(html) if kind != 'frame']
+                self.assertTrue(all(url.startswith('/static/') for url in urls), urls)
+            self.assertIn('<script src="/static/vendor/chart.umd.js" defer></script>', html)
+            self.assertIn("font-weight:400;font-display:swap;src:url(/static/fonts/inter-latin-400-normal.woff2)", html)
+            self.assertNotIn('fonts.googleapis.com', html)
+        # Until fetch_vendor has run, scripts come from the pinned CDN URL and Inter from Google Fonts
+        with mock.patch.object(vendor, 'available', return_value=False):
+            html = self.client.get(reverse('dashboard')).content.decode()
+        self.assertIn(vendor.FILES['vendor/chart.umd.js'], html)
+        self.assertNotIn('@font-face', html)
+        fonts = [(url, blocked) for kind, url, blocked in benchmark.page_resources(html) if kind == 'css']
+        self.assertIn((vendor.FONT_STYLESHEET, False), fonts)
+
+    def test_minify(self):
+        source = (
+            "var a = 'x // y', re = /[/]\\/+/g; // comment\n"
+            "/* block */ if (a) {\n  return 4 / 2\n}\n"
+            "var b = a\n++c\n"
+        )
+        self.assertEqual(
+            js.minify(source),
+            "var a='x // y',re=/[/]\\/+/g;if(a){return 4 / 2}\nvar b=a\n++c\n",
+        )
+
+    def test_rules(self):
+        self.assertEqual(
+            css.rule('md:hover:bg-green-400/20')[1],
+            '@media (min-width:768px){.md\\:hover\\:bg-green-400\\/20:hover{background-color:rgb(74 222 128 / 0.2)}}',
+        )
+        self.assertEqual(css.rule('space-y-2')[1].split('{')[0], '.space-y-2 > :not([hidden]) ~ :not([hidden])')
+        self.assertIsNone(css.rule('btn-primary'))
+        self.assertEqual(css.rule('rounded-t')[1], '.rounded-t{border-top-left-radius:0.25rem;border-top-right-radius:0.25rem}')
+        self.assertIn('hover:bg-teal-700', css.candidates('<b class="hover:bg-{{ challenge.icon_color }}-700">'))
+        # Responsive variants come after plain utilities, so they win
+        self.assertLess(css.rule('p-8'), css.rule('md:p-4'))
+        self.assertLess(css.rule('p-4'), css.rule('px-6'))
+
+    def test_precompressed_copies(self):
+        with tempfile.TemporaryDirectory() as directory:
+            text = os.path.join(directory, 'app.css')
+            with open(text, 'w') as f:
+                f.write('.a{color:red}\n' * 200)
+            tiny = os.path.join(directory, 'tiny.css')
+            with open(tiny, 'w') as f:
+                f.write('.a{}')
+            self.assertIn('.gz', storage.compress_file(text))
+            self.assertEqual(storage.compress_file(tiny), [])
+            with gzip.open(text + '.gz', 'rt') as f:
+                self.assertEqual(f.read(), '.a{color:red}\n' * 200)
+            self.assertFalse(os.path.exists(tiny + '.gz'))
+
+    def test_static_file_server(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, 'css'))
+            for name in ('css/app.css', 'css/app.0123456789ab.css'):
+                with open(os.path.join(root, name), 'w') as f:
+                    f.write('.a{color:red}\n' * 200)
+                storage.compress_file(os.path.join(root, name))
+            with open(os.path.join(root, 'staticfiles.json'), 'w') as f:
+                json.dump({'paths': {'css/app.css': 'css/app.0123456789ab.css'}}, f)
+
+            with override_settings(STATIC_ROOT=root, STATIC_MAX_AGE=60):
+                middleware = StaticFilesMiddleware(lambda request: 'passed on')
+            factory = RequestFactory()
+
+            response = middleware(factory.get('/static/css/app.0123456789ab.css', headers={'Accept-Encoding': 'gzip, br;q=0'}))
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/css; charset=utf-8')
+            self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+            self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b'.a{color:red}\n' * 200)
+            response.close()
+
+            response = middleware(factory.get('/static/css/app.css'))
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+            self.assertEqual(response['Content-Length'], str(len('.a{color:red}\n' * 200)))
+            response.close()
+
+            not_modified = middleware(factory.get('/static/css/app.css', headers={'If-None-Match': response['ETag']}))
+            self.assertEqual(not_modified.status_code, 304)
+            # The compressed copy has its own ETag
+            self.assertEqual(middleware(factory.get(
+                '/static/css/app.css', headers={'If-None-Match': response['ETag'], 'Accept-Encoding': 'gzip'},
+            )).status_code, 200)
+
+            self.assertEqual(middleware(factory.post('/static/css/app.css')).status_code, 405)
+            self.assertEqual(middleware(factory.get('/static/css/app.css.gz')), 'passed on')
+            self.assertEqual(middleware(factory.get('/static/css/missing.css')), 'passed on')
+            self.assertEqual(middleware(factory.get('/leaderboard/')), 'passed on')
+
+    @override_settings(REPLICA_READ_VIEWS=[])
+    def test_pages_and_apis_are_compressed(self):
+        self.client.force_login(User.objects.create_user('gzip', password='pw'))
+        response = self.client.get(reverse('leaderboard'), headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'</html>', gzip.decompress(response.content))
+
+        payload = json.dumps({'result': 120, 'emission_breakdown': {'total': 120, 'food': 80}})
+        response = self.client.post(reverse('tips_api'), payload, content_type='application/json',
+                                    headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('message', json.loads(gzip.decompress(response.content)))
@@ -0,0 +1,204 @@
+"""
+Emission time series for the dashboard charts.
+
+series() buckets a user's footprints by day, week or month in SQL
+(TruncDay/TruncWeek/TruncMonth). It returns one value per bucket for the
+total, for each category and for the entry count, so a long history costs
+one grouped query rather than one row per footprint. Month buckets also
+include the archived FootprintMonthlySummary rows. Archived months have no
+finer detail, so day and week series only cover live rows and report
+``archived_through``.
+
+When there are more buckets than the chart can show, lttb() picks the points
+that keep the shape of the total line (Largest-Triangle-Three-Buckets). The
+categories keep the same points, so they still add up.
+
+Results are cached per user and per data version. Code that writes a user's
+footprints or summaries calls invalidate(), which moves the user to a new
+version; entries for the old version are never read again and expire.
+"""
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .exports import CATEGORIES
+from .models import CarbonFootprint, FootprintMonthlySummary
+
+BUCKETS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+SERIES = ('total', *CATEGORIES, 'entries')
+
+# bucket='auto' picks the finest bucket whose count stays near the point budget
+AUTO_BUCKETS = [('day', 92), ('week', 2 * 366)]
+
+
+def _version_key(user_id):
+    return f'chart_version:{user_id}'
+
+
+def data_version(user_id):
+    """The user's current data version, started from the clock so it can't repeat an evicted one."""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns() // 1000, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(user_ids):
+    """
+    Move users to a new data version after their footprints or summaries changed.
+
+    Inside a transaction this waits for the commit, so a concurrent request
+    can't cache the old rows under the new version.
+    """
+    user_ids = set(user_ids)
+
+    def bump():
+        for user_id in user_ids:
+            key = _version_key(user_id)
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Never read yet (or evicted): any fresh clock value is new
+                cache.set(key, time.time_ns() // 1000, None)
+
+    transaction.on_commit(bump)
+
+
+def lttb(xs, ys, threshold):
+    """Indexes of ``threshold`` points of (xs, ys) chosen by Largest-Triangle-Three-Buckets."""
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    # First and last points are always kept; the rest is split into equal buckets
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket, the third corner of the triangle
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        best, best_area = None, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def pick_bucket(start, end):
+    """The bucket for bucket='auto' over [start, end]."""
+    days = (end - start).days if start else None
+    for bucket, max_days in AUTO_BUCKETS:
+        if days is not None and days <= max_days:
+            return bucket
+    return 'month'
+
+
+def _bucket_rows(user_id, bucket, start, end):
+    """{bucket start (date): {series: value}} for the live footprints."""
+    expressions = CarbonFootprint.emission_expressions()
+    rows = CarbonFootprint.objects.filter(user_id=user_id, created_at__lt=end)
+    if start:
+        rows = rows.filter(created_at__gte=start)
+    rows = (
+        rows.annotate(period=BUCKETS[bucket]('created_at'))
+        .values('period')
+        .annotate(
+            total=Sum('total_emission'),
+            entries=Count('id'),
+            **{name: Sum(expressions[name]) for name in CATEGORIES},
+        )
+        .order_by('period')
+    )
+    return {timezone.localtime(row.pop('period')).date(): row for row in rows}
+
+
+def _summary_rows(user_id, start, end):
+    """Same shape as _bucket_rows for the archived months."""
+    summaries = FootprintMonthlySummary.objects.filter(user_id=user_id, month__lt=timezone.localtime(end).date())
+    if start:
+        summaries = summaries.filter(month__gte=timezone.localtime(start).date().replace(day=1))
+    return {
+        row['month']: {'total': row['total_emission'], 'entries': row['entries_count'], **{
+            name: row[name] for name in CATEGORIES
+        }}
+        for row in summaries.values('month', 'total_emission', 'entries_count', *CATEGORIES)
+    }
+
+
+def series(user_id, start=None, end=None, bucket='auto', points=None):
+    """
+    The user's emissions per bucket between start (inclusive) and end.
+
+    Returns a JSON-ready dict: ``labels`` (bucket start dates), ``series``
+    ({name: [values]} for SERIES), ``bucket``, ``buckets`` (before
+    downsampling), ``downsampled`` and ``archived_through``.
+    """
+    end = end or timezone.now()
+    points = points or getattr(settings, 'CHART_POINTS', 120)
+    if bucket == 'auto':
+        first = start
+        if first is None:
+            # The history starts at the first live footprint or archived month
+            first_live = CarbonFootprint.objects.filter(user_id=user_id).aggregate(first=Min('created_at'))['first']
+            first_month = FootprintMonthlySummary.objects.filter(user_id=user_id).aggregate(first=Min('month'))['first']
+            first_archived = timezone.make_aware(datetime.combine(first_month, datetime.min.time())) if first_month else None
+            first = min(filter(None, [first_live, first_archived]), default=None)
+        bucket = pick_bucket(first, end)
+
+    rows = _bucket_rows(user_id, bucket, start, end)
+    archived_through = None
+    if bucket == 'month':
+        for month, row in _summary_rows(user_id, start, end).items():
+            live = rows.setdefault(month, {name: 0 for name in SERIES})
+            for name in SERIES:
+                live[name] = (live[name] or 0) + (row[name] or 0)
+    else:
+        last = FootprintMonthlySummary.objects.filter(user_id=user_id).aggregate(last=Max('month'))['last']
+        archived_through = last.isoformat() if last else None
+
+    labels = sorted(rows)
+    values = {name: [round(rows[label][name] or 0, 2) for label in labels] for name in SERIES}
+    keep = lttb([label.toordinal() for label in labels], values['total'], points)
+    downsampled = len(keep) < len(labels)
+    if downsampled:
+        labels = [labels[i] for i in keep]
+        values = {name: [column[i] for i in keep] for name, column in values.items()}
+
+    return {
+        'bucket': bucket,
+        'buckets': len(rows),
+        'downsampled': downsampled,
+        'labels': [label.isoformat() for label in labels],
+        'series': values,
+        'archived_through': archived_through,
+    }
+
+
+def cached_series(user_id, start=None, end=None, bucket='auto', points=None):
+    """series(), cached per user, data version and arguments."""
+    version = data_version(user_id)
+    # Open-ended ranges end "now"; they are keyed by the day so they stay cacheable
+    end_key = end.isoformat() if end else timezone.localdate().isoformat()
+    key = f"chart:{user_id}:{version}:{bucket}:{start.isoformat() if start else ''}:{end_key}:{points or ''}"
+    data = cache.get(key)
+    if data is None:
+        data = series(user_id, start, end, bucket, points)
+        cache.set(key, data, getattr(settings, 'CHART_CACHE_SECONDS', 60 * 60))
+    return data
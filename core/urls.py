@@ -27,8 +27,14 @@ urlpatterns = [
     path('', views.index, name='landing' ),
     path('register/', views.register, name="register"),
     path('home/', views.track, name='track'),
-    path("dashboard/", views.dashboard, name="dashboard"),
-    path("leaderboard/", views.leaderboard, name="leaderboard"),
+    path("dashboard/", views.dashboard_async if settings.ASYNC_VIEWS else views.dashboard, name="dashboard"),
+    path("leaderboard/", views.leaderboard_async if settings.ASYNC_VIEWS else views.leaderboard, name="leaderboard"),
+    path('api/leaderboard/stats/', views.leaderboard_stats, name='leaderboard_stats'),
+    path('leaderboard/teams/', views.team_leaderboard, name='team_leaderboard'),
+    path('events/', views.event_stream, name='event_stream'),
+    path('api/chart/', views.chart_data, name='chart_data'),
     path('api/tips/', views.tips_api, name='tips_api'),
     path('api/ai-tips/', views.ai_tips_api, name='ai_tips_api'),
+    path('api/export/', views.export_footprints, name='export_footprints'),
+    path('api/import/', views.import_footprints, name='import_footprints'),
 ]
\ No newline at end of file
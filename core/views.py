@@ -1,19 +1,31 @@
+import asyncio
 import os
+import hashlib
 import json
 from datetime import datetime, timedelta
+from functools import partial, wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
 
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.core.cache import cache
+from django.shortcuts import render, redirect, get_object_or_404
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.db.models import Sum, Count, Max
 
+from carbon import events, instrumentation, metrics, parallel
+from carbon.ratelimit import ratelimit
+from . import archive, distribution, exports, imports, live, stats, teams, timeseries
 from .forms import UserRegistrationForm, CarbonFootprintForm
-from .models import CarbonFootprint
+from .models import DAILY_CALCULATIONS, CarbonFootprint, Membership, Organization
 from challenges.models import UserChallenge, ChallengeProgress
 
 # Optional Google Gemini client (may be None)
@@ -71,25 +83,30 @@ def track(request):
     View to create a new CarbonFootprint entry. Uses CarbonFootprintForm.
     Named 'track' because your template links to {% url 'track' %}.
     """
-    # Check daily calculation limit
-    can_calculate = CarbonFootprint.can_calculate_today(request.user)
-    remaining_calculations = CarbonFootprint.get_remaining_calculations(request.user)
-    daily_count = CarbonFootprint.get_daily_calculation_count(request.user)
+    # Check daily calculation limit (a cache read; seeded from today's rows once a day)
+    daily_limit = DAILY_CALCULATIONS.rate.limit
+    daily_count = DAILY_CALCULATIONS.usage(request.user.pk)
+    can_calculate = daily_count < daily_limit
+    remaining_calculations = max(0, daily_limit - daily_count)
     
     if request.method == 'POST':
-        # Check if user has exceeded daily limit
-        if not can_calculate:
-            error_message = f"Daily calculation limit reached! You can only make 3 calculations per day. You've already made {daily_count} calculations today. Please try again tomorrow."
+        # Count this save up front, so parallel submissions can't overshoot the limit
+        decision = DAILY_CALCULATIONS.hit(request.user.pk)
+        if not decision.allowed:
+            metrics.DAILY_LIMIT_REJECTIONS.inc()
+            error_message = f"Daily calculation limit reached! You can only make {daily_limit} calculations per day. You've already made {decision.count} calculations today. Please try again tomorrow."
             
             # Check if this is an AJAX request
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
-                return JsonResponse({
+                response = JsonResponse({
                     'success': False,
                     'message': error_message,
                     'limit_reached': True,
-                    'daily_count': daily_count,
+                    'daily_count': decision.count,
                     'remaining': 0
                 }, status=429)  # 429 Too Many Requests
+                response['Retry-After'] = str(decision.retry_after)
+                return response
             else:
                 messages.error(request, error_message)
                 return redirect('track')
@@ -98,11 +115,20 @@ def track(request):
         if form.is_valid():
             footprint = form.save(commit=False)
             footprint.user = request.user
-            footprint.save()
+            try:
+                with transaction.atomic():
+                    footprint.save()
+                    stats.record_footprints([footprint])
+            except Exception:
+                # Not saved either
+                DAILY_CALCULATIONS.refund(request.user.pk)
+                raise
+            metrics.FOOTPRINT_SAVES.inc(source='track')
+            timeseries.invalidate([request.user.id])
             
             # Update counts after saving
-            new_daily_count = CarbonFootprint.get_daily_calculation_count(request.user)
-            new_remaining = CarbonFootprint.get_remaining_calculations(request.user)
+            new_daily_count = decision.count
+            new_remaining = max(0, daily_limit - new_daily_count)
             
             # Check if this is an AJAX request
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
@@ -117,6 +143,8 @@ def track(request):
                 messages.success(request, f'Carbon footprint entry saved! You have {new_remaining} calculations remaining today.')
                 return redirect('dashboard')
         else:
+            # Nothing was saved, so the attempt doesn't count
+            DAILY_CALCULATIONS.refund(request.user.pk)
             # Check if this is an AJAX request
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
                 return JsonResponse({
@@ -141,13 +169,92 @@ def track(request):
     }
     return render(request, 'track.html', context)
 
-@login_required
-def dashboard(request):
-    # Get time period from request (default to 'monthly')
-    time_period = request.GET.get('period', 'monthly')
-    
+# Known periods; anything else is reported as 'other' to keep label values bounded
+PERIODS = ('daily', 'weekly', 'monthly', 'all')
+
+
+def observe_period_latency(view_func):
+    """Record the view's latency per requested period in metrics.VIEW_LATENCY."""
+    def labels(request):
+        period = request.GET.get('period', 'monthly')
+        return {'view': view_func.__name__.removesuffix('_async'), 'period': period if period in PERIODS else 'other'}
+
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            with metrics.VIEW_LATENCY.time(**labels(request)):
+                return await view_func(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        with metrics.VIEW_LATENCY.time(**labels(request)):
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+PERIOD_LABELS = {'daily': "Today", 'weekly': "This Week", 'monthly': "This Month"}
+
+
+def period_start(time_period, now):
+    """Start of the selected period, or None for all time."""
+    if time_period == 'daily':
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if time_period == 'weekly':
+        return now - timedelta(days=7)
+    if time_period == 'monthly':
+        return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return None
+
+
+def dashboard_queries(user, time_period, now):
+    """The dashboard's independent queries, as unevaluated querysets."""
+    all_footprints = CarbonFootprint.objects.filter(user=user).order_by("-created_at")
+    start_date = period_start(time_period, now)
+    return {
+        'user_id': user.id,
+        # All time comes from UserStats (core/stats.py), which includes archived footprints
+        'footprints': all_footprints.filter(created_at__gte=start_date) if start_date else None,
+        # The template only compares the latest entry with the one before it
+        'latest_footprints': all_footprints[:2],
+        'active_challenges': UserChallenge.objects.filter(
+            user=user,
+            status='active'
+        ).select_related('challenge_type')[:3],  # Limit to 3 for dashboard
+        'recent_progress': ChallengeProgress.objects.filter(
+            user_challenge__user=user,
+            date__gte=now - timedelta(days=7)
+        ).order_by('-date')[:5],
+    }
+
+
+def dashboard_reads(queries):
+    """Calls that evaluate dashboard_queries(), in dashboard_context() argument order."""
+    footprints = queries['footprints']
+    return [
+        # Aggregated data for the selected period, calculated in SQL
+        partial(archive.footprint_totals, footprints) if footprints is not None else lambda: None,
+        # Only reads; a missing row is built on the request's thread (dashboard_results)
+        partial(stats.find, queries['user_id']),
+        partial(list, queries['latest_footprints']),
+        partial(list, queries['active_challenges']),
+        partial(list, queries['recent_progress']),
+    ]
+
+
+def dashboard_results(queries, results):
+    """dashboard_reads() results with the user's UserStats built if it was missing."""
+    totals, user_stats, *rest = results
+    return [totals, stats.get(queries['user_id'], user_stats), *rest]
+
+
+def dashboard_context(time_period, totals, user_stats, latest_footprints, active_challenges, recent_progress):
+    """Template context from the evaluated dashboard_queries()."""
+    period_label = PERIOD_LABELS.get(time_period, "All Time")
+    if totals is None:
+        totals = user_stats.totals()
+
     # Initialize default values
-    latest = None
     breakdown = {
         'total': 0,
         'transportation': 0,
@@ -156,45 +263,18 @@ def dashboard(request):
         'waste': 0
     }
     avg_daily = 0
-    
-    # Get all footprints for the user
-    all_footprints = CarbonFootprint.objects.filter(user=request.user).order_by("-created_at")
-    
-    # Filter footprints based on time period
-    now = timezone.now()
-    if time_period == 'daily':
-        start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        footprints = all_footprints.filter(created_at__gte=start_date)
-        period_label = "Today"
-    elif time_period == 'weekly':
-        start_date = now - timedelta(days=7)
-        footprints = all_footprints.filter(created_at__gte=start_date)
-        period_label = "This Week"
-    elif time_period == 'monthly':
-        start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        footprints = all_footprints.filter(created_at__gte=start_date)
-        period_label = "This Month"
-    else:
-        footprints = all_footprints
-        period_label = "All Time"
-    
-    # Calculate aggregated data for the selected period
-    if footprints.exists():
-        # Calculate total emissions for the period
-        total_emissions = sum(footprint.total_emission for footprint in footprints if footprint.total_emission is not None)
-        
-        # Calculate breakdown for the period
+
+    total_entries = totals['entries']
+    if total_entries:
+        total_emissions = totals['total']
         breakdown = {
             'total': total_emissions,
-            'transportation': sum(footprint.get_emission_breakdown().get('transportation', 0) for footprint in footprints if hasattr(footprint, 'get_emission_breakdown')),
-            'electricity': sum(footprint.get_emission_breakdown().get('electricity', 0) for footprint in footprints if hasattr(footprint, 'get_emission_breakdown')),
-            'food': sum(footprint.get_emission_breakdown().get('food', 0) for footprint in footprints if hasattr(footprint, 'get_emission_breakdown')),
-            'waste': sum(footprint.get_emission_breakdown().get('waste', 0) for footprint in footprints if hasattr(footprint, 'get_emission_breakdown')),
+            'transportation': totals['transportation'],
+            'electricity': totals['electricity'],
+            'food': totals['food'],
+            'waste': totals['waste'],
         }
         
-        # Get the latest footprint for display
-        latest = footprints.first()
-        
         # Calculate average daily emissions for the period
         if time_period == 'daily':
             avg_daily = total_emissions
@@ -203,107 +283,115 @@ def dashboard(request):
         elif time_period == 'monthly':
             avg_daily = total_emissions / 30
         else:
-            avg_daily = total_emissions / max(len(footprints), 1) if footprints else 0
-    
-    # Get user's active challenges
-    active_challenges = UserChallenge.objects.filter(
-        user=request.user, 
-        status='active'
-    ).select_related('challenge_type')[:3]  # Limit to 3 for dashboard
-    
-    # Get recent challenge progress
-    recent_progress = ChallengeProgress.objects.filter(
-        user_challenge__user=request.user,
-        date__gte=now - timedelta(days=7)
-    ).order_by('-date')[:5]
-    
-    # Calculate total carbon saved from challenges
-    total_carbon_saved = ChallengeProgress.objects.filter(
-        user_challenge__user=request.user,
-        completed=True,
-        carbon_saved__isnull=False
-    ).aggregate(total=Sum('carbon_saved'))['total'] or 0
-    
-    # Prepare chart data
-    chart_footprints = footprints[:10]  # Limit to last 10 entries for chart
-    
-    context = {
-        "latest": latest,
+            avg_daily = total_emissions / total_entries
+
+    return {
         "breakdown": breakdown,
-        "footprints": chart_footprints,
-        "all_footprints": all_footprints,
+        "all_footprints": latest_footprints,
         "time_period": time_period,
         "period_label": period_label,
         "avg_daily": avg_daily,
-        "total_entries": footprints.count(),
+        "total_entries": total_entries,
+        "last_updated": totals['last_updated'],
         # Challenge data
         "active_challenges": active_challenges,
         "recent_progress": recent_progress,
-        "total_carbon_saved": total_carbon_saved,
+        "total_carbon_saved": user_stats.carbon_saved,
+        "current_streak": user_stats.current_streak,
     }
-    return render(request, "dashboard.html", context)
 
 
 @login_required
-def leaderboard(request):
-    """Enhanced leaderboard of users by their emissions across different time periods."""
-    
+@observe_period_latency
+def dashboard(request):
     # Get time period from request (default to 'monthly')
     time_period = request.GET.get('period', 'monthly')
+    queries = dashboard_queries(request.user, time_period, timezone.now())
+
+    # The reads are independent, so they go to the database at the same time
+    results = parallel.run_reads(dashboard_reads(queries))
+    context = dashboard_context(time_period, *dashboard_results(queries, results))
+    return render(request, "dashboard.html", context)
+
+
+@login_required
+@observe_period_latency
+async def dashboard_async(request):
+    """dashboard for ASGI deployments, through the async ORM."""
+    time_period = request.GET.get('period', 'monthly')
+    user = await request.auser()
+    queries = dashboard_queries(user, time_period, timezone.now())
+
+    # A request's async queries run one at a time on its database thread, in dashboard_reads() order
+    footprints = queries['footprints']
+    totals = await archive.afootprint_totals(footprints) if footprints is not None else None
+    user_stats = await stats.afind(user.id)
+    if user_stats is None:
+        user_stats = await sync_to_async(stats.get)(user.id)
+    context = dashboard_context(
+        time_period, totals, user_stats,
+        await _alist(queries['latest_footprints']),
+        await _alist(queries['active_challenges']),
+        await _alist(queries['recent_progress']),
+    )
+    # Rendering may still touch the database (e.g. request.user in the layout)
+    return await sync_to_async(render)(request, "dashboard.html", context)
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+def leaderboard_queries(time_period, now):
+    """The leaderboard's per-user totals, as an unevaluated queryset of dicts."""
+    start_date = period_start(time_period, now)
+    if start_date is None:
+        # All time is one UserStats row per user, archived footprints included
+        return stats.user_totals()
+
+    # Aggregate per user in the database
+    return CarbonFootprint.objects.filter(created_at__gte=start_date).order_by().values(
+        'user_id', 'user__username',
+    ).annotate(
+        total=Sum('total_emission'),
+        entries=Count('id'),
+        last_updated=Max('created_at'),
+    )
+
+
+def _summary_period(time_period):
+    # Unknown periods show all time, so they share its cache entry
+    return time_period if time_period in PERIOD_LABELS else 'all'
+
+
+def leaderboard_distribution(time_period, per_user, user_id):
+    """(summary, the user's standing) for the leaderboard_queries() queryset, computed in SQL."""
+    summary = distribution.cached_summary(_summary_period(time_period), per_user)
+    return summary, distribution.user_standing(per_user, user_id)
+
+
+def leaderboard_context(time_period, now, per_user, summary, standing):
+    """Template context from the evaluated leaderboard_queries() rows and leaderboard_distribution()."""
+    period_label = PERIOD_LABELS.get(time_period, "All Time")
+
+    user_stats = {}
+    for row in per_user:
+        user_stats[row['user_id']] = {
+            'user_id': row['user_id'],
+            'username': row['user__username'],
+            'total_emission': row['total'] or 0,
+            'entries_count': row['entries'],
+            'last_updated': row['last_updated'],
+            'avg_daily': 0
+        }
     
-    # Calculate date range based on time period
-    now = timezone.now()
-    if time_period == 'daily':
-        start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        period_label = "Today"
-    elif time_period == 'weekly':
-        start_date = now - timedelta(days=7)
-        period_label = "This Week"
-    elif time_period == 'monthly':
-        start_date = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        period_label = "This Month"
-    else:  # all time
-        start_date = None
-        period_label = "All Time"
-    
-    # Get carbon footprints for the specified period
-    if start_date:
-        footprints = CarbonFootprint.objects.select_related('user').filter(
-            created_at__gte=start_date
-        )
-    else:
-        footprints = CarbonFootprint.objects.select_related('user').all()
-    
-    if not footprints.exists():
-        context = {
+    if not user_stats:
+        return {
             'ranked': [], 
             'no_data': True,
             'time_period': time_period,
             'period_label': period_label
         }
-        return render(request, 'leaderboard.html', context)
-    
-    # Manual aggregation to ensure we get all users for the period
-    user_stats = {}
-    for footprint in footprints:
-        user_id = footprint.user.id
-        username = footprint.user.username
-        
-        if user_id not in user_stats:
-            user_stats[user_id] = {
-                'username': username,
-                'total_emission': 0,
-                'entries_count': 0,
-                'last_updated': footprint.created_at,
-                'avg_daily': 0
-            }
-        
-        user_stats[user_id]['total_emission'] += footprint.total_emission or 0
-        user_stats[user_id]['entries_count'] += 1
-        
-        # Update last_updated if this entry is more recent
-        if footprint.created_at > user_stats[user_id]['last_updated']:
-            user_stats[user_id]['last_updated'] = footprint.created_at
     
     # Calculate average daily emissions for each user
     for user_data in user_stats.values():
@@ -327,6 +415,7 @@ def leaderboard(request):
     for i, user_data in enumerate(ranked_users, 1):
         ranked.append({
             'rank': i,
+            'user_id': user_data['user_id'],
             'username': user_data['username'],
             'total_emission': round(user_data['total_emission'], 2),
             'avg_daily': round(user_data['avg_daily'], 2),
@@ -334,23 +423,184 @@ def leaderboard(request):
             'last_updated': user_data['last_updated'],
         })
     
-    # Calculate some period statistics
-    total_users = len(ranked)
-    total_emissions = sum(user['total_emission'] for user in ranked)
-    avg_emission = total_emissions / total_users if total_users > 0 else 0
-    
-    context = {
+    # Period statistics come from SQL (core/distribution.py)
+    return {
         'ranked': ranked,
         'time_period': time_period,
         'period_label': period_label,
-        'total_users': total_users,
-        'total_emissions': round(total_emissions, 2),
-        'avg_emission': round(avg_emission, 2),
+        'total_users': summary['count'],
+        'total_emissions': summary['sum'],
+        'avg_emission': summary['mean'] or 0,
+        'distribution': summary,
+        'histogram_max': max((bucket['count'] for bucket in summary['histogram']), default=0),
+        'standing': standing,
     }
+
+
+@login_required
+@observe_period_latency
+def leaderboard(request):
+    """Enhanced leaderboard of users by their emissions across different time periods."""
     
+    # Get time period from request (default to 'monthly')
+    time_period = request.GET.get('period', 'monthly')
+    now = timezone.now()
+    per_user = leaderboard_queries(time_period, now)
+    summary, standing = leaderboard_distribution(time_period, per_user, request.user.id)
+    context = leaderboard_context(time_period, now, list(per_user), summary, standing)
     return render(request, 'leaderboard.html', context)
 
+
+@login_required
+@observe_period_latency
+async def leaderboard_async(request):
+    """leaderboard for ASGI deployments, through the async ORM."""
+    time_period = request.GET.get('period', 'monthly')
+    now = timezone.now()
+    queries = leaderboard_queries(time_period, now)
+    user = await request.auser()
+    summary = await distribution.acached_summary(_summary_period(time_period), queries)
+    standing = await distribution.auser_standing(queries, user.id)
+    context = leaderboard_context(time_period, now, await _alist(queries), summary, standing)
+    return await sync_to_async(render)(request, 'leaderboard.html', context)
+
+
 @login_required
+@observe_period_latency
+def leaderboard_stats(request):
+    """
+    The leaderboard's distribution for ?period= as JSON: count, sum, mean,
+    min, max, p10, median, p90, histogram, and ``you`` (the user's total and
+    percentile, or null). See core/distribution.py.
+    """
+    time_period = request.GET.get('period', 'monthly')
+    summary, standing = leaderboard_distribution(
+        time_period, leaderboard_queries(time_period, timezone.now()), request.user.id,
+    )
+    return JsonResponse({'period': time_period, **summary, 'you': standing})
+
+
+@login_required
+@observe_period_latency
+def team_leaderboard(request):
+    """
+    The teams of one of the user's organizations, ranked by kg CO₂ per member.
+
+    ?org= picks the organization by slug (default the user's first) and
+    ?period= the period as on the leaderboard. Read from the team rollups
+    (core/teams.py), so it costs the same for any number of members.
+    """
+    time_period = request.GET.get('period', 'monthly')
+    organizations = list(Organization.objects.filter(memberships__user=request.user))
+    slug = request.GET.get('org')
+    if slug:
+        organization = get_object_or_404(Organization, slug=slug, memberships__user=request.user)
+    else:
+        organization = organizations[0] if organizations else None
+
+    context = {
+        'organizations': organizations,
+        'organization': organization,
+        'time_period': time_period,
+        'period_label': PERIOD_LABELS.get(time_period, "All Time"),
+        'ranked': [],
+    }
+    if organization is not None:
+        start = period_start(time_period, timezone.now())
+        context['ranked'] = teams.leaderboard(organization, timezone.localtime(start).date() if start else None)
+        context['my_team_id'] = Membership.objects.filter(
+            user=request.user, organization=organization,
+        ).values_list('team_id', flat=True).first()
+    return render(request, 'teams.html', context)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _events(channels):
+    """Events for channels as SSE text until EVENTS_STREAM_SECONDS pass; the browser then reconnects."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.EVENTS_STREAM_SECONDS
+    keepalive = settings.EVENTS_KEEPALIVE_SECONDS
+    # Subscribed on the loop that reads the stream
+    with events.subscribe(channels) as subscription:
+        yield 'retry: 3000\n\n'
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                _, data = await asyncio.wait_for(subscription.get(), min(keepalive, remaining))
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield _sse(data['type'], data)
+
+
+@login_required
+async def event_stream(request):
+    """
+    Live updates as server-sent events: ``rank`` changes on the leaderboard
+    and the user's own challenge ``progress`` (core/live.py), plus ``reset``
+    when the client should reload. ?channels= is a comma-separated subset of
+    leaderboard and progress (default both).
+
+    Only under ASGI (carbon/asgi.py): a WSGI worker would be held for the
+    whole stream.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Live events need the ASGI server (carbon/asgi.py)"}, status=501)
+    wanted = set(request.GET.get('channels', 'leaderboard,progress').split(','))
+    if not wanted <= {'leaderboard', 'progress'}:
+        return JsonResponse({"error": "Unsupported channel"}, status=400)
+    user = await request.auser()
+    channels = {live.LEADERBOARD} & wanted
+    if 'progress' in wanted:
+        channels.add(live.user_channel(user.id))
+
+    response = StreamingHttpResponse(_events(channels), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _day_start(day):
+    """Local midnight at the start of a date."""
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+@login_required
+def chart_data(request):
+    """
+    The user's emissions per day, week or month as JSON, for the dashboard charts.
+
+    ?period= picks the range as on the dashboard (default all); ?start= and
+    ?end= (YYYY-MM-DD, inclusive) override it. ?bucket= is day, week, month
+    or auto, and ?points= caps the points returned (see core/timeseries.py).
+    """
+    bucket = request.GET.get('bucket', 'auto')
+    if bucket != 'auto' and bucket not in timeseries.BUCKETS:
+        return JsonResponse({"error": "Unsupported bucket"}, status=400)
+    try:
+        points = int(request.GET.get('points', settings.CHART_POINTS))
+        start = request.GET.get('start')
+        start = _day_start(datetime.strptime(start, '%Y-%m-%d').date()) if start else None
+        end = request.GET.get('end')
+        end = _day_start(datetime.strptime(end, '%Y-%m-%d').date() + timedelta(days=1)) if end else None
+    except ValueError:
+        return JsonResponse({"error": "Invalid points, start or end"}, status=400)
+    points = max(3, min(points, settings.CHART_MAX_POINTS))
+
+    if start is None:
+        start = period_start(request.GET.get('period', 'all'), timezone.now())
+        # Whole days, so the cache key doesn't change with every request
+        start = _day_start(timezone.localtime(start).date()) if start else None
+
+    data = timeseries.cached_series(request.user.id, start, end, bucket, points)
+    return JsonResponse(data)
+
+
+@login_required
+@ratelimit('tips_api', '30/m')
 def tips_api(request):
     """Return a single, concise tips message based on the user's calculation data.
     This endpoint intentionally avoids AI calls and generates a heuristic message.
@@ -436,6 +686,7 @@ def tips_api(request):
 
 
 @login_required
+@ratelimit('ai_tips_api', '10/m')
 def ai_tips_api(request):
     """Accept raw form values, compute emissions, and return a concise Gemini AI tip."""
     if request.method != 'POST':
@@ -495,21 +746,33 @@ def ai_tips_api(request):
 
     tip_message = None
     if genai and getattr(settings, 'GEMINI_API_KEY', None):
-        try:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            model = genai.GenerativeModel('gemini-2.0-flash-lite')
-            prompt = (
-                "You are a sustainability coach. Based on the user's monthly carbon footprint, "
-                "give exactly ONE short, actionable tip in 1 sentence (<= 25 words). "
-                "Avoid lists, no JSON, no code blocks. Be encouraging and specific.\n\n"
-                f"Totals (kg CO2/month): total={total}, transportation={transportation}, food={food}, electricity={electricity}, waste={waste}.\n"
-                f"Fuel type={fuel_type}, meal type={meal_type}, waste type={waste_type}.\n"
-                "Start directly with the tip."
-            )
-            resp = model.generate_content(prompt)
-            tip_message = (resp.text or '').strip()
-        except Exception:
-            tip_message = None
+        prompt = (
+            "You are a sustainability coach. Based on the user's monthly carbon footprint, "
+            "give exactly ONE short, actionable tip in 1 sentence (<= 25 words). "
+            "Avoid lists, no JSON, no code blocks. Be encouraging and specific.\n\n"
+            f"Totals (kg CO2/month): total={total}, transportation={transportation}, food={food}, electricity={electricity}, waste={waste}.\n"
+            f"Fuel type={fuel_type}, meal type={meal_type}, waste type={waste_type}.\n"
+            "Start directly with the tip."
+        )
+        # Same inputs give the same prompt, so reuse earlier answers
+        cache_key = 'ai_tip:' + hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        tip_message = cache.get(cache_key)
+        metrics.TIP_CACHE.inc(result='hit' if tip_message else 'miss')
+
+        if not tip_message:
+            try:
+                genai.configure(api_key=settings.GEMINI_API_KEY)
+                model = genai.GenerativeModel('gemini-2.0-flash-lite')
+                with instrumentation.timed('gemini'), metrics.GEMINI_LATENCY.time():
+                    resp = model.generate_content(prompt)
+                tip_message = (resp.text or '').strip()
+            except Exception:
+                tip_message = None
+
+            if tip_message:
+                cache.set(cache_key, tip_message, settings.TIP_CACHE_SECONDS)
+            else:
+                metrics.GEMINI_FAILURES.inc()
 
     if not tip_message:
         cat_pairs = [
@@ -539,3 +802,69 @@ def ai_tips_api(request):
         },
         "level": level,
     })
+
+
+
+@login_required
+def export_footprints(request):
+    """Stream the user's footprint history (or everyone's, for staff) as CSV or JSONL."""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        return JsonResponse({"error": "Unsupported format"}, status=400)
+
+    footprints = CarbonFootprint.objects.order_by('user_id', 'created_at')
+    if request.GET.get('all') == '1':
+        if not request.user.is_staff:
+            return JsonResponse({"error": "Forbidden"}, status=403)
+        filename = 'footprints'
+    else:
+        footprints = footprints.filter(user=request.user)
+        filename = f'footprints_{request.user.username}'
+
+    # The rows are read while streaming, after the view returns, so pin the
+    # database chosen for this request (replica or primary) now
+    footprints = footprints.using(footprints.db)
+
+    content_type, extension = exports.FORMATS[fmt]
+    filename = f'{filename}.{extension}'
+    chunks = exports.export_lines(footprints, fmt)
+    if request.GET.get('gzip') == '1':
+        chunks = exports.gzip_chunks(chunks)
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+
+@login_required
+@ratelimit('import_footprints', '5/m')
+def import_footprints(request):
+    """
+    Bulk import footprints from an uploaded CSV/JSONL file; staff may import for other users.
+
+    Users' rows dated today count towards their daily calculation limit, like
+    tracked ones. Staff imports (bulk loads for others) aren't capped.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({"error": "No file uploaded"}, status=400)
+
+    fmt = request.POST.get('format') or imports.detect_format(upload.name)
+    if fmt not in imports.FORMATS:
+        return JsonResponse({"error": "Unsupported format"}, status=400)
+
+    rows = imports.read_rows(upload, fmt, compressed=upload.name.endswith('.gz'))
+    report = imports.import_footprints(
+        rows,
+        default_user=request.user,
+        allow_other_users=request.user.is_staff,
+        dry_run=request.POST.get('dry_run') == '1',
+        daily_limit=None if request.user.is_staff else DAILY_CALCULATIONS,
+    )
+    return JsonResponse(report.as_dict(), status=200 if not report.invalid else 207)
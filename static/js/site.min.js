@@ -0,0 +1,5 @@
+/* Generated by `python manage.py build_assets` from js/src/layout.js, js/src/password.js; do not edit. */
+(function(){'use strict';var headerEl=document.querySelector('header');window.addEventListener('scroll',function(){headerEl.classList.toggle('scrolled',window.scrollY>10);},{passive:true});var mobileMenuBtn=document.getElementById('mobile-menu-btn');var mobileSidebar=document.getElementById('mobile-sidebar');var sidebarOverlay=document.getElementById('sidebar-overlay');var closeSidebar=document.getElementById('close-sidebar');if(!mobileMenuBtn||!mobileSidebar){return;}
+function openSidebar(){mobileSidebar.classList.add('open');sidebarOverlay.classList.add('open');mobileMenuBtn.classList.add('open');document.body.style.overflow='hidden';}
+function closeSidebarMenu(){mobileSidebar.classList.remove('open');sidebarOverlay.classList.remove('open');mobileMenuBtn.classList.remove('open');document.body.style.overflow='';}
+mobileMenuBtn.addEventListener('click',function(){if(mobileSidebar.classList.contains('open')){closeSidebarMenu();}else{openSidebar();}});closeSidebar.addEventListener('click',closeSidebarMenu);sidebarOverlay.addEventListener('click',closeSidebarMenu);document.querySelectorAll('#mobile-sidebar a').forEach(function(link){link.addEventListener('click',closeSidebarMenu);});window.addEventListener('resize',function(){if(window.innerWidth>=1024){closeSidebarMenu();}});})();;window.togglePassword=function(fieldId,iconId){var field=document.getElementById(fieldId);var icon=document.getElementById(iconId);if(field.type==='password'){field.type='text';icon.textContent='🙈';}else{field.type='password';icon.textContent='👁️';}};
@@ -0,0 +1,52 @@
+// Particle background behind the landing page hero (particles.js is loaded just before this)
+particlesJS("particles-js", {
+  "particles": {
+    "number": { "value": 90 },
+    "color": { "value": "#16a34a" },  // Visible green
+    "shape": { "type": "circle" },
+    "opacity": { "value": 0.8 },
+    "size": { "value": 4 },
+    "line_linked": { 
+      "enable": true, 
+      "distance": 150, 
+      "color": "#16a34a",
+      "opacity": 0.6,
+      "width": 1.2
+    },
+    "move": { 
+      "enable": true, 
+      "speed": 2, 
+      "direction": "none", 
+      "out_mode": "out" 
+    }
+  },
+  "interactivity": {
+    "detect_on": "canvas",
+    "events": {
+      "onhover": { "enable": true, "mode": ["grab", "bubble"] },
+      "onclick": { "enable": true, "mode": ["push", "repulse"] },
+      "resize": true
+    },
+    "modes": {
+      "grab": {
+        "distance": 180,
+        "line_linked": { "opacity": 0.9 } // strong link when hovering
+      },
+      "bubble": {
+        "distance": 200,
+        "size": 8,
+        "duration": 2,
+        "opacity": 0.9,
+        "speed": 3
+      },
+      "repulse": {
+        "distance": 200,
+        "duration": 0.4
+      },
+      "push": {
+        "particles_nb": 4
+      }
+    }
+  },
+  "retina_detect": true
+});
@@ -0,0 +1,56 @@
+// Header style on scroll and the mobile sidebar, on every page (layout.html)
+(function () {
+  'use strict';
+
+  // Header scroll effect
+  var headerEl = document.querySelector('header');
+  window.addEventListener('scroll', function () {
+    headerEl.classList.toggle('scrolled', window.scrollY > 10);
+  }, { passive: true });
+
+  // Mobile menu functionality
+  var mobileMenuBtn = document.getElementById('mobile-menu-btn');
+  var mobileSidebar = document.getElementById('mobile-sidebar');
+  var sidebarOverlay = document.getElementById('sidebar-overlay');
+  var closeSidebar = document.getElementById('close-sidebar');
+  if (!mobileMenuBtn || !mobileSidebar) {
+    return;
+  }
+
+  function openSidebar() {
+    mobileSidebar.classList.add('open');
+    sidebarOverlay.classList.add('open');
+    mobileMenuBtn.classList.add('open');
+    document.body.style.overflow = 'hidden';
+  }
+
+  function closeSidebarMenu() {
+    mobileSidebar.classList.remove('open');
+    sidebarOverlay.classList.remove('open');
+    mobileMenuBtn.classList.remove('open');
+    document.body.style.overflow = '';
+  }
+
+  mobileMenuBtn.addEventListener('click', function () {
+    if (mobileSidebar.classList.contains('open')) {
+      closeSidebarMenu();
+    } else {
+      openSidebar();
+    }
+  });
+
+  closeSidebar.addEventListener('click', closeSidebarMenu);
+  sidebarOverlay.addEventListener('click', closeSidebarMenu);
+
+  // Close sidebar when clicking on navigation links
+  document.querySelectorAll('#mobile-sidebar a').forEach(function (link) {
+    link.addEventListener('click', closeSidebarMenu);
+  });
+
+  // Close sidebar on window resize if screen becomes large
+  window.addEventListener('resize', function () {
+    if (window.innerWidth >= 1024) {
+      closeSidebarMenu();
+    }
+  });
+})();
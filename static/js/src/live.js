@@ -0,0 +1,76 @@
+// Live updates from the server-sent event stream (core.views.event_stream),
+// on the leaderboard and My Challenges. The page describes what it shows in
+// a #live-events element: data-url, and data-period on the leaderboard.
+(function () {
+  'use strict';
+
+  var config = document.getElementById('live-events');
+  if (!config || !window.EventSource) {
+    return;
+  }
+  var source = new EventSource(config.dataset.url);
+  var notice = document.getElementById('live-notice');
+
+  // Changes this page can't apply in place: offer a reload instead
+  function showNotice() {
+    if (notice) {
+      notice.classList.remove('hidden');
+    }
+  }
+
+  source.addEventListener('open', function () {
+    document.body.dataset.live = '1';
+  });
+  source.addEventListener('error', function () {
+    delete document.body.dataset.live;
+  });
+  source.addEventListener('reset', showNotice);
+
+  // Someone's all-time total changed: move their row to its new rank
+  source.addEventListener('rank', function (event) {
+    var data = JSON.parse(event.data);
+    var list = document.getElementById('rankings');
+    var row = list && list.querySelector('[data-user="' + data.user_id + '"]');
+    if (config.dataset.period !== 'all' || !row) {
+      showNotice();
+      return;
+    }
+    row.querySelector('[data-total]').textContent = data.total.toFixed(1);
+    var others = Array.prototype.filter.call(list.children, function (other) {
+      return other !== row;
+    });
+    list.insertBefore(row, others[data.rank - 1] || null);
+    Array.prototype.forEach.call(list.children, function (other, i) {
+      other.querySelector('[data-rank]').textContent = '#' + (i + 1);
+    });
+  });
+
+  // One of the user's challenges was updated (possibly in another tab)
+  source.addEventListener('progress', function (event) {
+    var data = JSON.parse(event.data);
+    var card = document.querySelector('[data-challenge="' + data.challenge + '"]');
+    if (!card) {
+      return;
+    }
+    card.querySelectorAll('[data-rate]').forEach(function (el) {
+      el.textContent = data.progress_percentage + '%';
+    });
+    var bar = card.querySelector('[data-bar]');
+    if (bar) {
+      bar.style.width = data.progress_percentage + '%';
+    }
+    var saved = card.querySelector('[data-saved]');
+    if (saved) {
+      saved.textContent = Number(data.carbon_saved).toFixed(1) + 'kg CO₂ saved so far';
+      saved.classList.toggle('hidden', !Number(data.carbon_saved));
+    }
+    var day = card.querySelector('[data-day="' + data.date + '"]');
+    if (!day) {
+      showNotice();
+      return;
+    }
+    day.textContent = data.completed ? '✓' : '○';
+    ['bg-green-500', 'text-white'].forEach(function (name) { day.classList.toggle(name, data.completed); });
+    ['bg-gray-200', 'text-gray-400'].forEach(function (name) { day.classList.toggle(name, !data.completed); });
+  });
+})();
@@ -0,0 +1,12 @@
+// Show/hide buttons on the login and register password fields
+window.togglePassword = function (fieldId, iconId) {
+  var field = document.getElementById(fieldId);
+  var icon = document.getElementById(iconId);
+  if (field.type === 'password') {
+    field.type = 'text';
+    icon.textContent = '🙈';
+  } else {
+    field.type = 'password';
+    icon.textContent = '👁️';
+  }
+};